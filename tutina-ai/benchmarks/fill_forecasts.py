@@ -0,0 +1,51 @@
+"""Benchmark forward filling the forecasts over multi-year hourly data
+
+Usage: python benchmarks/fill_forecasts.py [years]
+"""
+
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from tutina.ai.model import MAX_FORECAST_IN_HOURS, _fill_forecasts
+from tutina.ai.types import FORECASTS, MEASUREMENTS, TEMPERATURE
+
+
+def make_data(years: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2020-01-01", periods=years * 365 * 24, freq="h", tz="UTC")
+    # forecasts are missing for every other hour and for occasional outages
+    has_forecast = (np.arange(len(index)) % 2 == 0) & (rng.random(len(index)) > 0.05)
+    forecast_index = index[has_forecast]
+    columns = pd.MultiIndex.from_tuples(
+        [(MEASUREMENTS, TEMPERATURE, "bedroom")]
+        + [
+            (FORECASTS, TEMPERATURE, str(in_hours).zfill(2))
+            for in_hours in range(MAX_FORECAST_IN_HOURS)
+        ]
+    )
+    df = pd.DataFrame(np.nan, index=index, columns=columns)
+    df[MEASUREMENTS, TEMPERATURE, "bedroom"] = rng.random(len(index))
+    df.loc[forecast_index, columns[1:]] = rng.random(
+        (len(forecast_index), MAX_FORECAST_IN_HOURS)
+    )
+    return df, forecast_index
+
+
+def main():
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    df, forecast_index = make_data(years)
+    n_runs = 5
+    total = timeit.timeit(
+        lambda: _fill_forecasts(df.copy(), forecast_index), number=n_runs
+    )
+    print(
+        f"{years} years, {len(df.index)} rows, {len(forecast_index)} forecasts: "
+        f"{total / n_runs:.3f} s per run"
+    )
+
+
+if __name__ == "__main__":
+    main()
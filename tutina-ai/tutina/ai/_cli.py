@@ -1,5 +1,6 @@
 import logging
 import random
+from pathlib import Path
 from typing import Annotated, Callable
 
 import tomllib
@@ -21,6 +22,30 @@ except ImportError:
         pass
 
 
+RefreshOption = Annotated[
+    bool,
+    typer.Option(
+        "--refresh", "-r", help="Update cached data with rows newer than the cache"
+    ),
+]
+
+
+def _load_features(settings: Settings, refresh: bool):
+    from . import model as m
+
+    data_file = settings.model.get_data_file_path(write=True)
+    logger.info(f"Loading data from %s", data_file)
+    model_config = settings.model.config
+    data = m.load_data_with_cache(
+        str(data_file),
+        settings.database.get_url(),
+        refresh=refresh,
+        config=model_config,
+    )
+    data = m.clean_data(data, model_config)
+    return m.get_features(data, model_config)
+
+
 @app.command()
 def train(
     ctx: typer.Context,
@@ -28,19 +53,15 @@ def train(
         bool,
         typer.Option("--interactive", "-i", help="Drop to REPL after loading data"),
     ] = False,
+    refresh: RefreshOption = False,
 ):
     """Train Tutina AI model"""
 
     from . import model as m
+    from . import plotting
 
     settings: Settings = ctx.obj["settings"]
-
-    data_file = settings.model.get_data_file_path(write=True)
-    logger.info(f"Loading data from %s", data_file)
-    data = m.load_data_with_cache(str(data_file), settings.database.get_url())
-    model_config = settings.model.config
-    data = m.clean_data(data, model_config)
-    features = m.get_features(data, model_config)
+    features = _load_features(settings, refresh)
 
     model_file = settings.model.get_model_file_path(write=True)
     if model_file and model_file.is_file():
@@ -48,22 +69,52 @@ def train(
         model = m.load_model(str(model_file))
     else:
         logger.info("Model file not found, training")
-        train_dataset, validation_dataset, test_dataset = (
-            m.split_data_to_train_and_validation(features)
-        )
-        model, history = m.create_and_train_model(train_dataset, validation_dataset)
-        evaluation = model.evaluate(test_dataset, return_dict=True)
+        train, validation, test = m.split_data_to_train_and_validation(features)
+        model, history = m.create_and_train_model(train, validation)
+        evaluation = model.evaluate(test.dataset, return_dict=True)
         logger.info("Model evaluation result: %r", evaluation)
         logger.info("Saving model to %s", model_file)
         if model_file:
             model.save(model_file)
 
+    if runtime_file := settings.model.get_runtime_file_path(write=True):
+        logger.info("Exporting model runtime to %s", runtime_file)
+        m.export_runtime(model, str(runtime_file))
+
     start = random.randrange(0, len(features.index) - 30)
     sample = features.iloc[start : start + 30, :]
     cutoff = sample.index[11]
     model_input = m.features_to_model_input(sample, cutoff)
     prediction = m.predict_single(model, model_input)
-    m.plot_comparison(sample, prediction)
+    plotting.plot_comparison(sample, prediction)
 
     if interactive:
         console()
+
+
+@app.command()
+def sweep(
+    ctx: typer.Context,
+    refresh: RefreshOption = False,
+    output: Annotated[
+        Path | None,
+        typer.Option("--output", "-o", help="Write the results to a CSV file"),
+    ] = None,
+):
+    """Search hyperparameters of Tutina AI model
+
+    The search is specified in the ``sweep`` table of the model config.
+    """
+
+    from . import sweep as s
+
+    settings: Settings = ctx.obj["settings"]
+    spec = settings.model.config.get("sweep")
+    if not spec:
+        logger.error("Sweep not specified in the model config")
+        raise typer.Exit(1)
+    features = _load_features(settings, refresh)
+    results = s.run_sweep(features, spec)
+    typer.echo(results.to_string())
+    if output:
+        results.to_csv(output)
@@ -2,62 +2,215 @@ import asyncio
 import contextlib
 import datetime
 import functools
-import itertools
+import json
+import typing
 
-import more_itertools as mi
 import numpy as np
 import pandas as pd
 import sqlalchemy as sa
 import tensorflow as tf
+from numpy.lib.stride_tricks import sliding_window_view
 from sqlalchemy import func as saf
 
 from tutina.lib.db import (
     AsyncConnection,
     HvacState,
     create_async_engine,
-    forecasts,
+    forecasts_hourly,
     hvac_devices,
-    hvacs,
-    locations,
-    measurements,
-    opening_states,
-    openings,
+    hvac_transitions,
+    hvacs_hourly,
+    measurements_hourly,
+    opening_states_hourly,
+    opening_transitions,
 )
+from tutina.lib.db import locations as db_locations
 from tutina.lib.db import metadata as db_metadata
+from tutina.lib.db import openings as db_openings
+
+from .types import (
+    CONTROL,
+    FORECASTS,
+    HISTORY,
+    HVACS,
+    INPUTS,
+    IS_OPEN,
+    LABELS,
+    MEASUREMENTS,
+    OPENINGS,
+    OUTDOOR,
+    TEMPERATURE,
+    TEMPERATURE_OUTDOOR,
+    TutinaInputFeatures,
+)
 
-from .types import TutinaInputFeatures
-
-TIME_WINDOW_IN_SECONDS = 3600
 MAX_FORECAST_IN_HOURS = 24
 HISTORY_TIMESTEPS_IN_FEATURES = 12
 CONTROL_TIMESTEPS_IN_FEATURES = 12
+WINDOW_SIZE = HISTORY_TIMESTEPS_IN_FEATURES + CONTROL_TIMESTEPS_IN_FEATURES
+BATCH_SIZE = 128
 TRAIN_CHUNK_SIZE = 2048
 VALIDATION_CHUNK_SIZE = 256
 TEST_CHUNK_SIZE = 256
+SPLIT_RATIOS = (TRAIN_CHUNK_SIZE, VALIDATION_CHUNK_SIZE, TEST_CHUNK_SIZE)
+SPLIT_PERIOD = sum(SPLIT_RATIOS)
 N_EPOCHS = 64
+LEARNING_RATE = 0.001
+LSTM_UNITS = 32
+DENSE_UNITS = 64
+CONV_FILTERS = 4
+LOAD_CHUNK_SIZE = 10_000
+HOUR = datetime.timedelta(hours=1)
+DATA_FILTERS_ATTR = "tutina_data_filters"
+
 
-OUTDOOR = "outdoor"
-TEMPERATURE_OUTDOOR = f"temperature_{OUTDOOR}"
-MEASUREMENTS = "measurements"
-TEMPERATURE = "temperature"
-FORECASTS = "forecasts"
-HVACS = "hvacs"
-OPENINGS = "openings"
-IS_OPEN = "is_open"
-LABELS = "labels"
-INPUTS = "inputs"
-HISTORY = "history"
-CONTROL = "control"
+def _rollup_ratio(numerator: sa.Column, denominator: sa.Column, name: str):
+    return (numerator / saf.nullif(denominator, 0)).label(name)
 
 
-def _windowed_timestamp(column: sa.Column, window=TIME_WINDOW_IN_SECONDS):
-    return saf.from_unixtime(
-        saf.floor(saf.unix_timestamp(column) / window) * window
-    ).label("timestamp")
+def _rollup_avg(table: sa.Table, name: str):
+    return _rollup_ratio(table.c[f"{name}_sum"], table.c[f"{name}_count"], name)
+
+
+def _filter_range(
+    expression,
+    column: sa.Column,
+    since: datetime.datetime | None,
+    until: datetime.datetime | None,
+):
+    if since is not None:
+        expression = expression.where(column >= since)
+    if until is not None:
+        expression = expression.where(column <= until)
+    return expression
+
+
+def _filter_transitions(
+    expression,
+    table: sa.Table,
+    key_column: sa.Column,
+    since: datetime.datetime | None,
+    end: datetime.datetime,
+):
+    """Filter the state transitions from ``since`` until before ``end``
+
+    The latest transition of each key before ``since`` is included, because it
+    gives the state at ``since``.
+    """
+
+    if since is not None:
+        preceding = (
+            sa.select(key_column, saf.max(table.c.timestamp))
+            .where(table.c.timestamp < since)
+            .group_by(key_column)
+        )
+        expression = expression.where(
+            sa.or_(
+                table.c.timestamp >= since,
+                sa.tuple_(key_column, table.c.timestamp).in_(preceding),
+            )
+        )
+    return expression.where(table.c.timestamp < end)
+
+
+def _filter_in(expression, column: sa.ColumnElement, values: list[str] | None):
+    if not values:
+        return expression
+    return expression.where(column.in_(values))
+
+
+def _to_naive_utc(timestamp) -> datetime.datetime | None:
+    if not timestamp:
+        return None
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert(None)
+    return timestamp.to_pydatetime()
+
+
+def _get_transitions_end(until: datetime.datetime | None) -> datetime.datetime:
+    # the hour starting at ``until`` is included, like in the hourly rollups
+    now = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+    return now if until is None else min(until + HOUR, now)
+
+
+def _average_transitions_hourly(
+    times: np.ndarray, values: np.ndarray, end: np.datetime64
+) -> tuple[np.ndarray, np.ndarray]:
+    """Average piecewise constant values over each hour, weighted by time
+
+    Row ``i`` of ``values`` holds from ``times[i]`` until ``times[i + 1]``, and
+    the last row until ``end``. NaN values are left out of the averages. Returns
+    the starts of the hours covered by the values, and the averages within
+    each hour.
+    """
+
+    times = times.astype("datetime64[ns]")
+    knot_times = np.append(times, np.datetime64(end, "ns"))
+    hours = np.arange(
+        times[0].astype("datetime64[h]"),
+        knot_times[-1].astype("datetime64[h]") + 2,
+    ).astype("datetime64[ns]")
+    one_second = np.timedelta64(1, "s")
+    knots = (knot_times - times[0]) / one_second
+    bounds = np.clip((hours - times[0]) / one_second, 0, knots[-1])
+    # the index of the row holding at each bound
+    rows = np.minimum(np.searchsorted(knots, bounds, side="right") - 1, len(times) - 1)
+    is_valid = ~np.isnan(values)
+
+    def _integrate(rates: np.ndarray):
+        integrals = np.concatenate(
+            [
+                np.zeros((1, rates.shape[1])),
+                np.cumsum(rates * np.diff(knots)[:, np.newaxis], axis=0),
+            ]
+        )
+        return np.diff(
+            integrals[rows] + rates[rows] * (bounds - knots[rows])[:, np.newaxis],
+            axis=0,
+        )
+
+    sums = _integrate(np.where(is_valid, values, 0.0))
+    durations = _integrate(is_valid.astype(np.float64))
+    averages = np.divide(
+        sums, durations, out=np.full_like(sums, np.nan), where=durations > 0
+    )
+    is_covered = np.diff(bounds) > 0
+    return hours[:-1][is_covered], averages[is_covered]
+
+
+def _transitions_to_hourly(
+    df: pd.DataFrame,
+    key: str,
+    columns: list[str],
+    *,
+    since: datetime.datetime | None,
+    end: datetime.datetime,
+):
+    frames = {}
+    for name, transitions in df.groupby(key, sort=False):
+        hours, averages = _average_transitions_hourly(
+            transitions["timestamp"].to_numpy(),
+            transitions[columns].to_numpy(dtype=np.float64),
+            np.datetime64(end),
+        )
+        frames[name] = pd.DataFrame(
+            averages, index=pd.DatetimeIndex(hours, name="timestamp"), columns=columns
+        )
+    if not frames:
+        return pd.DataFrame()
+    result = (
+        pd.concat(frames, axis="columns", names=[key])
+        .swaplevel(axis="columns")
+        .sort_index()
+    )
+    if since is not None:
+        result = result.loc[result.index >= since]
+    return result.pipe(_ensure_index_is_in_utc)
 
 
 def _ensure_index_is_in_utc(df: pd.DataFrame):
-    df.index = df.index.tz_localize(datetime.UTC)
+    df.index = pd.DatetimeIndex(df.index).tz_localize(datetime.UTC)
     return df
 
 
@@ -76,142 +229,284 @@ def _prepend_column_level(df: pd.DataFrame, name: str):
 
 
 def _fill_forecasts(df: pd.DataFrame, index: pd.Index):
+    """Forward fill the forecasts without filling over gaps in the forecasts
+
+    ``index`` contains the timestamps of the forecasts. The rows starting from
+    the first forecast are divided into segments at each forecast that follows
+    a gap longer than an hour (not counting the gap after the first forecast),
+    and the forecasts are filled within each segment.
+    """
+
     columns = [column for column in df.columns if column[0] == FORECASTS]
-    index_it = iter(index)
-    range_first = next(index_it)
-    for first, last in mi.pairwise(index_it):
-        if last - first > pd.Timedelta("1h"):
-            range_last = last - pd.Timedelta("1s")  # this is to make exclusive bound
-            df.loc[range_first:range_last, columns] = df.loc[
-                range_first:range_last, columns
-            ].ffill()
-            range_first = last
-    df.loc[range_first:, columns] = df.loc[range_first:, columns].ffill()
+    if index.empty or not columns:
+        return
+    gap_ends = index[2:][(index[2:] - index[1:-1]) > pd.Timedelta("1h")]
+    segment_starts = index[:1].append(gap_ends)
+    segments = segment_starts.searchsorted(df.index, side="right") - 1
+    rows = segments >= 0
+    df.loc[rows, columns] = (
+        df.loc[rows, columns].groupby(segments[rows], sort=False).ffill()
+    )
+
+
+def _get_column_dtype(column: sa.ColumnElement):
+    if isinstance(column.type, sa.DateTime):
+        return np.dtype("datetime64[ns]")
+    if isinstance(column.type, (sa.Float, sa.Numeric)):
+        return np.dtype(np.float64)
+    if isinstance(column.type, sa.Integer):
+        return np.dtype(np.int64)
+    return np.dtype(object)
+
+
+async def _load_frame(connection: AsyncConnection, expression: sa.Select):
+    """Stream the query result into a data frame
+
+    The rows are fetched from a server-side cursor in chunks of
+    ``LOAD_CHUNK_SIZE`` rows. Each chunk is converted to typed NumPy columns, and
+    the columns are concatenated once all rows are fetched.
+    """
+
+    dtypes = [_get_column_dtype(column) for column in expression.selected_columns]
+    result = await connection.stream(expression)
+    names = list(result.keys())
+    chunks: list[list[np.ndarray]] = [[] for _ in names]
+    async for rows in result.partitions(LOAD_CHUNK_SIZE):
+        for chunk, values, dtype in zip(chunks, zip(*rows), dtypes):
+            chunk.append(np.array(values, dtype=dtype))
+    return pd.DataFrame(
+        {
+            name: np.concatenate(chunk) if chunk else np.array([], dtype=dtype)
+            for (name, chunk, dtype) in zip(names, chunks, dtypes)
+        }
+    )
 
 
 def _tensorize_with_batch(data):
     return tf.expand_dims(tf.constant(data), axis=0)
 
 
-async def load_measurements_data(connection: AsyncConnection):
-    time_column = _windowed_timestamp(measurements.c.timestamp)
+def _broadcast_to_batch(tensor, batch_size):
+    broadcasted = tf.broadcast_to(
+        tensor, tf.concat([[batch_size], tf.shape(tensor)[1:]], axis=0)
+    )
+    broadcasted.set_shape([None, *tensor.shape[1:]])
+    return broadcasted
+
+
+async def load_measurements_data(
+    connection: AsyncConnection,
+    *,
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+    locations: list[str] | None = None,
+):
+    expression = sa.select(
+        measurements_hourly.c.timestamp,
+        db_locations.c.slug.label("location"),
+        _rollup_avg(measurements_hourly, TEMPERATURE),
+        _rollup_avg(measurements_hourly, "humidity"),
+        _rollup_avg(measurements_hourly, "pressure"),
+    ).select_from(measurements_hourly.join(db_locations))
+    expression = _filter_range(
+        expression, measurements_hourly.c.timestamp, since, until
+    )
+    expression = _filter_in(expression, db_locations.c.slug, locations)
+    df = await _load_frame(connection, expression)
+    return await asyncio.to_thread(
+        lambda: df.pivot(
+            index="timestamp",
+            columns="location",
+            values=[TEMPERATURE, "humidity", "pressure"],
+        ).pipe(_ensure_index_is_in_utc)
+    )
+
+
+async def load_hvacs_data(
+    connection: AsyncConnection,
+    *,
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+    devices: list[str] | None = None,
+):
     expression = (
         sa.select(
-            time_column,
-            locations.c.slug.label("location"),
-            saf.avg(measurements.c.temperature).label(TEMPERATURE),
-            saf.avg(measurements.c.humidity).label("humidity"),
-            saf.avg(measurements.c.pressure).label("pressure"),
-        )
-        .select_from(measurements.join(locations))
-        .group_by(
-            time_column,
-            measurements.c.location_id,
+            hvacs_hourly.c.timestamp,
+            hvac_devices.c.slug.label("device"),
+            _rollup_avg(hvacs_hourly, TEMPERATURE),
+            *(
+                _rollup_ratio(
+                    hvacs_hourly.c[f"{state.name}_count"],
+                    hvacs_hourly.c.state_count,
+                    state.name,
+                )
+                for state in HvacState
+            ),
         )
+        .select_from(hvacs_hourly.join(hvac_devices))
+        .order_by(hvacs_hourly.c.timestamp)
     )
-    result = await connection.execute(expression)
+    expression = _filter_range(expression, hvacs_hourly.c.timestamp, since, until)
+    expression = _filter_in(expression, hvac_devices.c.slug, devices)
+    df = await _load_frame(connection, expression)
     return await asyncio.to_thread(
-        lambda: pd.DataFrame.from_records(
-            result.mappings().fetchall(),
-            coerce_float=True,
-        )
-        .pipe(
-            lambda df: df.pivot(
-                index="timestamp",
-                columns="location",
-                values=[TEMPERATURE, "humidity", "pressure"],
-            )
+        lambda: df.pivot(
+            index="timestamp",
+            columns="device",
+        ).pipe(_ensure_index_is_in_utc)
+    )
+
+
+async def load_openings_data(
+    connection: AsyncConnection,
+    *,
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+    openings: list[str] | None = None,
+):
+    opening = saf.concat(db_openings.c.slug, "_", db_openings.c.type)
+    expression = (
+        sa.select(
+            opening_states_hourly.c.timestamp,
+            opening.label("opening"),
+            _rollup_ratio(
+                opening_states_hourly.c.open_count,
+                opening_states_hourly.c["count"],
+                IS_OPEN,
+            ),
         )
-        .pipe(_ensure_index_is_in_utc)
+        .select_from(opening_states_hourly.join(db_openings))
+        .order_by(opening_states_hourly.c.timestamp)
+    )
+    expression = _filter_range(
+        expression, opening_states_hourly.c.timestamp, since, until
+    )
+    expression = _filter_in(expression, opening, openings)
+    df = await _load_frame(connection, expression)
+    return await asyncio.to_thread(
+        lambda: df.pivot(
+            index="timestamp",
+            columns="opening",
+        ).pipe(_ensure_index_is_in_utc)
     )
 
 
-async def load_hvacs_data(connection: AsyncConnection):
-    time_column = _windowed_timestamp(hvacs.c.timestamp)
+async def load_hvac_transitions_data(
+    connection: AsyncConnection,
+    *,
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+    devices: list[str] | None = None,
+):
+    """Load the HVAC data from the state transitions
+
+    The result has the same columns as :func:`load_hvacs_data`, but the state
+    ratios are the exact fractions of each hour the device was in the state.
+    """
+
+    end = _get_transitions_end(until)
     expression = (
         sa.select(
-            time_column,
+            hvac_transitions.c.timestamp,
             hvac_devices.c.slug.label("device"),
-            hvacs.c.temperature,
-            *(saf.avg(hvacs.c.state == state).label(state.name) for state in HvacState),
+            hvac_transitions.c.state,
+            hvac_transitions.c.temperature,
         )
-        .select_from(hvacs.join(hvac_devices))
-        .group_by(time_column, hvacs.c.device_id)
-        .order_by(time_column)
+        .select_from(hvac_transitions.join(hvac_devices))
+        .order_by(hvac_transitions.c.timestamp)
     )
-    result = await connection.execute(expression)
-    return await asyncio.to_thread(
-        lambda: pd.DataFrame.from_records(
-            result.mappings().fetchall(),
-            coerce_float=True,
+    expression = _filter_transitions(
+        expression, hvac_transitions, hvac_transitions.c.device_id, since, end
+    )
+    expression = _filter_in(expression, hvac_devices.c.slug, devices)
+    df = await _load_frame(connection, expression)
+
+    def _to_hourly():
+        states = df["state"]
+        values = pd.DataFrame(
+            {
+                "device": df["device"],
+                "timestamp": df["timestamp"],
+                TEMPERATURE: df[TEMPERATURE],
+                **{
+                    state.name: (states == state).astype(float).where(states.notna())
+                    for state in HvacState
+                },
+            }
         )
-        .pipe(
-            lambda df: df.pivot(
-                index="timestamp",
-                columns="device",
-            )
+        return _transitions_to_hourly(
+            values,
+            "device",
+            [TEMPERATURE, *(state.name for state in HvacState)],
+            since=since,
+            end=end,
         )
-        .pipe(_ensure_index_is_in_utc)
-    )
 
+    return await asyncio.to_thread(_to_hourly)
+
+
+async def load_opening_transitions_data(
+    connection: AsyncConnection,
+    *,
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+    openings: list[str] | None = None,
+):
+    """Load the opening data from the state transitions
+
+    The result has the same columns as :func:`load_openings_data`, but the
+    ratios are the exact fractions of each hour the opening was open.
+    """
 
-async def load_openings_data(connection: AsyncConnection):
-    time_column = _windowed_timestamp(opening_states.c.timestamp)
+    end = _get_transitions_end(until)
+    opening = saf.concat(db_openings.c.slug, "_", db_openings.c.type)
     expression = (
         sa.select(
-            time_column,
-            saf.concat(openings.c.slug, "_", openings.c.type).label("opening"),
-            saf.avg(opening_states.c.is_open).label("is_open"),
+            opening_transitions.c.timestamp,
+            opening.label("opening"),
+            opening_transitions.c.is_open,
         )
-        .select_from(opening_states.join(openings))
-        .group_by(time_column, opening_states.c.opening_id)
-        .order_by(time_column)
+        .select_from(opening_transitions.join(db_openings))
+        .order_by(opening_transitions.c.timestamp)
+    )
+    expression = _filter_transitions(
+        expression, opening_transitions, opening_transitions.c.opening_id, since, end
     )
-    result = await connection.execute(expression)
+    expression = _filter_in(expression, opening, openings)
+    df = await _load_frame(connection, expression)
     return await asyncio.to_thread(
-        lambda: pd.DataFrame.from_records(
-            result.mappings().fetchall(),
-            coerce_float=True,
-        )
-        .pipe(
-            lambda df: df.pivot(
-                index="timestamp",
-                columns="opening",
-            )
+        lambda: _transitions_to_hourly(
+            df.astype({IS_OPEN: float}), "opening", [IS_OPEN], since=since, end=end
         )
-        .pipe(_ensure_index_is_in_utc)
     )
 
 
-async def load_forecasts_data(connection: AsyncConnection):
-    time_column = _windowed_timestamp(forecasts.c.timestamp, 3600)
-    in_hours_column = saf.hour(
-        saf.timediff(forecasts.c.reference_timestamp, time_column)
-    ).label("in_hours")
+async def load_forecasts_data(
+    connection: AsyncConnection,
+    *,
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+):
     expression = (
         sa.select(
-            time_column,
-            in_hours_column,
-            saf.avg(forecasts.c.temperature).label(TEMPERATURE),
-            saf.avg(forecasts.c.humidity).label("humidity"),
-            saf.avg(forecasts.c.pressure).label("pressure"),
-            saf.avg(forecasts.c.wind_speed).label("wind_speed"),
+            forecasts_hourly.c.timestamp,
+            forecasts_hourly.c.in_hours,
+            *(
+                _rollup_ratio(
+                    forecasts_hourly.c[f"{name}_sum"], forecasts_hourly.c["count"], name
+                )
+                for name in [TEMPERATURE, "humidity", "pressure", "wind_speed"]
+            ),
         )
-        .where(in_hours_column < MAX_FORECAST_IN_HOURS)
-        .group_by(time_column, in_hours_column)
-        .order_by(time_column)
+        .where(forecasts_hourly.c.in_hours < MAX_FORECAST_IN_HOURS)
+        .order_by(forecasts_hourly.c.timestamp)
     )
-    result = await connection.execute(expression)
+    expression = _filter_range(expression, forecasts_hourly.c.timestamp, since, until)
+    df = await _load_frame(connection, expression)
     return await asyncio.to_thread(
-        lambda: pd.DataFrame.from_records(
-            result.mappings().fetchall(),
-            coerce_float=True,
-        )
-        .pipe(
-            lambda df: df.pivot(
-                index="timestamp",
-                columns="in_hours",
-            )
+        lambda: df.pivot(
+            index="timestamp",
+            columns="in_hours",
         )
         .pipe(_ensure_index_is_in_utc)
         .pipe(
@@ -223,41 +518,162 @@ async def load_forecasts_data(connection: AsyncConnection):
     )
 
 
-async def load_data(connection: AsyncConnection):
+async def load_forecast_index(
+    connection: AsyncConnection,
+    *,
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+) -> pd.DatetimeIndex:
+    """Load the timestamps of the rows of :func:`load_forecasts_data`"""
+
+    expression = (
+        sa.select(forecasts_hourly.c.timestamp)
+        .where(forecasts_hourly.c.in_hours < MAX_FORECAST_IN_HOURS)
+        .distinct()
+        .order_by(forecasts_hourly.c.timestamp)
+    )
+    expression = _filter_range(expression, forecasts_hourly.c.timestamp, since, until)
+    df = await _load_frame(connection, expression)
+    return pd.DatetimeIndex(df["timestamp"]).tz_localize(datetime.UTC)
+
+
+async def load_data(
+    connection: AsyncConnection,
+    *,
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+    rooms: list[str] | None = None,
+    hvac_devices: list[str] | None = None,
+    openings: list[str] | None = None,
+    transitions: bool = False,
+    fill_forecasts: bool = True,
+):
+    """Load the hourly data from the database
+
+    The rows can be limited to the time range from ``since`` to ``until``, both
+    inclusive, and to the given ``rooms``, ``hvac_devices`` and ``openings``.
+    The outdoor temperature is always included when the rooms are limited.
+
+    If ``transitions`` is true, the HVAC and opening data are computed from the
+    state transitions instead of the sampled states.
+
+    If ``fill_forecasts`` is false, the forecasts are not forward filled, e.g.
+    when the rows are filled only after they are joined with earlier rows.
+    """
+
+    locations = [*rooms, OUTDOOR] if rooms and OUTDOOR not in rooms else rooms
+    # the results are streamed from the same connection, so the loaders cannot
+    # run concurrently
+    frames = [
+        await load_measurements_data(
+            connection, since=since, until=until, locations=locations
+        ),
+        await (load_hvac_transitions_data if transitions else load_hvacs_data)(
+            connection, since=since, until=until, devices=hvac_devices
+        ),
+        await (load_opening_transitions_data if transitions else load_openings_data)(
+            connection, since=since, until=until, openings=openings
+        ),
+        await load_forecasts_data(connection, since=since, until=until),
+    ]
     dfs = [
         _prepend_column_level(df, prefix)
-        for (df, prefix) in zip(
-            await asyncio.gather(
-                load_measurements_data(connection),
-                load_hvacs_data(connection),
-                load_openings_data(connection),
-                load_forecasts_data(connection),
-            ),
-            [MEASUREMENTS, HVACS, OPENINGS, FORECASTS],
-        )
+        for (df, prefix) in zip(frames, [MEASUREMENTS, HVACS, OPENINGS, FORECASTS])
+        if not df.empty
     ]
+    if not dfs:
+        return pd.DataFrame()
 
     result = functools.reduce(pd.DataFrame.join, dfs)
 
-    _fill_forecasts(result, dfs[-1].index)
+    if fill_forecasts:
+        _fill_forecasts(result, frames[-1].index)
     return result.sort_index(axis="columns")
 
 
-def load_data_with_cache(filename: str | None, database_url: str):
+def get_data_filters(config=None) -> dict:
+    """Get the arguments of :func:`load_data` from the model config"""
+
+    if not config:
+        config = {}
+    return {
+        "since": _to_naive_utc(config.get("timestamp_start")),
+        "until": _to_naive_utc(config.get("timestamp_end")),
+        "rooms": config.get("rooms"),
+        "hvac_devices": config.get("hvac_devices"),
+        "openings": config.get("openings"),
+        "transitions": bool(config.get("state_transitions")),
+    }
+
+
+def load_data_with_cache(
+    filename: str | None,
+    database_url: str,
+    *,
+    refresh: bool = False,
+    config=None,
+):
+    """Load data from the database, using a parquet file as cache
+
+    Only the data used by the model ``config`` is loaded. The cache is discarded
+    if it was loaded with a different config.
+
+    If ``refresh`` is true, an existing cache is updated incrementally. Only the
+    rows belonging to the last (possibly partial) hourly window of the cache, or
+    newer, are queried, and they replace the tail of the cached data. The
+    forecasts are filled after the new rows are joined, so that the rows before
+    the first new forecast are filled from the cached forecasts.
+    """
+
+    filters = get_data_filters(config)
+    serialized_filters = json.dumps(filters, default=str, sort_keys=True)
+
+    cached_data = None
     if filename:
         with contextlib.suppress(OSError):
-            return pd.read_parquet(filename)
+            cached_data = pd.read_parquet(filename)
+    if (
+        cached_data is not None
+        and cached_data.attrs.get(DATA_FILTERS_ATTR) != serialized_filters
+    ):
+        cached_data = None
+    if cached_data is not None and not refresh:
+        return cached_data
+
+    since = (
+        cached_data.index.max()
+        if cached_data is not None and not cached_data.empty
+        else None
+    )
 
     async def _async_load_data():
         engine = create_async_engine(database_url)
         async with engine.begin() as connection:
             await connection.run_sync(db_metadata.create_all)
-            return await load_data(connection)
+            if since is None:
+                return await load_data(connection, **filters), None
+            data = await load_data(
+                connection,
+                **{**filters, "since": since.tz_convert(None).to_pydatetime()},
+                fill_forecasts=False,
+            )
+            forecast_index = await load_forecast_index(
+                connection, since=filters["since"], until=filters["until"]
+            )
+            return data, forecast_index
         await engine.dispose()
 
-    data = asyncio.run(_async_load_data())
+    data, forecast_index = asyncio.run(_async_load_data())
+
+    if cached_data is not None and forecast_index is not None:
+        if data.empty:
+            return cached_data
+        data = pd.concat([cached_data.loc[cached_data.index < since], data])
+        data = data.sort_index(axis="columns")
+        _fill_forecasts(data, forecast_index)
 
     if filename:
+        data.attrs[DATA_FILTERS_ATTR] = serialized_filters
         data.to_parquet(filename)
 
     return data
@@ -328,43 +744,142 @@ def get_features(data: pd.DataFrame, config=None):
     return features
 
 
-def _features_to_model_input(
-    features, *, labels_slice: slice, control_slice: slice, forecasts_slice: slice
-):
-    n_labels = labels_slice.stop - labels_slice.start
-    n_controls = control_slice.stop - control_slice.start
-    n_forecasts = forecasts_slice.stop - forecasts_slice.start
-    history_inputs = features[:, :HISTORY_TIMESTEPS_IN_FEATURES, labels_slice]
-    history_inputs.set_shape([None, HISTORY_TIMESTEPS_IN_FEATURES, n_labels])
-    control_inputs = features[:, HISTORY_TIMESTEPS_IN_FEATURES:, control_slice]
-    control_inputs.set_shape([None, CONTROL_TIMESTEPS_IN_FEATURES, n_controls])
-    forecast_inputs = tf.expand_dims(
-        features[:, HISTORY_TIMESTEPS_IN_FEATURES, forecasts_slice], axis=2
-    )
-    forecast_inputs.set_shape([None, n_forecasts, 1])
-    labels = features[:, HISTORY_TIMESTEPS_IN_FEATURES:, labels_slice]
-    labels.set_shape([None, CONTROL_TIMESTEPS_IN_FEATURES, n_labels])
-    return {
-        HISTORY: history_inputs,
-        CONTROL: control_inputs,
-        FORECASTS: forecast_inputs,
-    }, labels
-
-
-def features_to_dataset(features: pd.DataFrame):
-    labels_slice = features.columns.get_loc((LABELS,))
-    control_slice = features.columns.get_loc((CONTROL,))
-    forecasts_slice = features.columns.get_loc((FORECASTS,))
-    return tf.keras.utils.timeseries_dataset_from_array(
-        features, None, HISTORY_TIMESTEPS_IN_FEATURES + CONTROL_TIMESTEPS_IN_FEATURES
-    ).map(
-        functools.partial(
-            _features_to_model_input,
-            labels_slice=labels_slice,
-            control_slice=control_slice,
-            forecasts_slice=forecasts_slice,
-        )
+class FeatureWindows(typing.NamedTuple):
+    """Model inputs and labels for each window of consecutive timesteps
+
+    The arrays are read-only views into the feature columns, so the windows do
+    not take memory of their own.
+    """
+
+    history: np.ndarray
+    control: np.ndarray
+    forecasts: np.ndarray
+    labels: np.ndarray
+
+    def __len__(self):
+        return len(self.labels)
+
+    def get_timesteps(self, indices: np.ndarray | None = None) -> dict[str, np.ndarray]:
+        """Get the input timesteps covered by the windows
+
+        If ``indices`` is given, only the windows at the indices are included.
+        Returns the rows of each input block, with each timestep included once
+        even if it is part of many overlapping windows.
+        """
+
+        if indices is None:
+            indices = np.arange(len(self))
+        return {
+            HISTORY: _gather_timesteps(
+                self.history,
+                _covered_timesteps(indices, len(self), HISTORY_TIMESTEPS_IN_FEATURES),
+            ),
+            CONTROL: _gather_timesteps(
+                self.control,
+                _covered_timesteps(indices, len(self), CONTROL_TIMESTEPS_IN_FEATURES),
+            ),
+            FORECASTS: self.forecasts[indices, :, 0],
+        }
+
+
+class DataSplit(typing.NamedTuple):
+    """Windows belonging to a training, validation or test split"""
+
+    windows: FeatureWindows
+    indices: np.ndarray
+    dataset: tf.data.Dataset
+
+    def get_timesteps(self) -> dict[str, np.ndarray]:
+        return self.windows.get_timesteps(self.indices)
+
+
+def _covered_timesteps(starts: np.ndarray, n_windows: int, length: int):
+    coverage = np.zeros(n_windows + length, dtype=np.int64)
+    np.add.at(coverage, starts, 1)
+    np.add.at(coverage, starts + length, -1)
+    return np.flatnonzero(np.cumsum(coverage) > 0)
+
+
+def _gather_timesteps(windows: np.ndarray, timesteps: np.ndarray):
+    # the window starting at the timestep, or the last window for the timesteps
+    # only covered by its tail
+    starts = np.minimum(timesteps, len(windows) - 1)
+    return windows[starts, timesteps - starts]
+
+
+def _sliding_windows(block: np.ndarray) -> np.ndarray:
+    if len(block) < WINDOW_SIZE:
+        return np.empty((0, WINDOW_SIZE, block.shape[1]), dtype=block.dtype)
+    return sliding_window_view(block, WINDOW_SIZE, axis=0).transpose(0, 2, 1)
+
+
+def features_to_windows(features: pd.DataFrame) -> FeatureWindows:
+    label_windows = _sliding_windows(features[LABELS].to_numpy(dtype=np.float32))
+    control_windows = _sliding_windows(features[CONTROL].to_numpy(dtype=np.float32))
+    forecasts = features[FORECASTS].to_numpy(dtype=np.float32)
+    return FeatureWindows(
+        history=label_windows[:, :HISTORY_TIMESTEPS_IN_FEATURES],
+        control=control_windows[:, HISTORY_TIMESTEPS_IN_FEATURES:],
+        forecasts=forecasts[
+            HISTORY_TIMESTEPS_IN_FEATURES : HISTORY_TIMESTEPS_IN_FEATURES
+            + len(label_windows),
+            :,
+            np.newaxis,
+        ],
+        labels=label_windows[:, HISTORY_TIMESTEPS_IN_FEATURES:],
+    )
+
+
+def windows_to_dataset(
+    windows: FeatureWindows,
+    indices: np.ndarray | None = None,
+    *,
+    batch_size: int = BATCH_SIZE,
+    cache: bool = False,
+) -> tf.data.Dataset:
+    """Create dataset of batched windows
+
+    If ``indices`` is given, only the windows at the indices are included. The
+    batches are copied from the windows when they are iterated. If ``cache`` is
+    true, the batches are kept in memory after the first iteration.
+    """
+
+    if indices is None:
+        indices = np.arange(len(windows))
+
+    def _generate_batches():
+        for start in range(0, len(indices), batch_size):
+            batch_indices = indices[start : start + batch_size]
+            yield (
+                {
+                    HISTORY: windows.history[batch_indices],
+                    CONTROL: windows.control[batch_indices],
+                    FORECASTS: windows.forecasts[batch_indices],
+                },
+                windows.labels[batch_indices],
+            )
+
+    def _spec(array: np.ndarray):
+        return tf.TensorSpec([None, *array.shape[1:]], tf.float32)
+
+    dataset = tf.data.Dataset.from_generator(
+        _generate_batches,
+        output_signature=(
+            {
+                HISTORY: _spec(windows.history),
+                CONTROL: _spec(windows.control),
+                FORECASTS: _spec(windows.forecasts),
+            },
+            _spec(windows.labels),
+        ),
     )
+    if cache:
+        dataset = dataset.cache()
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def features_to_dataset(features: pd.DataFrame, *, cache: bool = False):
+    return windows_to_dataset(features_to_windows(features), cache=cache)
 
 
 def features_to_model_input(
@@ -387,33 +902,83 @@ def features_to_model_input(
     )
 
 
-def split_data_to_train_and_validation(features: pd.DataFrame):
-    features = features.sort_index(axis="columns")
-    datasets = [None, None, None]
-    chunk_sizes = [TRAIN_CHUNK_SIZE, VALIDATION_CHUNK_SIZE, TEST_CHUNK_SIZE]
-    for i, chunk_size in itertools.cycle(list(enumerate(chunk_sizes))):
-        next_features = features.iloc[:chunk_size, :]
-        if next_features.empty:
-            break
-        features.drop(next_features.index, inplace=True)
-        next_dataset = features_to_dataset(next_features)
-        datasets[i] = (
-            dataset.concatenate(next_dataset)
-            if (dataset := datasets[i]) is not None
-            else next_dataset
+def split_windows(
+    windows: FeatureWindows,
+    ratios: typing.Sequence[float] = SPLIT_RATIOS,
+    *,
+    seed: int | None = None,
+) -> list[np.ndarray]:
+    """Split the windows to training, validation and test sets
+
+    The timesteps are divided into periods of ``SPLIT_PERIOD`` timesteps, and
+    each period into consecutive chunks with sizes proportional to ``ratios``.
+    The windows fully within the ``i``th chunk of a period belong to the ``i``th
+    split. Returns the indices of the windows in each split. If ``seed`` is
+    given, the indices are shuffled.
+    """
+
+    total = sum(ratios)
+    chunk_bounds = np.cumsum(
+        [0, *(round(SPLIT_PERIOD * ratio / total) for ratio in ratios)]
+    )
+    starts = np.arange(len(windows))
+    offsets = starts % SPLIT_PERIOD
+    splits = np.searchsorted(chunk_bounds, offsets, side="right") - 1
+    chunk_ends = starts - offsets + chunk_bounds[np.minimum(splits + 1, len(ratios))]
+    is_within_chunk = (splits < len(ratios)) & (starts + WINDOW_SIZE <= chunk_ends)
+    indices = [starts[is_within_chunk & (splits == i)] for i in range(len(ratios))]
+    if seed is not None:
+        rng = np.random.default_rng(seed)
+        indices = [rng.permutation(split_indices) for split_indices in indices]
+    return indices
+
+
+def split_data_to_train_and_validation(
+    features: pd.DataFrame,
+    ratios: typing.Sequence[float] = SPLIT_RATIOS,
+    *,
+    seed: int | None = None,
+    batch_size: int = BATCH_SIZE,
+    cache: bool = False,
+):
+    """Create training, validation and test splits from the features
+
+    See :func:`split_windows` for how ``ratios`` and ``seed`` are used.
+    """
+
+    windows = features_to_windows(features.sort_index(axis="columns"))
+    return [
+        DataSplit(
+            windows,
+            split_indices,
+            windows_to_dataset(
+                windows, split_indices, batch_size=batch_size, cache=cache
+            ),
         )
-    return datasets
+        for split_indices in split_windows(windows, ratios, seed=seed)
+    ]
 
 
 class TutinaModel(tf.keras.Model):
-    def __init__(self, n_labels: int, *args, **kwargs):
+    def __init__(
+        self,
+        n_labels: int,
+        *args,
+        lstm_units: int = LSTM_UNITS,
+        dense_units: int = DENSE_UNITS,
+        conv_filters: int = CONV_FILTERS,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self.n_labels = n_labels
+        self.lstm_units = lstm_units
+        self.dense_units = dense_units
+        self.conv_filters = conv_filters
         # history part
         self.history_normalization_layer = tf.keras.layers.Normalization(
             name="history_normalization"
         )
-        self.lstm_cell = tf.keras.layers.LSTMCell(32, name="history_ltsm_cell")
+        self.lstm_cell = tf.keras.layers.LSTMCell(lstm_units, name="history_ltsm_cell")
         self.rnn = tf.keras.layers.RNN(
             self.lstm_cell, return_state=True, name="history_ltsm"
         )
@@ -428,7 +993,7 @@ class TutinaModel(tf.keras.Model):
         self.forecasts_layer = tf.keras.Sequential(
             [
                 self.forecasts_normalization_layer,
-                tf.keras.layers.Conv1D(4, 2),
+                tf.keras.layers.Conv1D(conv_filters, 2),
             ],
             name="forecasts_layer",
         )
@@ -436,7 +1001,7 @@ class TutinaModel(tf.keras.Model):
         self.mlp = tf.keras.Sequential(
             [
                 tf.keras.layers.Concatenate(),
-                tf.keras.layers.Dense(64, activation="relu"),
+                tf.keras.layers.Dense(dense_units, activation="relu"),
                 tf.keras.layers.Dense(
                     n_labels, kernel_initializer=tf.initializers.zeros()
                 ),
@@ -448,64 +1013,161 @@ class TutinaModel(tf.keras.Model):
         return {
             **super().get_config(),
             "n_labels": self.n_labels,
+            "lstm_units": self.lstm_units,
+            "dense_units": self.dense_units,
+            "conv_filters": self.conv_filters,
         }
 
-    def adapt(self, training_data: tf.data.Dataset):
-        self.history_normalization_layer.adapt(
-            training_data.map(lambda inputs, _: inputs[HISTORY])
-        )
-        self.control_normalization_layer.adapt(
-            training_data.map(lambda inputs, _: inputs[CONTROL])
-        )
-        self.forecasts_normalization_layer.adapt(
-            training_data.map(lambda inputs, _: inputs[FORECASTS])
-        )
+    def adapt(self, timesteps: dict[str, np.ndarray]):
+        """Adapt the normalization layers to the training data
+
+        ``timesteps`` contains the rows of each input block, as returned by
+        :meth:`FeatureWindows.get_timesteps`. The statistics are computed
+        directly from them instead of iterating over the overlapping windows.
+        """
+
+        history = timesteps[HISTORY]
+        control = timesteps[CONTROL]
+        forecasts = timesteps[FORECASTS]
+        for layer, values, input_shape in [
+            (
+                self.history_normalization_layer,
+                history,
+                (None, HISTORY_TIMESTEPS_IN_FEATURES, history.shape[-1]),
+            ),
+            (
+                self.control_normalization_layer,
+                control,
+                (None, CONTROL_TIMESTEPS_IN_FEATURES, control.shape[-1]),
+            ),
+            (
+                self.forecasts_normalization_layer,
+                forecasts,
+                (None, forecasts.shape[-1], 1),
+            ),
+        ]:
+            values = np.asarray(values, dtype=np.float64)
+            # the features are the last axis, or everything with axis=None
+            axis = 0 if layer.axis else None
+            if not layer.built:
+                layer.build(input_shape)
+            layer.adapt_mean.assign(values.mean(axis=axis).astype(np.float32))
+            layer.adapt_variance.assign(values.var(axis=axis).astype(np.float32))
+            layer.finalize_state()
 
     def call(self, inputs, training=None):
         history_inputs = inputs[HISTORY]
         latest = history_inputs[:, -1, :]
         control_inputs = self.control_normalization_layer(inputs[CONTROL])
         forecasts_input = self.forecasts_layer(inputs[FORECASTS])
-        n_output_steps = control_inputs.shape[1]
-        predictions = tf.TensorArray(tf.float32, size=n_output_steps)
         x1 = self.history_normalization_layer(history_inputs)
         x1, *states = self.rnn(x1, training=training)
+        # history and forecasts may be shared by all control inputs in the batch
+        batch_size = tf.shape(control_inputs)[0]
+        x1, latest, forecasts_input, *states = (
+            _broadcast_to_batch(tensor, batch_size)
+            for tensor in [x1, latest, forecasts_input, *states]
+        )
         x2 = control_inputs[:, 0, :]
         x3 = forecasts_input[:, 0, :]
         x = self.mlp([x1, x2, x3], training=training)
         latest = tf.keras.ops.add(latest, x)
-        predictions = predictions.write(0, latest)
-        for i, control_input in enumerate(tf.unstack(control_inputs, axis=1)):
+
+        # roll out the prediction horizon symbolically, so that the graph does
+        # not depend on the number of output steps
+        control_steps = tf.transpose(control_inputs, [1, 0, 2])
+        forecast_steps = tf.transpose(forecasts_input, [1, 0, 2])
+        n_output_steps = tf.shape(control_steps)[0]
+
+        def _rollout_step(i, latest, states, predictions):
             x = self.history_normalization_layer(latest)
             x = tf.squeeze(x, axis=0)
             x1, states = self.lstm_cell(x, states=states, training=training)
-            x2 = control_input
-            x3 = forecasts_input[:, i, :]
-            x = self.mlp([x1, x2, x3], training=training)
+            x = self.mlp([x1, control_steps[i], forecast_steps[i]], training=training)
             latest = tf.keras.ops.add(latest, x)
-            predictions = predictions.write(i, latest)
+            return i + 1, latest, states, predictions.write(i, latest)
+
+        _, _, _, predictions = tf.while_loop(
+            lambda i, *_: i < n_output_steps,
+            _rollout_step,
+            (
+                tf.constant(0),
+                latest,
+                states,
+                tf.TensorArray(latest.dtype, size=n_output_steps),
+            ),
+        )
         predictions = predictions.stack()
         predictions = tf.transpose(predictions, [1, 0, 2])
         return predictions
 
+    @tf.function(reduce_retracing=True)
+    def predict_compiled(self, inputs):
+        """Predict in a compiled graph
+
+        The graph is traced on the first calls, and reused for inputs with
+        differing numbers of timesteps and samples afterwards.
+        """
+
+        return self(inputs, training=False)
+
 
 def load_model(model_file: str):
     return tf.keras.models.load_model(model_file)
 
 
+def export_runtime(model: TutinaModel, runtime_file: str):
+    """Export the model weights for :class:`tutina.ai.runtime.NumpyTutinaModel`"""
+
+    weights = {}
+    for name, layer in [
+        (HISTORY, model.history_normalization_layer),
+        (CONTROL, model.control_normalization_layer),
+        (FORECASTS, model.forecasts_normalization_layer),
+    ]:
+        weights[f"{name}_mean"] = np.asarray(layer.mean).reshape(-1)
+        weights[f"{name}_variance"] = np.asarray(layer.variance).reshape(-1)
+    _, conv_layer = model.forecasts_layer.layers
+    _, dense_layer, output_layer = model.mlp.layers
+    for prefix, layer in [
+        ("lstm", model.lstm_cell),
+        ("conv", conv_layer),
+        ("dense", dense_layer),
+        ("output", output_layer),
+    ]:
+        for weight in layer.weights:
+            weights[f"{prefix}_{weight.name}"] = np.asarray(weight)
+    np.savez(runtime_file, **weights)
+
+
 def create_and_train_model(
-    train_dataset: tf.data.Dataset, validation_dataset: tf.data.Dataset
+    train: DataSplit,
+    validation: DataSplit,
+    *,
+    epochs: int = N_EPOCHS,
+    learning_rate: float = LEARNING_RATE,
+    callbacks: list[tf.keras.callbacks.Callback] | None = None,
+    **model_kwargs,
 ):
-    n_labels = train_dataset.element_spec[1].shape[-1]
-    model = TutinaModel(n_labels)
-    model.adapt(train_dataset)
+    """Create model and train it with the training split
+
+    ``model_kwargs`` are passed to :class:`TutinaModel`, and ``callbacks`` to
+    :meth:`TutinaModel.fit`.
+    """
+
+    n_labels = train.windows.labels.shape[-1]
+    model = TutinaModel(n_labels, **model_kwargs)
+    model.adapt(train.get_timesteps())
     model.compile(
         loss=tf.keras.losses.MeanSquaredError(),
-        optimizer=tf.keras.optimizers.Adam(),
+        optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate),
         metrics=[tf.keras.metrics.MeanAbsoluteError()],
     )
     history = model.fit(
-        train_dataset, validation_data=validation_dataset, epochs=N_EPOCHS
+        train.dataset,
+        validation_data=validation.dataset,
+        epochs=epochs,
+        callbacks=callbacks,
     )
     return model, history
 
@@ -514,7 +1176,7 @@ def predict_single(model: TutinaModel, model_input: TutinaInputFeatures):
     tensorized_input = dict(
         (k, _tensorize_with_batch(v)) for (k, v) in model_input.items()
     )
-    prediction = tf.squeeze(model(tensorized_input, training=False), axis=0)
+    prediction = tf.squeeze(model.predict_compiled(tensorized_input), axis=0)
     return pd.DataFrame(
         prediction,
         columns=model_input[HISTORY].columns,
@@ -522,87 +1184,28 @@ def predict_single(model: TutinaModel, model_input: TutinaInputFeatures):
     )
 
 
-def plot_comparison(sample: pd.DataFrame, prediction: pd.DataFrame):
-    import seaborn as sns
-    from matplotlib import pyplot as plt
-
-    comparison_data = pd.concat(
-        [sample[LABELS], prediction], keys=["actual", "predicted"], axis="columns"
-    )
-    comparison_data.columns.names = ["type", "room"]
-    comparison_data = comparison_data.melt(
-        value_name="temperature", ignore_index=False
-    ).reset_index(names="timestamp")
-    sns.relplot(
-        comparison_data,
-        x="timestamp",
-        y="temperature",
-        col="room",
-        col_wrap=4,
-        hue="type",
-    )
-    plt.show()
-
-
-def plot_prediction(history: pd.DataFrame, prediction: pd.DataFrame):
-    import matplotlib.colors as mcolors
-    import matplotlib.dates as mdates
-    import matplotlib.pyplot as plt
-
-    prediction = pd.concat([history.iloc[-1:], prediction])
-    history_mean = history.drop(columns=TEMPERATURE_OUTDOOR, errors="ignore").mean(
-        axis="columns"
-    )
-    prediction_mean = prediction.drop(
-        columns=TEMPERATURE_OUTDOOR, errors="ignore"
-    ).mean(axis="columns")
-    locator = mdates.HourLocator(byhour=np.arange(0, 24, 4))
-    formatter = mdates.ConciseDateFormatter(locator)
-    fig, ax = plt.subplots()
-    ax.xaxis.set_major_locator(locator)
-    ax.xaxis.set_major_formatter(formatter)
-    lines = []
-    lines.append(
-        ax.plot(
-            history_mean.index,
-            history_mean,
-            label="Measured",
-            linestyle="solid",
-            color="black",
-            linewidth=3,
-        )[0]
-    )
-    lines.append(
-        ax.plot(
-            prediction_mean.index,
-            prediction_mean,
-            linestyle="dashed",
-            color="black",
-            label="Predicted",
-            linewidth=3,
-        )[0]
-    )
-    colors = mcolors.TABLEAU_COLORS.values()
-    for column, color in zip(history.columns, colors):
-        lines.append(
-            ax.plot(
-                history.index,
-                history[column],
-                label=column,
-                linestyle="solid",
-                color=color,
-                alpha=0.5,
-            )[0]
-        )
-        ax.plot(
-            prediction.index,
-            prediction[column],
-            linestyle="dashed",
-            color=color,
-            alpha=0.5,
-        )
-    ax.set(ylabel="Temperature (℃)", title="Room temperature prediction")
-    ax.legend(handles=lines)
-    ax.grid()
-    ax.autoscale(axis="x", tight=True)
-    return fig, ax
+def predict_batch(
+    model: TutinaModel,
+    history: pd.DataFrame,
+    controls: list[pd.DataFrame],
+    forecasts: pd.DataFrame,
+):
+    """Predict the same history and forecasts with alternative control inputs
+
+    The history and forecasts are encoded only once, and the control inputs
+    are stacked into a single batch.
+    """
+
+    control_columns = controls[0].columns
+    tensorized_input = {
+        HISTORY: _tensorize_with_batch(history),
+        CONTROL: tf.constant(
+            np.stack([control[control_columns].to_numpy() for control in controls])
+        ),
+        FORECASTS: _tensorize_with_batch(forecasts),
+    }
+    predictions = model.predict_compiled(tensorized_input)
+    return [
+        pd.DataFrame(prediction, columns=history.columns, index=control.index)
+        for (prediction, control) in zip(predictions, controls)
+    ]
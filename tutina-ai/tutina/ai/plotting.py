@@ -0,0 +1,110 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from .types import LABELS, TEMPERATURE_OUTDOOR
+
+
+def plot_comparison(sample: pd.DataFrame, prediction: pd.DataFrame):
+    import seaborn as sns
+    from matplotlib import pyplot as plt
+
+    comparison_data = pd.concat(
+        [sample[LABELS], prediction], keys=["actual", "predicted"], axis="columns"
+    )
+    comparison_data.columns.names = ["type", "room"]
+    comparison_data = comparison_data.melt(
+        value_name="temperature", ignore_index=False
+    ).reset_index(names="timestamp")
+    sns.relplot(
+        comparison_data,
+        x="timestamp",
+        y="temperature",
+        col="room",
+        col_wrap=4,
+        hue="type",
+    )
+    plt.show()
+
+
+def plot_prediction(history: pd.DataFrame, prediction: pd.DataFrame):
+    import matplotlib.colors as mcolors
+    import matplotlib.dates as mdates
+    import matplotlib.pyplot as plt
+
+    prediction = pd.concat([history.iloc[-1:], prediction])
+    history_mean = history.drop(columns=TEMPERATURE_OUTDOOR, errors="ignore").mean(
+        axis="columns"
+    )
+    prediction_mean = prediction.drop(
+        columns=TEMPERATURE_OUTDOOR, errors="ignore"
+    ).mean(axis="columns")
+    locator = mdates.HourLocator(byhour=np.arange(0, 24, 4))
+    formatter = mdates.ConciseDateFormatter(locator)
+    fig, ax = plt.subplots()
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(formatter)
+    lines = []
+    lines.append(
+        ax.plot(
+            history_mean.index,
+            history_mean,
+            label="Measured",
+            linestyle="solid",
+            color="black",
+            linewidth=3,
+        )[0]
+    )
+    lines.append(
+        ax.plot(
+            prediction_mean.index,
+            prediction_mean,
+            linestyle="dashed",
+            color="black",
+            label="Predicted",
+            linewidth=3,
+        )[0]
+    )
+    colors = mcolors.TABLEAU_COLORS.values()
+    for column, color in zip(history.columns, colors):
+        lines.append(
+            ax.plot(
+                history.index,
+                history[column],
+                label=column,
+                linestyle="solid",
+                color=color,
+                alpha=0.5,
+            )[0]
+        )
+        ax.plot(
+            prediction.index,
+            prediction[column],
+            linestyle="dashed",
+            color=color,
+            alpha=0.5,
+        )
+    ax.set(ylabel="Temperature (℃)", title="Room temperature prediction")
+    ax.legend(handles=lines)
+    ax.grid()
+    ax.autoscale(axis="x", tight=True)
+    return fig, ax
+
+
+def use_non_interactive_backend():
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+def render_prediction_svg(history: pd.DataFrame, prediction: pd.DataFrame) -> bytes:
+    import matplotlib.pyplot as plt
+
+    fig, _ = plot_prediction(history, prediction)
+    try:
+        f = io.BytesIO()
+        fig.savefig(f, format="svg")
+        return f.getvalue()
+    finally:
+        plt.close(fig)
@@ -0,0 +1,135 @@
+"""Inference runtime for the Tutina model using plain NumPy
+
+The runtime uses weights exported with :func:`tutina.ai.model.export_runtime`,
+and does not depend on TensorFlow.
+"""
+
+import typing
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .types import CONTROL, FORECASTS, HISTORY, TutinaInputFeatures
+
+EPSILON = 1e-7
+
+
+def _sigmoid(x: np.ndarray):
+    return 0.5 * (1.0 + np.tanh(0.5 * x))
+
+
+def _relu(x: np.ndarray):
+    return np.maximum(x, 0.0)
+
+
+def _broadcast_to_batch(array: np.ndarray, batch_size: int):
+    return np.broadcast_to(array, (batch_size, *array.shape[1:]))
+
+
+def _as_batch(df: pd.DataFrame):
+    return df.to_numpy(dtype=np.float32)[np.newaxis]
+
+
+class NumpyTutinaModel:
+    def __init__(self, weights: typing.Mapping[str, np.ndarray]):
+        self._weights = {k: v.astype(np.float32) for (k, v) in weights.items()}
+
+    @classmethod
+    def from_file(cls, runtime_file: Path | str):
+        with np.load(runtime_file) as weights:
+            return cls(weights)
+
+    def _normalize(self, name: str, x: np.ndarray):
+        mean = self._weights[f"{name}_mean"]
+        variance = self._weights[f"{name}_variance"]
+        return (x - mean) / np.maximum(np.sqrt(variance), EPSILON)
+
+    def _lstm_step(self, x: np.ndarray, h: np.ndarray, c: np.ndarray):
+        z = (
+            x @ self._weights["lstm_kernel"]
+            + h @ self._weights["lstm_recurrent_kernel"]
+            + self._weights["lstm_bias"]
+        )
+        z_i, z_f, z_c, z_o = np.split(z, 4, axis=-1)
+        c = _sigmoid(z_f) * c + _sigmoid(z_i) * np.tanh(z_c)
+        h = _sigmoid(z_o) * np.tanh(c)
+        return h, c
+
+    def _forecasts_layer(self, forecasts: np.ndarray):
+        x = self._normalize(FORECASTS, forecasts)
+        kernel = self._weights["conv_kernel"]
+        kernel_size = kernel.shape[0]
+        n_outputs = x.shape[1] - kernel_size + 1
+        return (
+            sum(x[:, k : k + n_outputs, :] @ kernel[k] for k in range(kernel_size))
+            + self._weights["conv_bias"]
+        )
+
+    def _mlp(self, x1: np.ndarray, x2: np.ndarray, x3: np.ndarray):
+        x = np.concatenate([x1, x2, x3], axis=-1)
+        x = _relu(x @ self._weights["dense_kernel"] + self._weights["dense_bias"])
+        return x @ self._weights["output_kernel"] + self._weights["output_bias"]
+
+    def __call__(self, inputs: typing.Mapping[str, np.ndarray]) -> np.ndarray:
+        """Predict using the same computation as :class:`TutinaModel`"""
+
+        history_inputs = inputs[HISTORY]
+        latest = history_inputs[:, -1, :]
+        control_inputs = self._normalize(CONTROL, inputs[CONTROL])
+        forecasts_input = self._forecasts_layer(inputs[FORECASTS])
+        n_units = self._weights["lstm_recurrent_kernel"].shape[0]
+        h = c = np.zeros((history_inputs.shape[0], n_units), dtype=np.float32)
+        x = self._normalize(HISTORY, history_inputs)
+        for t in range(x.shape[1]):
+            h, c = self._lstm_step(x[:, t, :], h, c)
+        batch_size = control_inputs.shape[0]
+        h, c, latest, forecasts_input = (
+            _broadcast_to_batch(array, batch_size)
+            for array in [h, c, latest, forecasts_input]
+        )
+        x = self._mlp(h, control_inputs[:, 0, :], forecasts_input[:, 0, :])
+        latest = latest + x
+        predictions = []
+        for i in range(control_inputs.shape[1]):
+            h, c = self._lstm_step(self._normalize(HISTORY, latest), h, c)
+            x = self._mlp(h, control_inputs[:, i, :], forecasts_input[:, i, :])
+            latest = latest + x
+            predictions.append(latest)
+        return np.stack(predictions, axis=1)
+
+
+def predict_single(model: NumpyTutinaModel, model_input: TutinaInputFeatures):
+    prediction = model(
+        {k: _as_batch(typing.cast(pd.DataFrame, v)) for (k, v) in model_input.items()}
+    )[0]
+    return pd.DataFrame(
+        prediction,
+        columns=model_input[HISTORY].columns,
+        index=model_input[CONTROL].index,
+    )
+
+
+def predict_batch(
+    model: NumpyTutinaModel,
+    history: pd.DataFrame,
+    controls: list[pd.DataFrame],
+    forecasts: pd.DataFrame,
+):
+    control_columns = controls[0].columns
+    predictions = model(
+        {
+            HISTORY: _as_batch(history),
+            CONTROL: np.stack(
+                [
+                    control[control_columns].to_numpy(dtype=np.float32)
+                    for control in controls
+                ]
+            ),
+            FORECASTS: _as_batch(forecasts),
+        }
+    )
+    return [
+        pd.DataFrame(prediction, columns=history.columns, index=control.index)
+        for (prediction, control) in zip(predictions, controls)
+    ]
@@ -0,0 +1,204 @@
+"""Hyperparameter sweeps for Tutina AI model
+
+The sweep is specified in the ``sweep`` table of the model config:
+
+.. code-block:: toml
+
+    [model.config.sweep]
+    strategy = "random"
+    n_candidates = 8
+    seed = 1
+    patience = 4
+    threads_per_worker = 2
+
+    [model.config.sweep.parameters]
+    lstm_units = [16, 32, 64]
+    dense_units = [32, 64, 128]
+    learning_rate = [0.001, 0.0003]
+
+With the ``grid`` strategy, every combination of the parameters is trained. With
+the ``random`` strategy, ``n_candidates`` combinations are sampled from the grid.
+
+The candidates are trained in a pool of worker processes. The features are
+loaded once, and shared with the workers in shared memory.
+"""
+
+import itertools
+import logging
+import os
+import random
+import typing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context, resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+GRID = "grid"
+RANDOM = "random"
+HYPERPARAMETERS = frozenset(
+    [
+        "lstm_units",
+        "dense_units",
+        "conv_filters",
+        "learning_rate",
+        "batch_size",
+        "epochs",
+    ]
+)
+DEFAULT_N_CANDIDATES = 10
+DEFAULT_PATIENCE = 4
+DEFAULT_THREADS_PER_WORKER = 1
+VALIDATION_MAE = "val_mean_absolute_error"
+EPOCHS_TRAINED = "epochs_trained"
+
+_THREAD_ENVIRONMENT_VARIABLES = [
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "TF_NUM_INTRAOP_THREADS",
+]
+
+_features: pd.DataFrame | None = None
+_features_memory: shared_memory.SharedMemory | None = None
+
+
+class _SharedFeatures(typing.NamedTuple):
+    name: str
+    shape: tuple[int, ...]
+    timestamps: pd.Index
+    columns: pd.Index
+
+
+def get_candidates(spec: dict[str, typing.Any]) -> list[dict[str, typing.Any]]:
+    """Get the hyperparameter candidates from the sweep ``spec``"""
+
+    parameters = {
+        name: values if isinstance(values, list) else [values]
+        for (name, values) in spec.get("parameters", {}).items()
+    }
+    if unknown := parameters.keys() - HYPERPARAMETERS:
+        raise ValueError(f"Unknown hyperparameters: {', '.join(sorted(unknown))}")
+    candidates = [
+        dict(zip(parameters, values))
+        for values in itertools.product(*parameters.values())
+    ]
+    strategy = spec.get("strategy", GRID)
+    if strategy == RANDOM:
+        n_candidates = spec.get("n_candidates", DEFAULT_N_CANDIDATES)
+        rng = random.Random(spec.get("seed"))
+        candidates = rng.sample(candidates, min(n_candidates, len(candidates)))
+    elif strategy != GRID:
+        raise ValueError(f"Unknown sweep strategy: {strategy}")
+    return candidates
+
+
+def _init_worker(shared: _SharedFeatures, threads: int):
+    global _features, _features_memory
+
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+
+    _features_memory = shared_memory.SharedMemory(name=shared.name)
+    # the parent process owns the memory and unlinks it after the sweep
+    resource_tracker.unregister(_features_memory._name, "shared_memory")  # type: ignore
+    values: np.ndarray = np.ndarray(
+        shared.shape, dtype=np.float64, buffer=_features_memory.buf
+    )
+    _features = pd.DataFrame(
+        values, index=shared.timestamps, columns=shared.columns, copy=False
+    )
+
+
+def _train_candidate(candidate: dict[str, typing.Any], patience: int):
+    import tensorflow as tf
+
+    from . import model as m
+
+    assert _features is not None
+    hyperparameters = dict(candidate)
+    batch_size = hyperparameters.pop("batch_size", m.BATCH_SIZE)
+    train, validation, _ = m.split_data_to_train_and_validation(
+        _features, batch_size=batch_size
+    )
+    early_stopping = tf.keras.callbacks.EarlyStopping(
+        monitor=VALIDATION_MAE, patience=patience, restore_best_weights=True
+    )
+    _, history = m.create_and_train_model(
+        train, validation, callbacks=[early_stopping], **hyperparameters
+    )
+    validation_maes = history.history[VALIDATION_MAE]
+    return {
+        **candidate,
+        EPOCHS_TRAINED: len(validation_maes),
+        VALIDATION_MAE: min(validation_maes),
+    }
+
+
+def run_sweep(features: pd.DataFrame, spec: dict[str, typing.Any]) -> pd.DataFrame:
+    """Train the candidates of the sweep ``spec`` with ``features``
+
+    Returns the results ranked by the best validation MAE of each candidate.
+    """
+
+    candidates = get_candidates(spec)
+    patience = spec.get("patience", DEFAULT_PATIENCE)
+    threads = spec.get("threads_per_worker", DEFAULT_THREADS_PER_WORKER)
+    max_workers = spec.get("max_workers") or max(1, (os.cpu_count() or 1) // threads)
+    max_workers = min(max_workers, len(candidates)) or 1
+    logger.info(
+        "Training %d candidates with %d workers, %d threads each",
+        len(candidates),
+        max_workers,
+        threads,
+    )
+
+    # the math libraries read the limits when the workers import them
+    for variable in _THREAD_ENVIRONMENT_VARIABLES:
+        os.environ[variable] = str(threads)
+
+    values = features.to_numpy(dtype=np.float64)
+    memory = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    try:
+        np.ndarray(values.shape, dtype=values.dtype, buffer=memory.buf)[:] = values
+        shared = _SharedFeatures(
+            memory.name, values.shape, features.index, features.columns
+        )
+        del values
+        results = []
+        with ProcessPoolExecutor(
+            max_workers,
+            # forking a process that has imported TensorFlow is not safe
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(shared, threads),
+        ) as executor:
+            futures = {
+                executor.submit(_train_candidate, candidate, patience): candidate
+                for candidate in candidates
+            }
+            for future in as_completed(futures):
+                candidate = futures[future]
+                try:
+                    result = future.result()
+                except Exception:
+                    logger.exception("Training candidate %r failed", candidate)
+                else:
+                    logger.info("Trained candidate %r", result)
+                    results.append(result)
+    finally:
+        memory.close()
+        memory.unlink()
+
+    if not results:
+        return pd.DataFrame(columns=[EPOCHS_TRAINED, VALIDATION_MAE])
+    return (
+        pd.DataFrame(results)
+        .sort_values(VALIDATION_MAE, ignore_index=True)
+        .rename_axis("rank")
+        .rename(lambda rank: rank + 1)
+    )
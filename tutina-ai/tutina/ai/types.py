@@ -3,6 +3,19 @@ import typing
 if typing.TYPE_CHECKING:
     from pandas import DataFrame
 
+OUTDOOR = "outdoor"
+TEMPERATURE_OUTDOOR = f"temperature_{OUTDOOR}"
+MEASUREMENTS = "measurements"
+TEMPERATURE = "temperature"
+FORECASTS = "forecasts"
+HVACS = "hvacs"
+OPENINGS = "openings"
+IS_OPEN = "is_open"
+LABELS = "labels"
+INPUTS = "inputs"
+HISTORY = "history"
+CONTROL = "control"
+
 
 class TutinaInputFeatures(typing.TypedDict):
     history: "DataFrame"
@@ -7,9 +7,10 @@ from fastapi.testclient import TestClient
 
 from tutina.app import app
 from tutina.app import dependencies as dep
+from tutina.app.prediction_cache import PredictionCache
 from tutina.lib.db import create_async_engine
 from tutina.lib.db import metadata as db_metadata
-from tutina.lib.settings import DatabaseSettings, Settings
+from tutina.lib.settings import DatabaseSettings, Settings, TutinaSettings
 
 TOKEN_SECRET = "secret"
 DATABASE_URL = "sqlite+aiosqlite:///:memory:"
@@ -33,7 +34,7 @@ def client(auth_token):
 
 @pytest.fixture
 def mock_tutina_model():
-    _mock_tutina_model = mock.Mock()
+    _mock_tutina_model = mock.Mock(version="test")
     return _mock_tutina_model
 
 
@@ -45,14 +46,30 @@ async def mock_database_engine():
     return engine
 
 
+@pytest.fixture
+def mock_plot_renderer():
+    return mock.Mock(render_prediction_svg=mock.AsyncMock())
+
+
+@pytest.fixture
+def prediction_cache():
+    return PredictionCache()
+
+
 @pytest.fixture(autouse=True)
-def dependency_overrides(mock_tutina_model, mock_database_engine):
+def dependency_overrides(
+    mock_tutina_model, mock_database_engine, mock_plot_renderer, prediction_cache
+):
     app.dependency_overrides = {
         dep.get_config: lambda: Settings(
-            database=DatabaseSettings(url=DATABASE_URL), token_secret=TOKEN_SECRET
+            database=DatabaseSettings(url=DATABASE_URL),
+            tutina=TutinaSettings(token_secret=TOKEN_SECRET),
         ),
         dep.get_tutina_model: (lambda: mock_tutina_model),
         dep.get_database_engine: (lambda: mock_database_engine),
+        dep.get_prediction_cache: (lambda: prediction_cache),
+        dep.get_plot_renderer: (lambda: mock_plot_renderer),
+        dep.get_ingestion_buffer: (lambda: None),
     }
     yield
     app.dependency_overrides = {}
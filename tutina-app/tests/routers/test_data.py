@@ -1,9 +1,14 @@
+from datetime import datetime
+
 import pytest
 import sqlalchemy as sa
 from fastapi.encoders import jsonable_encoder
 from fastapi.testclient import TestClient
 
-from tutina.lib import db, types
+from tutina.app import app
+from tutina.app import dependencies as dep
+from tutina.app.ingestion_buffer import IngestionBuffer
+from tutina.lib import data, db, types
 
 
 @pytest.fixture
@@ -160,3 +165,248 @@ async def test_post_forecasts(client, forecasts, mock_database_engine):
 async def test_post_forecasts_empty_request(client, mock_database_engine):
     res = client.post("/data/forecasts", json=[])
     assert res.status_code == 422
+
+
+async def test_post_measurements_updates_rollup(
+    client, measurements, mock_database_engine
+):
+    serialized_measurements = jsonable_encoder(measurements)
+    res = client.post("/data/measurements", json=serialized_measurements)
+    assert res.status_code == 204
+    async with mock_database_engine.begin() as connection:
+        rollups = (
+            (
+                await connection.execute(
+                    sa.select(db.locations.c.slug, db.measurements_hourly).select_from(
+                        db.locations.join(db.measurements_hourly)
+                    )
+                )
+            )
+            .mappings()
+            .fetchall()
+        )
+    rollups_by_location = {rollup["slug"]: rollup for rollup in rollups}
+    for measurement in measurements:
+        rollup = rollups_by_location[measurement.location]
+        assert rollup["temperature_count"] == 1
+        assert rollup["temperature_sum"] == measurement.temperature
+
+
+async def test_post_hvacs_updates_rollup(client, hvacs, mock_database_engine):
+    serialized_hvacs = jsonable_encoder(hvacs)
+    res = client.post("/data/hvacs", json=serialized_hvacs)
+    assert res.status_code == 204
+    async with mock_database_engine.begin() as connection:
+        rollups = (
+            (
+                await connection.execute(
+                    sa.select(db.hvac_devices.c.slug, db.hvacs_hourly).select_from(
+                        db.hvac_devices.join(db.hvacs_hourly)
+                    )
+                )
+            )
+            .mappings()
+            .fetchall()
+        )
+    rollups_by_device = {rollup["slug"]: rollup for rollup in rollups}
+    for hvac in hvacs:
+        rollup = rollups_by_device[hvac.device]
+        assert rollup["state_count"] == 1
+        assert rollup[f"{hvac.state.name}_count"] == 1
+        assert rollup["temperature_sum"] == hvac.temperature
+
+
+async def test_post_batch(
+    client, measurements, hvacs, opening_states, forecasts, mock_database_engine
+):
+    batch = types.DataBatch(
+        measurements=measurements,
+        hvacs=hvacs,
+        opening_states=opening_states,
+        forecasts=forecasts,
+    )
+    res = client.post("/data/batch", json=jsonable_encoder(batch))
+    assert res.status_code == 204
+    async with mock_database_engine.begin() as connection:
+        counts = [
+            (
+                await connection.execute(sa.select(sa.func.count()).select_from(table))
+            ).scalar_one()
+            for table in [db.measurements, db.hvacs, db.opening_states, db.forecasts]
+        ]
+    assert counts == [
+        len(measurements),
+        len(hvacs),
+        len(opening_states),
+        len(forecasts),
+    ]
+
+
+async def test_post_batch_transitions(client, faker, mock_database_engine):
+    batch = types.DataBatch(
+        hvac_transitions=[
+            types.HvacTransition(
+                timestamp=faker.date_time(),
+                device=faker.pystr(),
+                state=faker.enum(db.HvacState),
+                temperature=faker.pyfloat(),
+            )
+            for _ in range(5)
+        ],
+        opening_transitions=[
+            types.OpeningTransition(
+                timestamp=faker.date_time(),
+                opening_type=faker.enum(db.OpeningType),
+                opening=faker.pystr(),
+                is_open=faker.pybool(),
+            )
+            for _ in range(5)
+        ],
+    )
+    # submitting the same transitions again does not duplicate them
+    for _ in range(2):
+        res = client.post("/data/batch", json=jsonable_encoder(batch))
+        assert res.status_code == 204
+    async with mock_database_engine.begin() as connection:
+        counts = [
+            (
+                await connection.execute(sa.select(sa.func.count()).select_from(table))
+            ).scalar_one()
+            for table in [db.hvac_transitions, db.opening_transitions]
+        ]
+    assert counts == [len(batch.hvac_transitions), len(batch.opening_transitions)]
+
+
+async def test_post_batches(client, measurements, mock_database_engine):
+    timestamps = [datetime(2024, 1, 1, 12, 0), datetime(2024, 1, 1, 12, 5)]
+    batches = [
+        types.DataBatch(measurements=measurements, timestamp=timestamp)
+        for timestamp in timestamps
+    ]
+    res = client.post("/data/batches", json=jsonable_encoder(batches))
+    assert res.status_code == 204
+    async with mock_database_engine.begin() as connection:
+        stored_timestamps = (
+            (
+                await connection.execute(
+                    sa.select(db.measurements.c.timestamp).distinct()
+                )
+            )
+            .scalars()
+            .all()
+        )
+    assert sorted(stored_timestamps) == timestamps
+
+
+async def test_post_batches_already_stored(client, measurements, mock_database_engine):
+    batch = types.DataBatch(
+        measurements=measurements, timestamp=datetime(2024, 1, 1, 12, 0)
+    )
+    res = client.post("/data/batch", json=jsonable_encoder(batch))
+    assert res.status_code == 204
+    res = client.post("/data/batches", json=jsonable_encoder([batch]))
+    assert res.status_code == 409
+    async with mock_database_engine.begin() as connection:
+        count = (
+            await connection.execute(
+                sa.select(sa.func.count()).select_from(db.measurements)
+            )
+        ).scalar_one()
+    assert count == len(measurements)
+
+
+async def test_post_batches_invalid(
+    client, measurements, mock_database_engine, monkeypatch
+):
+    async def _store_received_batches(batches, *, connection):
+        await connection.execute(db.locations.insert().values(slug=None))
+
+    monkeypatch.setattr(data, "store_received_batches", _store_received_batches)
+    batch = types.DataBatch(
+        measurements=measurements, timestamp=datetime(2024, 1, 1, 12, 0)
+    )
+    res = client.post("/data/batches", json=jsonable_encoder([batch]))
+    assert res.status_code == 422
+
+
+async def test_is_duplicate_key_error(mock_database_engine):
+    async with mock_database_engine.begin() as connection:
+        await connection.execute(db.locations.insert().values(slug="a"))
+    for statement, is_duplicate in [
+        (db.locations.insert().values(slug="a"), True),
+        (db.locations.insert().values(slug=None), False),
+    ]:
+        with pytest.raises(sa.exc.IntegrityError) as ex_info:
+            async with mock_database_engine.begin() as connection:
+                await connection.execute(statement)
+        assert data.is_duplicate_key_error(ex_info.value) == is_duplicate
+
+
+async def test_post_batches_empty_request(client, mock_database_engine):
+    res = client.post("/data/batches", json=[])
+    assert res.status_code == 422
+
+
+async def test_post_batch_empty_request(client, mock_database_engine):
+    res = client.post("/data/batch", json={})
+    assert res.status_code == 422
+
+
+async def test_post_measurements_caches_location_ids(
+    client, measurements, mock_database_engine
+):
+    batch = types.DataBatch(measurements=measurements, timestamp=datetime(2024, 1, 1))
+    res = client.post("/data/batch", json=jsonable_encoder(batch))
+    assert res.status_code == 204
+    async with mock_database_engine.connect() as connection:
+        cached_ids = data.get_dimension_cache(connection).get(db.locations)
+    assert cached_ids.keys() == {
+        (measurement.location,) for measurement in measurements
+    }
+    batch = types.DataBatch(
+        measurements=measurements, timestamp=datetime(2024, 1, 1, 1)
+    )
+    res = client.post("/data/batch", json=jsonable_encoder(batch))
+    assert res.status_code == 204
+
+
+async def test_dimension_cache_ignores_rolled_back_ids(
+    measurements, mock_database_engine
+):
+    with pytest.raises(RuntimeError):
+        async with data.begin(mock_database_engine) as connection:
+            await data.store_measurements(measurements, connection=connection)
+            raise RuntimeError
+    assert not data.get_dimension_cache(connection).get(db.locations)
+
+
+async def test_dimension_cache_keeps_committed_ids(measurements, mock_database_engine):
+    async with data.begin(mock_database_engine) as connection:
+        await data.store_measurements(measurements, connection=connection)
+        # not visible to the other transactions before the commit
+        assert not data.get_dimension_cache(connection).get(db.locations)
+    assert data.get_dimension_cache(connection).get(db.locations).keys() == {
+        (measurement.location,) for measurement in measurements
+    }
+
+
+async def test_post_measurements_buffer_full(
+    client, measurements, mock_database_engine
+):
+    ingestion_buffer = IngestionBuffer(
+        mock_database_engine, max_size=1, flush_size=1, flush_interval=60.0
+    )
+    app.dependency_overrides[dep.get_ingestion_buffer] = lambda: ingestion_buffer
+    serialized_measurements = jsonable_encoder(measurements)
+    res = client.post("/data/measurements", json=serialized_measurements[:1])
+    assert res.status_code == 204
+    res = client.post("/data/measurements", json=serialized_measurements[1:])
+    assert res.status_code == 429
+    await ingestion_buffer.flush()
+    async with mock_database_engine.begin() as connection:
+        count = (
+            await connection.execute(
+                sa.select(sa.func.count()).select_from(db.measurements)
+            )
+        ).scalar_one()
+    assert count == 1
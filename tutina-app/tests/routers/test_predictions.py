@@ -1,11 +1,15 @@
 import json
 import os
-from unittest.mock import Mock
 
 import pandas as pd
+import pyarrow as pa
 import pytest
 from fastapi.testclient import TestClient
 
+from tutina.app import columnar
+from tutina.app.plot_renderer import PlotRendererBusy
+from tutina.lib.types import ColumnarTutinaModelInput
+
 
 def _fixture_from_file(filename):
     file_path = os.path.join(os.path.dirname(__file__), filename)
@@ -34,14 +38,171 @@ def test_post_predictions_json(
 
 
 def test_post_predictions_svg(
-    client: TestClient, mock_tutina_model, model_input, prediction
+    client: TestClient, mock_tutina_model, mock_plot_renderer, model_input, prediction
 ):
     SVG_CONTENT = b"<svg></svg>"
-    mock_figure = Mock(savefig=lambda f, **_: f.write(SVG_CONTENT))
     mock_tutina_model.predict_single.return_value = pd.DataFrame.from_dict(prediction)
-    mock_tutina_model.plot_prediction.return_value = (mock_figure, None)
+    mock_plot_renderer.render_prediction_svg.return_value = SVG_CONTENT
     response = client.post(
         "/predictions", headers={"accept": "image/svg+xml"}, json=model_input
     )
     assert response.status_code == 200
     assert response.content == SVG_CONTENT
+
+
+def test_post_predictions_svg_renderer_busy(
+    client: TestClient, mock_tutina_model, mock_plot_renderer, model_input, prediction
+):
+    mock_tutina_model.predict_single.return_value = pd.DataFrame.from_dict(prediction)
+    mock_plot_renderer.render_prediction_svg.side_effect = PlotRendererBusy()
+    response = client.post(
+        "/predictions", headers={"accept": "image/svg+xml"}, json=model_input
+    )
+    assert response.status_code == 503
+
+
+def test_post_predictions_batch(
+    client: TestClient, mock_tutina_model, model_input, prediction
+):
+    batch_model_input = {
+        "history": model_input["history"],
+        "controls": [model_input["control"], model_input["control"]],
+        "forecasts": model_input["forecasts"],
+    }
+    mock_tutina_model.predict_batch.return_value = [
+        pd.DataFrame.from_dict(prediction),
+        pd.DataFrame.from_dict(prediction),
+    ]
+    response = client.post("/predictions/batch", json=batch_model_input)
+    assert response.status_code == 200
+    assert response.json() == [prediction, prediction]
+    _, controls, _ = mock_tutina_model.predict_batch.call_args.args
+    assert len(controls) == 2
+
+
+def test_post_predictions_batch_mismatched_controls(client: TestClient, model_input):
+    control = model_input["control"]
+    batch_model_input = {
+        "history": model_input["history"],
+        "controls": [control, dict(list(control.items())[1:])],
+        "forecasts": model_input["forecasts"],
+    }
+    response = client.post("/predictions/batch", json=batch_model_input)
+    assert response.status_code == 422
+
+
+def test_post_predictions_cached(
+    client: TestClient, mock_tutina_model, model_input, prediction
+):
+    mock_tutina_model.predict_single.return_value = pd.DataFrame.from_dict(prediction)
+    for _ in range(2):
+        response = client.post("/predictions", json=model_input)
+        assert response.status_code == 200
+        assert response.json() == prediction
+    mock_tutina_model.predict_single.assert_called_once()
+    response = client.get("/predictions/cache")
+    assert response.status_code == 200
+    statistics = response.json()
+    assert (statistics["hits"], statistics["misses"]) == (1, 1)
+
+
+def _with_utc_offset(features, hours):
+    if not isinstance(features, dict):
+        return features
+    return {
+        (
+            pd.Timestamp(key, tz="UTC").tz_convert(f"Etc/GMT-{hours}").isoformat()
+            if key[0].isdigit()
+            else key
+        ): _with_utc_offset(value, hours)
+        for (key, value) in features.items()
+    }
+
+
+def test_post_predictions_cached_with_different_utc_offsets(
+    client: TestClient, mock_tutina_model, model_input, prediction
+):
+    mock_tutina_model.predict_single.return_value = pd.DataFrame.from_dict(prediction)
+    for request_body in [model_input, _with_utc_offset(model_input, 2)]:
+        response = client.post("/predictions", json=request_body)
+        assert response.status_code == 200
+    mock_tutina_model.predict_single.assert_called_once()
+    [model_input_dfs] = mock_tutina_model.predict_single.call_args.args
+    assert str(model_input_dfs["history"].index.tz) == "UTC"
+
+
+def _to_columnar(features):
+    timestamps = next(iter(features.values())).keys()
+    return {
+        "start": next(iter(timestamps)),
+        "features": {
+            name: list(time_series.values()) for name, time_series in features.items()
+        },
+    }
+
+
+@pytest.fixture(scope="module")
+def columnar_model_input(model_input):
+    return {part: _to_columnar(features) for part, features in model_input.items()}
+
+
+def test_post_predictions_columnar_json(
+    client: TestClient, mock_tutina_model, columnar_model_input, prediction
+):
+    mock_tutina_model.predict_single.return_value = pd.DataFrame.from_dict(prediction)
+    response = client.post("/predictions/columnar", json=columnar_model_input)
+    assert response.status_code == 200
+    assert response.json()["features"] == _to_columnar(prediction)["features"]
+    (model_input_dfs,) = mock_tutina_model.predict_single.call_args.args
+    assert len(model_input_dfs["control"]) == len(
+        next(iter(columnar_model_input["control"]["features"].values()))
+    )
+
+
+def test_post_predictions_columnar_arrow(
+    client: TestClient, mock_tutina_model, columnar_model_input, prediction
+):
+    mock_tutina_model.predict_single.return_value = pd.DataFrame.from_dict(prediction)
+    content = columnar.model_input_to_arrow(
+        ColumnarTutinaModelInput.model_validate(columnar_model_input)
+    )
+    response = client.post(
+        "/predictions/columnar",
+        headers={
+            "content-type": columnar.ARROW_STREAM_MEDIA_TYPE,
+            "accept": columnar.ARROW_STREAM_MEDIA_TYPE,
+        },
+        content=content,
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == columnar.ARROW_STREAM_MEDIA_TYPE
+    with pa.ipc.open_stream(response.content) as reader:
+        table = reader.read_all()
+    assert table.column("temperature_bedroom").to_pylist() == list(
+        prediction["temperature_bedroom"].values()
+    )
+
+
+def test_post_predictions_columnar_unequal_lengths(
+    client: TestClient, columnar_model_input
+):
+    history = columnar_model_input["history"]
+    name, values = next(iter(history["features"].items()))
+    invalid_model_input = {
+        **columnar_model_input,
+        "history": {
+            **history,
+            "features": {**history["features"], name: values[1:]},
+        },
+    }
+    response = client.post("/predictions/columnar", json=invalid_model_input)
+    assert response.status_code == 422
+
+
+def test_post_predictions_columnar_invalid_arrow(client: TestClient):
+    response = client.post(
+        "/predictions/columnar",
+        headers={"content-type": columnar.ARROW_STREAM_MEDIA_TYPE},
+        content=b"not arrow",
+    )
+    assert response.status_code == 400
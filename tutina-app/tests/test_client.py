@@ -0,0 +1,30 @@
+import time
+
+import jwt
+
+from tutina.lib.client import (
+    EXP_TIME_IN_MINUTES,
+    TOKEN_RENEWAL_MARGIN_IN_SECONDS,
+    TutinaClient,
+)
+
+
+def _decode(token, token_secret):
+    return jwt.decode(token, token_secret, algorithms=["HS256"])
+
+
+def test_token_is_reused(token_secret):
+    client = TutinaClient(None, token_secret)  # type: ignore
+    token = client._get_token()
+    assert _decode(token, token_secret)["exp"] > time.time()
+    assert client._get_token() == token
+
+
+def test_token_is_renewed_before_exp(token_secret):
+    client = TutinaClient(None, token_secret)  # type: ignore
+    client._get_token()
+    client._token_exp = int(time.time()) + TOKEN_RENEWAL_MARGIN_IN_SECONDS - 1
+    token = client._get_token()
+    assert (
+        _decode(token, token_secret)["exp"] > time.time() + EXP_TIME_IN_MINUTES * 60 - 5
+    )
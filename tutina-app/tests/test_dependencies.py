@@ -0,0 +1,30 @@
+import os
+
+from tutina.app.dependencies import _is_runtime_stale
+
+
+def test_runtime_is_stale_after_training(tmp_path):
+    runtime_file = tmp_path / "model.npz"
+    model_file = tmp_path / "model.keras"
+    runtime_file.touch()
+    model_file.touch()
+    os.utime(runtime_file, (1000, 1000))
+    os.utime(model_file, (2000, 2000))
+    assert _is_runtime_stale(runtime_file, model_file)
+
+
+def test_runtime_is_not_stale_after_exporting(tmp_path):
+    runtime_file = tmp_path / "model.npz"
+    model_file = tmp_path / "model.keras"
+    runtime_file.touch()
+    model_file.touch()
+    os.utime(runtime_file, (2000, 2000))
+    os.utime(model_file, (1000, 1000))
+    assert not _is_runtime_stale(runtime_file, model_file)
+
+
+def test_runtime_is_not_stale_without_model(tmp_path):
+    runtime_file = tmp_path / "model.npz"
+    runtime_file.touch()
+    assert not _is_runtime_stale(runtime_file, tmp_path / "model.keras")
+    assert not _is_runtime_stale(runtime_file, None)
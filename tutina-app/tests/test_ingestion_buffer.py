@@ -0,0 +1,130 @@
+import asyncio
+import logging
+from datetime import datetime
+
+import pytest
+import sqlalchemy as sa
+
+from tutina.app.ingestion_buffer import IngestionBuffer, IngestionBufferFull
+from tutina.lib import db, types
+
+
+def _make_batch(location: str, timestamp: datetime | None = None) -> types.DataBatch:
+    return types.DataBatch(
+        measurements=[
+            types.Measurement(
+                location=location, temperature=20.0, humidity=None, pressure=None
+            )
+        ],
+        timestamp=timestamp,
+    )
+
+
+async def _count_measurements(engine) -> int:
+    async with engine.begin() as connection:
+        return (
+            await connection.execute(
+                sa.select(sa.func.count()).select_from(db.measurements)
+            )
+        ).scalar_one()
+
+
+@pytest.fixture
+def ingestion_buffer(mock_database_engine):
+    return IngestionBuffer(
+        mock_database_engine, max_size=2, flush_size=2, flush_interval=60.0
+    )
+
+
+async def test_flush(ingestion_buffer, mock_database_engine):
+    ingestion_buffer.put(_make_batch("a"))
+    ingestion_buffer.put(_make_batch("b"))
+    assert await _count_measurements(mock_database_engine) == 0
+    await ingestion_buffer.flush()
+    assert ingestion_buffer.size == 0
+    assert await _count_measurements(mock_database_engine) == 2
+
+
+async def test_put_when_full_should_fail(ingestion_buffer):
+    ingestion_buffer.put(_make_batch("a"))
+    ingestion_buffer.put(_make_batch("b"))
+    with pytest.raises(IngestionBufferFull):
+        ingestion_buffer.put(_make_batch("c"))
+
+
+async def test_put_many_when_full_should_put_nothing(ingestion_buffer):
+    ingestion_buffer.put(_make_batch("a"))
+    with pytest.raises(IngestionBufferFull):
+        ingestion_buffer.put_many([_make_batch("b"), _make_batch("c")])
+    assert ingestion_buffer.size == 1
+
+
+async def test_flush_drops_only_batches_already_stored(
+    ingestion_buffer, mock_database_engine, caplog
+):
+    batch = _make_batch("a", datetime(2024, 1, 1, 12, 0))
+    ingestion_buffer.put(batch)
+    await ingestion_buffer.flush()
+    ingestion_buffer.put_many([batch, _make_batch("b")])
+    await ingestion_buffer.flush()
+    assert ingestion_buffer.size == 0
+    assert await _count_measurements(mock_database_engine) == 2
+    # replaying a batch is expected, so it is not logged as an error
+    assert not [record for record in caplog.records if record.levelno >= logging.ERROR]
+
+
+async def test_close_flushes(ingestion_buffer, mock_database_engine):
+    ingestion_buffer.start()
+    ingestion_buffer.put(_make_batch("a"))
+    await ingestion_buffer.close()
+    assert await _count_measurements(mock_database_engine) == 1
+
+
+async def test_close_completes_flush_in_progress(
+    ingestion_buffer, mock_database_engine
+):
+    store = ingestion_buffer._store
+    storing = asyncio.Event()
+    stored = asyncio.Event()
+    calls = []
+
+    async def _store(batches):
+        calls.append(batches)
+        storing.set()
+        await stored.wait()
+        await store(batches)
+
+    ingestion_buffer._store = _store
+    ingestion_buffer.start()
+    ingestion_buffer.put(_make_batch("a"))
+    ingestion_buffer.put(_make_batch("b"))
+    await storing.wait()
+    closing = asyncio.create_task(ingestion_buffer.close())
+    await asyncio.sleep(0)
+    assert not closing.done()
+    stored.set()
+    await closing
+    # the flush in progress stored the batches rather than being cancelled
+    assert len(calls) == 1
+    assert ingestion_buffer.size == 0
+    assert await _count_measurements(mock_database_engine) == 2
+
+
+async def test_flush_drops_only_batches_that_cannot_be_stored(mock_database_engine):
+    ingestion_buffer = IngestionBuffer(
+        mock_database_engine, max_size=10, flush_size=10, flush_interval=60.0
+    )
+    forecast = types.Forecast(
+        reference_timestamp=datetime(2024, 1, 1, 12),
+        temperature=0.0,
+        humidity=0.0,
+        pressure=0.0,
+        wind_speed=0.0,
+        status="clear",
+    )
+    # the same forecast twice violates the primary key of the forecasts table
+    ingestion_buffer.put(types.DataBatch(forecasts=[forecast, forecast]))
+    ingestion_buffer.put(_make_batch("a"))
+    await ingestion_buffer.flush()
+    assert ingestion_buffer.size == 0
+    assert await _count_measurements(mock_database_engine) == 1
@@ -0,0 +1,159 @@
+import importlib.util
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+import pytest
+import sqlalchemy as sa
+
+from tutina.lib import maintenance
+from tutina.lib.maintenance import get_partition_months
+
+ALEMBIC_VERSIONS_PATH = Path(__file__).parents[2] / "tutina-lib/alembic/versions"
+
+
+def _load_migration(name: str):
+    spec = importlib.util.spec_from_file_location(name, ALEMBIC_VERSIONS_PATH / name)
+    assert spec and spec.loader
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeConnection:
+    """Connection to a MySQL database with partitioned tables
+
+    ``partitions`` maps the table names to their monthly partitions, and the
+    statements executed against the database are recorded in ``statements``.
+    """
+
+    def __init__(self, partitions: dict[str, list[str]], first_timestamp: datetime):
+        self.partitions = partitions
+        self.first_timestamp = first_timestamp
+        self.statements: list[str] = []
+
+    async def execute(self, statement, params=None):
+        sql = str(statement)
+        if "information_schema.partitions" in sql:
+            names = self.partitions.get(params["table_name"], [])
+            if names:
+                names = [*names, maintenance.FUTURE_PARTITION]
+            return mock.Mock(scalars=lambda: mock.Mock(all=lambda: names))
+        if sql.startswith("SELECT min("):
+            return mock.Mock(scalar_one=lambda: self.first_timestamp)
+        self.statements.append(" ".join(sql.split()))
+        return mock.Mock()
+
+    async def run_sync(self, func):
+        return []
+
+
+def _partitioned(*names: str) -> dict[str, list[str]]:
+    return {
+        table.name: list(names)
+        for table in [*maintenance.RAW_TABLES, *maintenance.ROLLUP_TABLES]
+    }
+
+
+def test_get_partition_months():
+    assert get_partition_months(datetime(2024, 11, 15, 12), datetime(2025, 2, 1)) == [
+        datetime(2024, 11, 1),
+        datetime(2024, 12, 1),
+        datetime(2025, 1, 1),
+        datetime(2025, 2, 1),
+    ]
+
+
+def test_get_partition_months_empty():
+    assert get_partition_months(datetime(2025, 3, 1), datetime(2025, 2, 1)) == []
+
+
+async def test_maintain_partitions_tables():
+    connection = FakeConnection({}, datetime(2025, 12, 15))
+    await maintenance.maintain(
+        connection,  # type: ignore
+        retention_months=None,
+        now=datetime(2026, 1, 31, 12),
+    )
+    assert connection.statements == [
+        f"ALTER TABLE {table.name} PARTITION BY RANGE (TO_DAYS(timestamp)) ("
+        "PARTITION p202512 VALUES LESS THAN (TO_DAYS('2026-01-01')), "
+        "PARTITION p202601 VALUES LESS THAN (TO_DAYS('2026-02-01')), "
+        "PARTITION p202602 VALUES LESS THAN (TO_DAYS('2026-03-01')), "
+        "PARTITION pfuture VALUES LESS THAN MAXVALUE)"
+        for table in [*maintenance.RAW_TABLES, *maintenance.ROLLUP_TABLES]
+    ]
+
+
+async def test_maintain_adds_partitions():
+    connection = FakeConnection(_partitioned("p202601"), datetime(2026, 1, 1))
+    await maintenance.maintain(
+        connection,  # type: ignore
+        retention_months=None,
+        now=datetime(2026, 1, 31, 12),
+    )
+    assert connection.statements == [
+        f"ALTER TABLE {table.name} REORGANIZE PARTITION pfuture INTO ("
+        "PARTITION p202602 VALUES LESS THAN (TO_DAYS('2026-03-01')), "
+        "PARTITION pfuture VALUES LESS THAN MAXVALUE)"
+        for table in [*maintenance.RAW_TABLES, *maintenance.ROLLUP_TABLES]
+    ]
+
+
+async def test_maintain_drops_expired_partitions():
+    connection = FakeConnection(
+        _partitioned("p202511", "p202512", "p202601", "p202602"),
+        datetime(2025, 11, 1),
+    )
+    await maintenance.maintain(
+        connection,  # type: ignore
+        retention_months=1,
+        now=datetime(2026, 1, 15),
+    )
+    assert connection.statements == [
+        f"ALTER TABLE {table.name} DROP PARTITION p202511"
+        for table in maintenance.RAW_TABLES
+    ]
+
+
+PARTITION_MIGRATIONS = [
+    "394b09756d23_partition_time_series_tables_by_month.py",
+    "7caa8d7358db_partition_state_transition_tables_by_month.py",
+]
+
+
+def test_partition_migrations_cover_maintained_tables():
+    assert {
+        table
+        for name in PARTITION_MIGRATIONS
+        for table in _load_migration(name).FOREIGN_KEYS
+    } == {table.name for table in [*maintenance.RAW_TABLES, *maintenance.ROLLUP_TABLES]}
+
+
+@pytest.mark.parametrize("name", PARTITION_MIGRATIONS)
+def test_partition_migration_at_end_of_month(monkeypatch, name):
+    migration = _load_migration(name)
+
+    class _datetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2026, 1, 31, 12, tzinfo=tz)
+
+    op = mock.Mock()
+    op.get_bind.return_value.execute.return_value.scalar_one.return_value = datetime(
+        2025, 12, 15
+    )
+    monkeypatch.setattr(migration, "datetime", _datetime)
+    monkeypatch.setattr(migration, "op", op)
+    monkeypatch.setattr(
+        sa, "inspect", lambda bind: mock.Mock(get_foreign_keys=lambda table: [])
+    )
+    migration.upgrade()
+    assert [call.args[0] for call in op.execute.call_args_list] == [
+        f"ALTER TABLE {table} PARTITION BY RANGE (TO_DAYS(timestamp)) ("
+        "PARTITION p202512 VALUES LESS THAN (TO_DAYS('2026-01-01')), "
+        "PARTITION p202601 VALUES LESS THAN (TO_DAYS('2026-02-01')), "
+        "PARTITION p202602 VALUES LESS THAN (TO_DAYS('2026-03-01')), "
+        "PARTITION pfuture VALUES LESS THAN MAXVALUE)"
+        for table in migration.FOREIGN_KEYS
+    ]
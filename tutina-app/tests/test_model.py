@@ -0,0 +1,260 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import more_itertools as mi
+import numpy as np
+import pandas as pd
+import pytest
+
+from tutina.ai import model
+from tutina.ai.model import (
+    CONTROL_TIMESTEPS_IN_FEATURES,
+    HISTORY_TIMESTEPS_IN_FEATURES,
+    SPLIT_RATIOS,
+    WINDOW_SIZE,
+    TutinaModel,
+    _average_transitions_hourly,
+    _fill_forecasts,
+    features_to_windows,
+    load_data_with_cache,
+    split_windows,
+)
+from tutina.ai.types import (
+    CONTROL,
+    FORECASTS,
+    HISTORY,
+    LABELS,
+    MEASUREMENTS,
+    TEMPERATURE,
+)
+from tutina.lib import data, db
+from tutina.lib.types import DataBatch, Forecast, Measurement
+
+
+def _fill_forecasts_reference(df: pd.DataFrame, index: pd.Index):
+    columns = [column for column in df.columns if column[0] == FORECASTS]
+    index_it = iter(index)
+    if (range_first := next(index_it, None)) is None:
+        return
+    for first, last in mi.pairwise(index_it):
+        if last - first > pd.Timedelta("1h"):
+            range_last = last - pd.Timedelta("1s")
+            df.loc[range_first:range_last, columns] = df.loc[
+                range_first:range_last, columns
+            ].ffill()
+            range_first = last
+    df.loc[range_first:, columns] = df.loc[range_first:, columns].ffill()
+
+
+def _make_data(seed: int, n_rows: int = 500):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2024-01-01", periods=n_rows, freq="h", tz="UTC")
+    forecast_index = index[rng.random(n_rows) < 0.3]
+    columns = pd.MultiIndex.from_tuples(
+        [
+            (MEASUREMENTS, TEMPERATURE, "bedroom"),
+            (FORECASTS, TEMPERATURE, "00"),
+            (FORECASTS, TEMPERATURE, "01"),
+        ]
+    )
+    df = pd.DataFrame(np.nan, index=index, columns=columns)
+    df[MEASUREMENTS, TEMPERATURE, "bedroom"] = rng.random(n_rows)
+    for column in columns[1:]:
+        values = rng.random(len(forecast_index))
+        values[rng.random(len(forecast_index)) < 0.1] = np.nan
+        df.loc[forecast_index, column] = values
+    return df, forecast_index
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_fill_forecasts_matches_reference(seed):
+    df, forecast_index = _make_data(seed)
+    expected = df.copy()
+    _fill_forecasts_reference(expected, forecast_index)
+    _fill_forecasts(df, forecast_index)
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_fill_forecasts_without_forecasts():
+    df, _ = _make_data(0)
+    expected = df.copy()
+    _fill_forecasts(df, pd.DatetimeIndex([], tz="UTC"))
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def _store_hours(database_url: str, hours: range, forecast_hours: range):
+    def _make_batch(hour: int):
+        timestamp = datetime(2024, 1, 1) + timedelta(hours=hour)
+        return DataBatch(
+            measurements=[
+                Measurement(
+                    location="bedroom",
+                    temperature=20.0 + hour,
+                    humidity=None,
+                    pressure=None,
+                )
+            ],
+            forecasts=[
+                Forecast(
+                    reference_timestamp=timestamp + timedelta(hours=1),
+                    temperature=10.0 + hour,
+                    humidity=50.0,
+                    pressure=1000.0,
+                    wind_speed=1.0,
+                    status="clear",
+                )
+            ]
+            if hour in forecast_hours
+            else [],
+            timestamp=timestamp,
+        )
+
+    async def _store():
+        engine = db.create_async_engine(database_url)
+        async with engine.begin() as connection:
+            await connection.run_sync(db.metadata.create_all)
+            await data.store_batches(
+                [(batch.timestamp, batch) for batch in map(_make_batch, hours)],
+                connection=connection,
+            )
+        await engine.dispose()
+
+    asyncio.run(_store())
+
+
+async def _load_no_openings_data(connection, **kwargs):
+    return pd.DataFrame()
+
+
+def test_load_data_with_cache_refresh_matches_reload(tmp_path, monkeypatch):
+    # the openings are loaded with CONCAT that older SQLite versions lack
+    monkeypatch.setattr(model, "load_openings_data", _load_no_openings_data)
+    database_url = f"sqlite+aiosqlite:///{tmp_path / 'tutina.db'}"
+    filename = str(tmp_path / "data.parquet")
+    _store_hours(database_url, range(6), range(2))
+    load_data_with_cache(filename, database_url)
+    _store_hours(database_url, range(6, 10), range(8, 10))
+    refreshed = load_data_with_cache(filename, database_url, refresh=True)
+    reloaded = load_data_with_cache(None, database_url)
+    assert refreshed[FORECASTS, TEMPERATURE, "01"].notna().all()
+    pd.testing.assert_frame_equal(refreshed, reloaded)
+
+
+def _make_features(n_rows: int):
+    rng = np.random.default_rng(0)
+    columns = pd.MultiIndex.from_tuples(
+        [
+            (CONTROL, "hvac_state_heat_radiator"),
+            (FORECASTS, "temperature_00"),
+            (FORECASTS, "temperature_01"),
+            (LABELS, "temperature_bedroom"),
+            (LABELS, "temperature_outdoor"),
+        ]
+    )
+    return pd.DataFrame(rng.random((n_rows, len(columns))), columns=columns)
+
+
+def test_features_to_windows():
+    features = _make_features(30)
+    windows = features_to_windows(features)
+    assert len(windows) == 30 - WINDOW_SIZE + 1
+    for start in [0, len(windows) - 1]:
+        window = features.iloc[start : start + WINDOW_SIZE].astype(np.float32)
+        np.testing.assert_array_equal(
+            windows.history[start],
+            window[LABELS].iloc[:HISTORY_TIMESTEPS_IN_FEATURES],
+        )
+        np.testing.assert_array_equal(
+            windows.control[start],
+            window[CONTROL].iloc[HISTORY_TIMESTEPS_IN_FEATURES:],
+        )
+        np.testing.assert_array_equal(
+            windows.forecasts[start, :, 0],
+            window[FORECASTS].iloc[HISTORY_TIMESTEPS_IN_FEATURES],
+        )
+        np.testing.assert_array_equal(
+            windows.labels[start],
+            window[LABELS].iloc[HISTORY_TIMESTEPS_IN_FEATURES:],
+        )
+
+
+def test_features_to_windows_too_short():
+    assert len(features_to_windows(_make_features(WINDOW_SIZE - 1))) == 0
+
+
+def test_split_windows():
+    windows = features_to_windows(_make_features(6000))
+    expected = [[], [], []]
+    chunk_start = 0
+    for i in range(6000):
+        split = i % len(SPLIT_RATIOS)
+        chunk_end = min(chunk_start + SPLIT_RATIOS[split], 6000)
+        expected[split].extend(range(chunk_start, chunk_end - WINDOW_SIZE + 1))
+        if (chunk_start := chunk_end) == 6000:
+            break
+    indices = split_windows(windows)
+    assert [list(split_indices) for split_indices in indices] == expected
+
+
+def test_split_windows_with_seed():
+    windows = features_to_windows(_make_features(3000))
+    indices = split_windows(windows, (0.5, 0.5), seed=1)
+    assert indices[0].tolist() != sorted(indices[0].tolist())
+    assert sorted(np.concatenate(indices).tolist()) == sorted(
+        np.concatenate(split_windows(windows, (0.5, 0.5))).tolist()
+    )
+
+
+def test_get_timesteps():
+    features = _make_features(100)
+    windows = features_to_windows(features)
+    indices = np.array([50, 0, len(windows) - 1, 3])
+    timesteps = windows.get_timesteps(indices)
+    rows = sorted({row for start in indices for row in range(start, start + 12)})
+    np.testing.assert_array_equal(
+        timesteps[HISTORY], features[LABELS].iloc[rows].astype(np.float32)
+    )
+    np.testing.assert_array_equal(
+        timesteps[CONTROL],
+        features[CONTROL]
+        .iloc[[row + HISTORY_TIMESTEPS_IN_FEATURES for row in rows]]
+        .astype(np.float32),
+    )
+    np.testing.assert_array_equal(
+        timesteps[FORECASTS],
+        features[FORECASTS]
+        .iloc[indices + HISTORY_TIMESTEPS_IN_FEATURES]
+        .astype(np.float32),
+    )
+
+
+def test_adapt():
+    features = _make_features(100)
+    model = TutinaModel(n_labels=2)
+    model.adapt(features_to_windows(features).get_timesteps())
+    history = features[LABELS].iloc[: 100 - CONTROL_TIMESTEPS_IN_FEATURES]
+    forecasts = features[FORECASTS].iloc[
+        HISTORY_TIMESTEPS_IN_FEATURES : 100 - CONTROL_TIMESTEPS_IN_FEATURES + 1
+    ]
+    for layer, expected in [
+        (model.history_normalization_layer, history),
+        (model.forecasts_normalization_layer, forecasts.stack()),
+    ]:
+        np.testing.assert_allclose(
+            np.asarray(layer.mean).reshape(-1), expected.mean(), rtol=1e-5
+        )
+        np.testing.assert_allclose(
+            np.asarray(layer.variance).reshape(-1), expected.var(ddof=0), rtol=1e-5
+        )
+
+
+def test_average_transitions_hourly():
+    times = np.array(["2024-01-01T10:30", "2024-01-01T11:15"], dtype="datetime64[ns]")
+    values = np.array([[1.0, np.nan], [0.0, 2.0]])
+    hours, averages = _average_transitions_hourly(
+        times, values, np.datetime64("2024-01-01T12:00")
+    )
+    np.testing.assert_array_equal(
+        hours, np.array(["2024-01-01T10", "2024-01-01T11"], dtype="datetime64[ns]")
+    )
+    np.testing.assert_allclose(averages, [[1.0, np.nan], [0.25, 2.0]])
@@ -0,0 +1,45 @@
+import asyncio
+
+import pandas as pd
+import pytest
+
+from tutina.app.plot_renderer import PlotRenderer, PlotRendererBusy
+
+
+def _make_plot_data():
+    index = pd.date_range("2020-01-01", periods=4, freq="h")
+    history = pd.DataFrame({"temperature_bedroom": [20.0, 20.5]}, index=index[:2])
+    prediction = pd.DataFrame({"temperature_bedroom": [21.0, 21.5]}, index=index[2:])
+    return history, prediction
+
+
+async def test_render_prediction_svg():
+    history, prediction = _make_plot_data()
+    plot_renderer = PlotRenderer(max_workers=1, max_pending=0)
+    try:
+        svg = await plot_renderer.render_prediction_svg(history, prediction)
+    finally:
+        plot_renderer.shutdown()
+    assert svg.startswith(b"<?xml")
+    assert b"<svg" in svg
+
+
+async def test_render_prediction_svg_when_full_should_fail():
+    history, prediction = _make_plot_data()
+    plot_renderer = PlotRenderer(max_workers=1, max_pending=1)
+    try:
+        rendering = [
+            asyncio.create_task(
+                plot_renderer.render_prediction_svg(history, prediction)
+            )
+            for _ in range(2)
+        ]
+        await asyncio.sleep(0)
+        with pytest.raises(PlotRendererBusy):
+            await plot_renderer.render_prediction_svg(history, prediction)
+        await asyncio.gather(*rendering)
+        # there is room again after the plots have been rendered
+        svg = await plot_renderer.render_prediction_svg(history, prediction)
+    finally:
+        plot_renderer.shutdown()
+    assert b"<svg" in svg
@@ -0,0 +1,57 @@
+import pytest
+
+from tutina.app.prediction_cache import PredictionCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_make_key_is_stable():
+    assert PredictionCache.make_key("a", "b") == PredictionCache.make_key("a", "b")
+    assert PredictionCache.make_key("a", "b") != PredictionCache.make_key("ab", "")
+
+
+def test_get_and_put(clock):
+    cache = PredictionCache(clock=clock)
+    assert cache.get("key") is None
+    cache.put("key", b"content")
+    assert cache.get("key") == b"content"
+    statistics = cache.get_statistics()
+    assert (statistics.hits, statistics.misses) == (1, 1)
+    assert (statistics.entries, statistics.size) == (1, len(b"content"))
+
+
+def test_entries_expire(clock):
+    cache = PredictionCache(ttl=10, clock=clock)
+    cache.put("key", b"content")
+    clock.now = 10
+    assert cache.get("key") is None
+    assert cache.get_statistics().entries == 0
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = PredictionCache(max_size=6, clock=clock)
+    cache.put("a", b"aa")
+    cache.put("b", b"bb")
+    cache.put("c", b"cc")
+    cache.get("a")
+    cache.put("d", b"dd")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"aa"
+    assert cache.get_statistics().size == 6
+
+
+def test_too_large_entries_are_not_cached(clock):
+    cache = PredictionCache(max_size=1, clock=clock)
+    cache.put("key", b"content")
+    assert cache.get("key") is None
@@ -0,0 +1,49 @@
+import pytest
+
+from tutina.ai.sweep import get_candidates
+
+
+def test_get_candidates_grid():
+    spec = {"parameters": {"lstm_units": [16, 32], "learning_rate": [0.1, 0.01]}}
+    assert get_candidates(spec) == [
+        {"lstm_units": 16, "learning_rate": 0.1},
+        {"lstm_units": 16, "learning_rate": 0.01},
+        {"lstm_units": 32, "learning_rate": 0.1},
+        {"lstm_units": 32, "learning_rate": 0.01},
+    ]
+
+
+def test_get_candidates_scalar_parameter():
+    spec = {"parameters": {"lstm_units": [16, 32], "epochs": 8}}
+    assert get_candidates(spec) == [
+        {"lstm_units": 16, "epochs": 8},
+        {"lstm_units": 32, "epochs": 8},
+    ]
+
+
+def test_get_candidates_random():
+    spec = {
+        "strategy": "random",
+        "n_candidates": 3,
+        "seed": 1,
+        "parameters": {"lstm_units": [16, 32, 64], "dense_units": [32, 64]},
+    }
+    candidates = get_candidates(spec)
+    assert len(candidates) == 3
+    assert candidates == get_candidates(spec)
+    assert all(
+        candidate in get_candidates({"parameters": spec["parameters"]})
+        for candidate in candidates
+    )
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        {"parameters": {"hidden_units": [16]}},
+        {"strategy": "bayesian", "parameters": {"lstm_units": [16]}},
+    ],
+)
+def test_get_candidates_invalid(spec):
+    with pytest.raises(ValueError):
+        get_candidates(spec)
@@ -119,11 +119,55 @@ def test_timeseries_not_spaced_by_hour_should_fail(feature_time_series):
         FeatureTimeSeries(root=feature_time_series)
 
 
+def test_timeseries_with_different_utc_offsets():
+    # the same hourly spacing across a change from daylight saving time
+    FeatureTimeSeries(
+        root={
+            "2024-10-27T01:00:00+02:00": 1.0,
+            "2024-10-27T02:00:00+02:00": 2.0,
+            "2024-10-27T02:00:00+01:00": 3.0,
+        }
+    )
+
+
+MIXED_TIMESTAMPS = ["2024-01-01T00:00:00", "2024-01-01T01:00:00+00:00"]
+
+
+def test_timeseries_with_naive_and_aware_timestamps_should_fail():
+    with pytest.raises(pydantic.ValidationError, match="all naive or all aware"):
+        FeatureTimeSeries(root=dict.fromkeys(MIXED_TIMESTAMPS, 1.0))
+
+
+def test_features_by_name_with_naive_and_aware_timestamps_should_fail():
+    time_series = dict.fromkeys(MIXED_TIMESTAMPS, 1.0)
+    with pytest.raises(pydantic.ValidationError, match="all naive or all aware"):
+        FeaturesByName(root={"a": time_series, "b": time_series})
+
+
 @given(features_by_name())
 def test_valid_features_by_name(features):
     FeaturesByName(root=features)
 
 
+@given(features_by_name())
+def test_features_by_name_share_timestamp_index(features):
+    features_by_name = FeaturesByName(root=features)
+    indices = [ts._index for ts in features_by_name.root.values()]
+    assert all(index is indices[0] for index in indices)
+    assert features_by_name.timestamps == next(iter(features.values())).keys()
+
+
+def test_features_by_name_with_invalid_value_should_fail():
+    timestamps = [datetime(2020, 1, 1, h) for h in range(2)]
+    with pytest.raises(pydantic.ValidationError):
+        FeaturesByName(
+            root={
+                "a": dict(zip(timestamps, [1.0, 2.0])),
+                "b": dict(zip(timestamps, [1.0, "not a number"])),
+            }
+        )
+
+
 @given(
     st.lists(spaced_timestamps(), max_size=10)
     .filter(lambda timestamps: not mi.all_equal(timestamps))
@@ -0,0 +1,85 @@
+"""Conversions between the columnar wire formats and data frames
+
+In the Arrow IPC format, the model input is a single record batch with a
+``timestamp`` column spanning the history, control and forecasts, and one
+column for each feature named ``<part>.<feature>``. Each column is null
+outside the timestamps of its part. Predictions are encoded as a record batch
+with a ``timestamp`` column and a column for each predicted feature.
+"""
+
+import pandas as pd
+import pyarrow as pa
+
+from tutina.lib.types import ColumnarFeatures, ColumnarTutinaModelInput
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+_PARTS = ["history", "control", "forecasts"]
+
+
+def columnar_features_to_df(features: ColumnarFeatures) -> pd.DataFrame:
+    return pd.DataFrame(
+        features.features,
+        index=pd.date_range(features.start, periods=features.length, freq="h"),
+    )
+
+
+def df_to_columnar_features(df: pd.DataFrame) -> ColumnarFeatures:
+    return ColumnarFeatures(
+        start=df.index[0],
+        features={str(column): df[column].tolist() for column in df.columns},
+    )
+
+
+def arrow_to_model_input(content: bytes) -> dict:
+    """Decode Arrow IPC stream into unvalidated columnar model input"""
+
+    try:
+        with pa.ipc.open_stream(content) as reader:
+            table = reader.read_all()
+    except pa.ArrowException as e:
+        raise ValueError(f"Invalid Arrow IPC stream: {e}") from e
+    if "timestamp" not in table.column_names:
+        raise ValueError("Arrow IPC stream should contain timestamp column")
+    timestamps = table.column("timestamp").to_pylist()
+    model_input = {}
+    for part in _PARTS:
+        prefix = f"{part}."
+        columns = [name for name in table.column_names if name.startswith(prefix)]
+        if not columns:
+            continue
+        is_valid = table.column(columns[0]).is_valid().to_pylist()
+        if True in is_valid:
+            offset = is_valid.index(True)
+            length = len(is_valid) - is_valid[::-1].index(True) - offset
+        else:
+            offset, length = 0, 0
+        model_input[part] = {
+            "start": timestamps[offset] if length else None,
+            "features": {
+                name.removeprefix(prefix): table.column(name)
+                .slice(offset, length)
+                .to_numpy(zero_copy_only=False)
+                .tolist()
+                for name in columns
+            },
+        }
+    return model_input
+
+
+def model_input_to_arrow(model_input: ColumnarTutinaModelInput) -> bytes:
+    dfs = [
+        columnar_features_to_df(getattr(model_input, part)).add_prefix(f"{part}.")
+        for part in _PARTS
+    ]
+    return df_to_arrow(pd.concat(dfs, axis="columns"))
+
+
+def df_to_arrow(df: pd.DataFrame) -> bytes:
+    table = pa.Table.from_pandas(
+        df.rename_axis("timestamp").reset_index(), preserve_index=False
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -1,13 +1,17 @@
 import asyncio
 import contextlib
 import logging
+from pathlib import Path
 from typing import AsyncIterator
 
 from tutina.lib.db import AsyncEngine, create_async_engine
 from tutina.lib.db import metadata as db_metadata
 from tutina.lib.settings import Settings
 
+from .ingestion_buffer import IngestionBuffer
 from .model_wrapper import TutinaModelWrapper
+from .plot_renderer import PlotRenderer
+from .prediction_cache import PredictionCache
 from .preloaded_dependencies import PreloadedDependencies
 
 preloaded_dependencies = PreloadedDependencies()
@@ -49,14 +53,73 @@ async def get_database_engine() -> AsyncIterator[AsyncEngine]:
     await engine.dispose()
 
 
+@preloaded_dependencies.register
+@contextlib.asynccontextmanager
+async def get_ingestion_buffer() -> AsyncIterator[IngestionBuffer | None]:
+    ingestion_settings = get_config().ingestion
+    if not ingestion_settings.write_behind:
+        yield None
+        return
+    ingestion_buffer = IngestionBuffer(
+        get_database_engine(),
+        max_size=ingestion_settings.max_size,
+        flush_size=ingestion_settings.flush_size,
+        flush_interval=ingestion_settings.flush_interval,
+    )
+    ingestion_buffer.start()
+    yield ingestion_buffer
+    get_logger().info("Flushing %d buffered items", ingestion_buffer.size)
+    await ingestion_buffer.close()
+
+
+def _is_runtime_stale(runtime_file: Path, model_file: Path | None) -> bool:
+    """Check if the model has been trained again after exporting the runtime"""
+
+    return bool(
+        model_file
+        and model_file.is_file()
+        and model_file.stat().st_mtime > runtime_file.stat().st_mtime
+    )
+
+
 @preloaded_dependencies.register
 @contextlib.asynccontextmanager
 async def get_tutina_model() -> AsyncIterator[TutinaModelWrapper]:
-    model_file = get_config().model.get_model_file_path(write=False)
+    model_settings = get_config().model
     logger = get_logger()
-    logger.info("Loading model from from %s", model_file)
     loop = asyncio.get_event_loop()
-    model = await loop.run_in_executor(
-        None, TutinaModelWrapper.from_model_file, model_file
-    )
+    runtime_file = model_settings.get_runtime_file_path(write=False)
+    model_file = model_settings.get_model_file_path(write=False)
+    if (
+        runtime_file
+        and runtime_file.is_file()
+        and not _is_runtime_stale(runtime_file, model_file)
+    ):
+        logger.info("Loading model runtime from %s", runtime_file)
+        model = await loop.run_in_executor(
+            None, TutinaModelWrapper.from_runtime_file, runtime_file
+        )
+    else:
+        logger.info("Loading model from from %s", model_file)
+        model = await loop.run_in_executor(
+            None, TutinaModelWrapper.from_model_file, model_file
+        )
     yield model
+
+
+@preloaded_dependencies.register
+@contextlib.asynccontextmanager
+async def get_prediction_cache() -> AsyncIterator[PredictionCache]:
+    cache_settings = get_config().prediction_cache
+    yield PredictionCache(max_size=cache_settings.max_size, ttl=cache_settings.ttl)
+
+
+@preloaded_dependencies.register
+@contextlib.asynccontextmanager
+async def get_plot_renderer() -> AsyncIterator[PlotRenderer]:
+    plot_settings = get_config().plot
+    plot_renderer = PlotRenderer(
+        max_workers=plot_settings.max_workers, max_pending=plot_settings.max_pending
+    )
+    yield plot_renderer
+    await asyncio.get_event_loop().run_in_executor(None, plot_renderer.shutdown)
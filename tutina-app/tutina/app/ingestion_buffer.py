@@ -0,0 +1,140 @@
+import asyncio
+import contextlib
+import logging
+from datetime import datetime, timezone
+from typing import Iterable
+
+import sqlalchemy as sa
+
+from tutina.lib import data, db
+from tutina.lib.types import DataBatch
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionBufferFull(Exception):
+    """Raised when there is no room for a batch in the ingestion buffer"""
+
+
+def _get_size(batch: DataBatch) -> int:
+    return (
+        len(batch.measurements)
+        + len(batch.hvacs)
+        + len(batch.opening_states)
+        + len(batch.forecasts)
+        + len(batch.hvac_transitions)
+        + len(batch.opening_transitions)
+    )
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class IngestionBuffer:
+    """Bounded buffer of submitted data written to the database in the background
+
+    The batches without a timestamp of their own are timestamped when they are
+    put to the buffer. A background task stores the buffered batches in a single
+    transaction when the buffer holds at least ``flush_size`` items, or at the
+    latest after ``flush_interval`` seconds. At most ``max_size`` items are
+    buffered.
+    """
+
+    def __init__(
+        self,
+        engine: db.AsyncEngine,
+        *,
+        max_size: int,
+        flush_size: int,
+        flush_interval: float,
+    ):
+        self._engine = engine
+        self._max_size = max_size
+        self._flush_size = flush_size
+        self._flush_interval = flush_interval
+        self._batches: data.Timestamped[DataBatch] = []
+        self._size = 0
+        self._flush_needed = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._closing = False
+        self._task: asyncio.Task | None = None
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def put(self, batch: DataBatch) -> None:
+        self.put_many([batch])
+
+    def put_many(self, batches: Iterable[DataBatch]) -> None:
+        """Put all the batches to the buffer, or none if they do not fit"""
+
+        batches = list(batches)
+        size = sum(_get_size(batch) for batch in batches)
+        if self._size + size > self._max_size:
+            raise IngestionBufferFull()
+        timestamp = _utc_now()
+        self._batches.extend((timestamp, batch) for batch in batches)
+        self._size += size
+        if self._size >= self._flush_size:
+            self._flush_needed.set()
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            batches = self._batches[:]
+            if not batches:
+                return
+            try:
+                await self._store(batches)
+            except sa.exc.IntegrityError:
+                # a single bad batch fails the whole transaction, so store the
+                # batches one by one, dropping the ones that would fail the same
+                # way on every retry
+                for timestamp, batch in batches:
+                    try:
+                        await self._store([(timestamp, batch)])
+                    except sa.exc.IntegrityError as ex:
+                        if data.is_duplicate_key_error(ex):
+                            logger.debug(
+                                "Batch at %s has already been stored",
+                                batch.timestamp or timestamp,
+                            )
+                        else:
+                            logger.exception("Dropping batch that cannot be stored")
+            del self._batches[: len(batches)]
+            self._size -= sum(_get_size(batch) for (_, batch) in batches)
+
+    async def _store(self, batches: data.Timestamped[DataBatch]) -> None:
+        async with data.begin(self._engine) as connection:
+            await data.store_batches(batches, connection=connection)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop the background task and store all the buffered batches
+
+        A flush in progress is left to complete rather than cancelled.
+        """
+
+        self._closing = True
+        self._flush_needed.set()
+        if self._task:
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(
+                    self._flush_needed.wait(), timeout=self._flush_interval
+                )
+            self._flush_needed.clear()
+            if self._closing:
+                return
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Error when flushing the ingestion buffer")
@@ -1,3 +1,4 @@
+import hashlib
 import typing
 from pathlib import Path
 
@@ -7,27 +8,56 @@ from tutina.ai.types import TutinaInputFeatures
 
 if typing.TYPE_CHECKING:
     from tutina.ai.model import TutinaModel
+    from tutina.ai.runtime import NumpyTutinaModel
+
+
+def _get_file_digest(path: Path):
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
 
 
 class TutinaModelWrapper:
-    _model: "TutinaModel"
+    _model: "TutinaModel | NumpyTutinaModel"
+    version: str
 
     @classmethod
     def from_model_file(cls, model_file: Path):
         from tutina.ai import model as m
 
-        return cls(m.load_model(str(model_file)))
+        return cls(m.load_model(str(model_file)), _get_file_digest(model_file))
 
-    @staticmethod
-    def plot_prediction(history: pd.DataFrame, prediction: pd.DataFrame):
-        from tutina.ai import model as m
+    @classmethod
+    def from_runtime_file(cls, runtime_file: Path):
+        from tutina.ai import runtime
 
-        return m.plot_prediction(history, prediction)
+        return cls(
+            runtime.NumpyTutinaModel.from_file(runtime_file),
+            _get_file_digest(runtime_file),
+        )
 
-    def __init__(self, model: "TutinaModel"):
+    def __init__(self, model: "TutinaModel | NumpyTutinaModel", version: str = ""):
         self._model = model
+        self.version = version
+
+    def _get_backend(self):
+        from tutina.ai import runtime
+
+        if isinstance(self._model, runtime.NumpyTutinaModel):
+            return runtime
 
-    def predict_single(self, model_input: TutinaInputFeatures):
         from tutina.ai import model as m
 
-        return m.predict_single(self._model, model_input)
+        return m
+
+    def predict_single(self, model_input: TutinaInputFeatures):
+        return self._get_backend().predict_single(self._model, model_input)
+
+    def predict_batch(
+        self,
+        history: pd.DataFrame,
+        controls: list[pd.DataFrame],
+        forecasts: pd.DataFrame,
+    ):
+        return self._get_backend().predict_batch(
+            self._model, history, controls, forecasts
+        )
@@ -0,0 +1,45 @@
+import asyncio
+import concurrent.futures
+import multiprocessing
+
+import pandas as pd
+
+from tutina.ai import plotting
+
+
+class PlotRendererBusy(Exception):
+    """Raised when there is no room for a plot in the queue of the renderer"""
+
+
+class PlotRenderer:
+    """Render prediction plots in a bounded pool of worker processes
+
+    At most ``max_pending`` plots wait for a free worker, and the plots
+    requested when the queue is full are rejected.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self._max_size = max_workers + max_pending
+        self._size = 0
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=plotting.use_non_interactive_backend,
+        )
+
+    async def render_prediction_svg(
+        self, history: pd.DataFrame, prediction: pd.DataFrame
+    ) -> bytes:
+        if self._size >= self._max_size:
+            raise PlotRendererBusy()
+        self._size += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, plotting.render_prediction_svg, history, prediction
+            )
+        finally:
+            self._size -= 1
+
+    def shutdown(self):
+        self._executor.shutdown()
@@ -0,0 +1,94 @@
+import collections
+import hashlib
+import threading
+import time
+from typing import Callable, NamedTuple
+
+import pydantic
+
+DEFAULT_MAX_SIZE = 16 * 1024 * 1024
+DEFAULT_TTL = 3600.0
+
+
+class _CacheEntry(NamedTuple):
+    expires_at: float
+    content: bytes
+
+
+class PredictionCacheStatistics(pydantic.BaseModel):
+    """Prediction cache usage"""
+
+    hits: int
+    misses: int
+    entries: int
+    size: int
+
+
+class PredictionCache:
+    """LRU cache for rendered prediction responses
+
+    The entries expire after ``ttl`` seconds, and the least recently used
+    entries are evicted when the total size of the cached content exceeds
+    ``max_size`` bytes.
+    """
+
+    def __init__(
+        self,
+        max_size: int = DEFAULT_MAX_SIZE,
+        ttl: float = DEFAULT_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._clock = clock
+        self._entries: collections.OrderedDict[str, _CacheEntry] = (
+            collections.OrderedDict()
+        )
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= self._clock():
+                if entry is not None:
+                    self._remove(key)
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry.content
+
+    def put(self, key: str, content: bytes) -> None:
+        if len(content) > self._max_size:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _CacheEntry(self._clock() + self._ttl, content)
+            self._size += len(content)
+            while self._size > self._max_size:
+                self._remove(next(iter(self._entries)))
+
+    def get_statistics(self) -> PredictionCacheStatistics:
+        with self._lock:
+            return PredictionCacheStatistics(
+                hits=self._hits,
+                misses=self._misses,
+                entries=len(self._entries),
+                size=self._size,
+            )
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._size -= len(entry.content)
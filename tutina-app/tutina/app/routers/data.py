@@ -3,48 +3,124 @@ from typing import Annotated
 import annotated_types as at
 import fastapi
 import pydantic
+import sqlalchemy as sa
 
 from tutina.lib import data, db, types
 
-from ..dependencies import get_database_engine
+from ..dependencies import get_database_engine, get_ingestion_buffer
+from ..ingestion_buffer import IngestionBuffer, IngestionBufferFull
 
 router = fastapi.APIRouter(
     prefix="/data",
     tags=["data"],
+    responses={
+        409: {"description": "The data has already been stored"},
+        429: {"description": "The ingestion buffer is full"},
+    },
 )
 
+Engine = Annotated[db.AsyncEngine, fastapi.Depends(get_database_engine)]
+Buffer = Annotated[IngestionBuffer | None, fastapi.Depends(get_ingestion_buffer)]
+
+
+async def _store_batches(
+    batches: list[types.DataBatch],
+    engine: db.AsyncEngine,
+    ingestion_buffer: IngestionBuffer | None,
+):
+    if ingestion_buffer is None:
+        try:
+            async with data.begin(engine) as connection:
+                await data.store_received_batches(batches, connection=connection)
+        except sa.exc.IntegrityError as e:
+            if data.is_duplicate_key_error(e):
+                raise fastapi.HTTPException(
+                    status_code=fastapi.status.HTTP_409_CONFLICT,
+                    detail="The data has already been stored",
+                ) from e
+            raise fastapi.HTTPException(
+                status_code=fastapi.status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="The data cannot be stored",
+            ) from e
+        return
+    try:
+        ingestion_buffer.put_many(batches)
+    except IngestionBufferFull as e:
+        raise fastapi.HTTPException(
+            status_code=fastapi.status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="The ingestion buffer is full",
+        ) from e
+
+
+async def _store_batch(
+    batch: types.DataBatch,
+    engine: db.AsyncEngine,
+    ingestion_buffer: IngestionBuffer | None,
+):
+    await _store_batches([batch], engine, ingestion_buffer)
+
 
 @router.post("/measurements", status_code=204, summary="Submit new measurement data")
 async def post_measurements(
     measurements: Annotated[list[types.Measurement], at.MinLen(1)],
-    engine: Annotated[db.AsyncEngine, fastapi.Depends(get_database_engine)],
+    engine: Engine,
+    ingestion_buffer: Buffer,
 ) -> None:
-    async with engine.begin() as connection:
-        await data.store_measurements(measurements, connection=connection)
+    await _store_batch(
+        types.DataBatch(measurements=measurements), engine, ingestion_buffer
+    )
 
 
 @router.post("/hvacs", status_code=204, summary="Submit new HVAC states")
 async def post_hvacs(
     hvacs: Annotated[list[types.Hvac], at.MinLen(1)],
-    engine: Annotated[db.AsyncEngine, fastapi.Depends(get_database_engine)],
+    engine: Engine,
+    ingestion_buffer: Buffer,
 ) -> None:
-    async with engine.begin() as connection:
-        await data.store_hvacs(hvacs, connection=connection)
+    await _store_batch(types.DataBatch(hvacs=hvacs), engine, ingestion_buffer)
 
 
 @router.post("/opening_states", status_code=204, summary="Submit new opening states")
 async def post_opening_states(
     opening_states: Annotated[list[types.OpeningState], at.MinLen(1)],
-    engine: Annotated[db.AsyncEngine, fastapi.Depends(get_database_engine)],
+    engine: Engine,
+    ingestion_buffer: Buffer,
 ) -> None:
-    async with engine.begin() as connection:
-        await data.store_opening_states(opening_states, connection=connection)
+    await _store_batch(
+        types.DataBatch(opening_states=opening_states), engine, ingestion_buffer
+    )
 
 
 @router.post("/forecasts", status_code=204, summary="Submit new weather forecasts")
 async def post_forecasts(
     forecasts: Annotated[list[types.Forecast], at.MinLen(1)],
-    engine: Annotated[db.AsyncEngine, fastapi.Depends(get_database_engine)],
+    engine: Engine,
+    ingestion_buffer: Buffer,
+) -> None:
+    await _store_batch(types.DataBatch(forecasts=forecasts), engine, ingestion_buffer)
+
+
+@router.post(
+    "/batch",
+    status_code=204,
+    summary="Submit new data of all kinds in a single transaction",
+)
+async def post_batch(
+    batch: types.DataBatch,
+    engine: Engine,
+    ingestion_buffer: Buffer,
+) -> None:
+    await _store_batch(batch, engine, ingestion_buffer)
+
+
+@router.post(
+    "/batches",
+    status_code=204,
+    summary="Submit several batches of data in a single transaction",
+)
+async def post_batches(
+    batches: Annotated[list[types.DataBatch], at.MinLen(1)],
+    engine: Engine,
+    ingestion_buffer: Buffer,
 ) -> None:
-    async with engine.begin() as connection:
-        await data.store_forecasts(forecasts, connection=connection)
+    await _store_batches(batches, engine, ingestion_buffer)
@@ -1,21 +1,28 @@
-import io
-from datetime import datetime
-from typing import Annotated, TypedDict
+import json
+from datetime import datetime, timezone
+from typing import Annotated, Any, TypedDict
 
 import fastapi
 import fastapi.responses as fresponses
 import pandas as pd
 import pydantic
+from fastapi.concurrency import run_in_threadpool
 
 from tutina.lib.types import (
+    ColumnarFeatures,
+    ColumnarTutinaModelInput,
     FeaturesByName,
     FeatureTimeSeries,
     ForecastFeatures,
+    TutinaBatchModelInput,
     TutinaModelInput,
 )
 
-from ..dependencies import get_tutina_model
+from .. import columnar
+from ..dependencies import get_plot_renderer, get_prediction_cache, get_tutina_model
 from ..model_wrapper import TutinaInputFeatures, TutinaModelWrapper
+from ..plot_renderer import PlotRenderer, PlotRendererBusy
+from ..prediction_cache import PredictionCache, PredictionCacheStatistics
 
 router = fastapi.APIRouter(
     prefix="/predictions",
@@ -23,36 +30,86 @@ router = fastapi.APIRouter(
 )
 
 
+JSON_MEDIA_TYPE = "application/json"
 SVG_MEDIA_TYPE = "image/svg+xml"
 
 
+def _features_to_df(features: pydantic.BaseModel | pydantic.RootModel):
+    df = pd.DataFrame.from_dict(features.model_dump())
+    # the same instants give the same prediction whatever their UTC offsets
+    df.index = pd.to_datetime(df.index, utc=True)
+    return df
+
+
+def _to_utc(timestamp: datetime) -> datetime:
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc)
+
+
+def _with_utc_timestamps(features: Any) -> Any:
+    if not isinstance(features, dict):
+        return features
+    return {
+        (_to_utc(key).isoformat() if isinstance(key, datetime) else key): (
+            _with_utc_timestamps(value)
+        )
+        for (key, value) in features.items()
+    }
+
+
+def _make_cache_key_part(model_input: TutinaModelInput) -> str:
+    """Serialize the model input with the timestamps converted to UTC"""
+
+    return json.dumps(_with_utc_timestamps(model_input.model_dump()))
+
+
 def _request_body_to_df(model_input: TutinaModelInput):
     return TutinaInputFeatures(
-        history=pd.DataFrame.from_dict(model_input.history.model_dump()),
-        control=pd.DataFrame.from_dict(model_input.control.model_dump()),
-        forecasts=pd.DataFrame.from_dict(model_input.forecasts.model_dump()),
+        history=_features_to_df(model_input.history),
+        control=_features_to_df(model_input.control),
+        forecasts=_features_to_df(model_input.forecasts),
     )
 
 
+def _parse_media_type(media_type: str):
+    return media_type.partition(";")[0].strip()
+
+
 def _parse_accepted_media_types(accept: str | None):
     if not accept:
         return []
-    return [media_type.strip().partition(";")[0] for media_type in accept.split(",")]
+    return [_parse_media_type(media_type) for media_type in accept.split(",")]
 
 
-def _create_plot_response(
-    tutina_model: TutinaModelWrapper, history: pd.DataFrame, prediction: pd.DataFrame
-):
-    fig, _ = tutina_model.plot_prediction(history, prediction)
-    f = io.BytesIO()
-    fig.savefig(f, format="svg")
-    f.seek(0)
-    return fresponses.StreamingResponse(f, media_type=SVG_MEDIA_TYPE)
+def _parse_columnar_request_body(body: bytes, content_type: str | None):
+    try:
+        if content_type and _parse_media_type(content_type) == (
+            columnar.ARROW_STREAM_MEDIA_TYPE
+        ):
+            return ColumnarTutinaModelInput.model_validate(
+                columnar.arrow_to_model_input(body)
+            )
+        return ColumnarTutinaModelInput.model_validate_json(body)
+    except pydantic.ValidationError as e:
+        raise fastapi.exceptions.RequestValidationError(
+            e.errors(include_url=False)
+        ) from e
+    except ValueError as e:
+        raise fastapi.HTTPException(
+            status_code=fastapi.status.HTTP_400_BAD_REQUEST, detail=str(e)
+        ) from e
+
+
+def _render_json(prediction: pd.DataFrame):
+    features = FeaturesByName.model_validate(prediction.to_dict())
+    return features.model_dump_json().encode()
 
 
 @router.post(
     "",
     summary="Create new prediction",
+    response_model=FeaturesByName,
     responses={
         200: {
             "content": {
@@ -72,11 +129,14 @@ def _create_plot_response(
                 },
                 SVG_MEDIA_TYPE: {},
             }
-        }
+        },
+        503: {"description": "Too many plots are being rendered"},
     },
 )
-def post_predictions(
+async def post_predictions(
     tutina_model: Annotated[TutinaModelWrapper, fastapi.Depends(get_tutina_model)],
+    prediction_cache: Annotated[PredictionCache, fastapi.Depends(get_prediction_cache)],
+    plot_renderer: Annotated[PlotRenderer, fastapi.Depends(get_plot_renderer)],
     model_input: TutinaModelInput,
     accept: Annotated[
         str | None,
@@ -84,13 +144,138 @@ def post_predictions(
             description="By default, return the response in `application/json`. Request `image/*` or `image/svg+xml` for a plot in SVG format."
         ),
     ] = None,
-) -> FeaturesByName:
+) -> fresponses.Response:
     accepted_media_types = _parse_accepted_media_types(accept)
-    model_input_dfs = _request_body_to_df(model_input)
-    prediction = tutina_model.predict_single(model_input_dfs)
     if SVG_MEDIA_TYPE in accepted_media_types or "image/*" in accepted_media_types:
-        return _create_plot_response(
-            tutina_model, model_input_dfs["history"], prediction
-        )
+        media_type = SVG_MEDIA_TYPE
     else:
-        return prediction.to_dict()
+        media_type = JSON_MEDIA_TYPE
+    cache_key = prediction_cache.make_key(
+        tutina_model.version, media_type, _make_cache_key_part(model_input)
+    )
+    if (content := prediction_cache.get(cache_key)) is None:
+        model_input_dfs = _request_body_to_df(model_input)
+        prediction = await run_in_threadpool(
+            tutina_model.predict_single, model_input_dfs
+        )
+        if media_type == SVG_MEDIA_TYPE:
+            try:
+                content = await plot_renderer.render_prediction_svg(
+                    model_input_dfs["history"], prediction
+                )
+            except PlotRendererBusy as e:
+                raise fastapi.HTTPException(
+                    status_code=fastapi.status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many plots are being rendered",
+                ) from e
+        else:
+            content = _render_json(prediction)
+        prediction_cache.put(cache_key, content)
+    return fresponses.Response(content, media_type=media_type)
+
+
+@router.get("/cache", summary="Get prediction cache statistics")
+def get_prediction_cache_statistics(
+    prediction_cache: Annotated[PredictionCache, fastapi.Depends(get_prediction_cache)],
+) -> PredictionCacheStatistics:
+    return prediction_cache.get_statistics()
+
+
+@router.post(
+    "/batch",
+    summary="Create predictions for alternative control inputs",
+    responses={
+        200: {
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "example": [
+                            {
+                                "temperature_bedroom": {
+                                    "2020-01-01T09:00:00Z": 21.0,
+                                    "2020-01-01T10:00:00Z": 20.5,
+                                },
+                            },
+                            {
+                                "temperature_bedroom": {
+                                    "2020-01-01T09:00:00Z": 21.0,
+                                    "2020-01-01T10:00:00Z": 21.5,
+                                },
+                            },
+                        ],
+                    }
+                },
+            }
+        }
+    },
+)
+def post_predictions_batch(
+    tutina_model: Annotated[TutinaModelWrapper, fastapi.Depends(get_tutina_model)],
+    model_input: TutinaBatchModelInput,
+) -> list[FeaturesByName]:
+    predictions = tutina_model.predict_batch(
+        _features_to_df(model_input.history),
+        [_features_to_df(control) for control in model_input.controls],
+        _features_to_df(model_input.forecasts),
+    )
+    return [prediction.to_dict() for prediction in predictions]
+
+
+@router.post(
+    "/columnar",
+    summary="Create new prediction from columnar input",
+    response_model=ColumnarFeatures,
+    description=(
+        "The request body is either `application/json` or "
+        f"`{columnar.ARROW_STREAM_MEDIA_TYPE}`, depending on `Content-Type`. "
+        "The response is in the format requested in `Accept`."
+    ),
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "application/json": {
+                    "schema": ColumnarTutinaModelInput.model_json_schema(
+                        ref_template="#/components/schemas/{model}"
+                    )
+                },
+                columnar.ARROW_STREAM_MEDIA_TYPE: {},
+            },
+            "required": True,
+        },
+    },
+    responses={
+        200: {
+            "content": {
+                "application/json": {},
+                columnar.ARROW_STREAM_MEDIA_TYPE: {},
+            }
+        }
+    },
+)
+async def post_predictions_columnar(
+    request: fastapi.Request,
+    tutina_model: Annotated[TutinaModelWrapper, fastapi.Depends(get_tutina_model)],
+    content_type: Annotated[str | None, fastapi.Header()] = None,
+    accept: Annotated[
+        str | None,
+        fastapi.Header(
+            description=f"By default, return the response in `application/json`. Request `{columnar.ARROW_STREAM_MEDIA_TYPE}` for Arrow IPC stream."
+        ),
+    ] = None,
+) -> fresponses.Response:
+    model_input = _parse_columnar_request_body(await request.body(), content_type)
+    model_input_dfs = TutinaInputFeatures(
+        history=columnar.columnar_features_to_df(model_input.history),
+        control=columnar.columnar_features_to_df(model_input.control),
+        forecasts=columnar.columnar_features_to_df(model_input.forecasts),
+    )
+    prediction = await run_in_threadpool(tutina_model.predict_single, model_input_dfs)
+    if columnar.ARROW_STREAM_MEDIA_TYPE in _parse_accepted_media_types(accept):
+        return fresponses.Response(
+            columnar.df_to_arrow(prediction),
+            media_type=columnar.ARROW_STREAM_MEDIA_TYPE,
+        )
+    return fresponses.Response(
+        columnar.df_to_columnar_features(prediction).model_dump_json(),
+        media_type=JSON_MEDIA_TYPE,
+    )
@@ -6,6 +6,13 @@ export tutina_owm__api_key=$(bashio::config "owm_api_key")
 export tutina_owm__coordinates=$(bashio::config "owm_coordinates")
 export tutina_tutina__base_url=$(bashio::config "tutina_base_url")
 export tutina_tutina__token_secret=$(bashio::config "tutina_token_secret")
+export tutina_tutina__spool_file="/data/spool.sqlite"
+if bashio::config.true "track_states"; then
+  export tutina_homeassistant__websocket_url="ws://supervisor/core/websocket"
+  if bashio::config.true "record_transitions"; then
+    export tutina_homeassistant__record_transitions=true
+  fi
+fi
 export tutina_logging='{
   "version": 1,
   "loggers": {
@@ -0,0 +1,266 @@
+import asyncio
+import contextlib
+from datetime import datetime, timezone
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from tutina.ha import state_tracker
+from tutina.ha.state_tracker import StateTracker, StateTrackerError
+from tutina.lib.settings import HomeAssistantSettings
+from tutina.lib.types import Hvac, HvacState, OpeningState
+
+TOKEN = "token"
+
+
+def _make_state(entity_id: str, state: str, hour: int = 0, **attributes):
+    timestamp = datetime(2025, 1, 1, hour, tzinfo=timezone.utc).isoformat()
+    return {
+        "entity_id": entity_id,
+        "state": state,
+        "attributes": attributes,
+        "last_changed": timestamp,
+        "last_updated": timestamp,
+    }
+
+
+def _make_event(entity_id: str, new_state):
+    return {
+        "id": 1,
+        "type": "event",
+        "event": {
+            "event_type": "state_changed",
+            "data": {"entity_id": entity_id, "new_state": new_state},
+        },
+    }
+
+
+def _make_tracker(session=None, *, url="ws://localhost/api/websocket", **kwargs):
+    settings = HomeAssistantSettings(
+        api_url="http://localhost/api",
+        api_token=TOKEN,
+        websocket_url=url,
+        **kwargs,
+    )
+    return StateTracker(settings, session)  # type: ignore
+
+
+async def _wait_until(predicate):
+    async with asyncio.timeout(5):
+        while not predicate():
+            await asyncio.sleep(0.01)
+
+
+class FakeHomeAssistant:
+    """Home Assistant websocket API serving a snapshot of states
+
+    ``connections`` lists the snapshots served to the consecutive connections,
+    each followed by the events sent after the snapshot. The connection is
+    closed after all of them have been sent, except for the last one that is
+    kept open. The messages received from the clients are recorded in
+    ``received``.
+    """
+
+    def __init__(self, connections: list[tuple[list, list]]):
+        self.connections = connections
+        self.received: list[list[dict]] = []
+
+    async def handle(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        received: list[dict] = []
+        self.received.append(received)
+        await ws.send_json({"type": "auth_required"})
+        message = await ws.receive_json()
+        received.append(message)
+        if message.get("access_token") != TOKEN:
+            await ws.send_json({"type": "auth_invalid"})
+            await ws.close()
+            return ws
+        await ws.send_json({"type": "auth_ok"})
+        states, events = self.connections[len(self.received) - 1]
+        for _ in range(2):
+            received.append(await ws.receive_json())
+        await ws.send_json({"id": 1, "type": "result", "success": True})
+        await ws.send_json(
+            {"id": 2, "type": "result", "success": True, "result": states}
+        )
+        for event in events:
+            await ws.send_json(event)
+        if len(self.received) < len(self.connections):
+            await ws.close()
+        else:
+            async for _ in ws:
+                pass
+        return ws
+
+
+@pytest.fixture
+async def session():
+    async with aiohttp.ClientSession() as session:
+        yield session
+
+
+async def _serve(home_assistant: FakeHomeAssistant) -> TestServer:
+    app = web.Application()
+    app.router.add_get("/api/websocket", home_assistant.handle)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+def test_snapshot_keeps_tracked_entities():
+    tracker = _make_tracker()
+    tracker._handle_message(
+        {
+            "id": 2,
+            "type": "result",
+            "success": True,
+            "result": [
+                _make_state("climate.heat_pump_a", "heat", temperature=21.0),
+                _make_state("binary_sensor.window_kitchen_opening", "on"),
+                _make_state("binary_sensor.motion", "on"),
+                _make_state("light.kitchen", "on"),
+            ],
+        }
+    )
+    assert tracker.is_ready
+    parser = tracker.get_entity_parser()
+    assert parser.get_hvacs() == [
+        Hvac(device="heat_pump_a", state="heat", temperature=21.0)
+    ]
+    assert parser.get_opening_states() == [
+        OpeningState(opening_type="window", opening="kitchen", is_open=True)
+    ]
+    assert tracker._count_states() == 2
+
+
+def test_event_updates_and_removes_states():
+    tracker = _make_tracker()
+    tracker._handle_message(
+        _make_event(
+            "sensor.weather_kitchen_temperature",
+            _make_state("sensor.weather_kitchen_temperature", "21.5"),
+        )
+    )
+    [measurement] = tracker.get_entity_parser().get_measurements()
+    assert measurement.location == "kitchen"
+    assert measurement.temperature == 21.5
+    tracker._handle_message(_make_event("sensor.weather_kitchen_temperature", None))
+    assert tracker.get_entity_parser().get_measurements() == []
+
+
+def test_failed_request_raises():
+    tracker = _make_tracker()
+    with pytest.raises(StateTrackerError):
+        tracker._handle_message({"id": 1, "type": "result", "success": False})
+
+
+def test_set_state_records_transitions_on_changes_only():
+    tracker = _make_tracker(record_transitions=True)
+    tracker._set_state(
+        "climate.heat_pump_a", _make_state("climate.heat_pump_a", "heat", 0)
+    )
+    tracker._set_state(
+        "climate.heat_pump_a", _make_state("climate.heat_pump_a", "heat", 1)
+    )
+    tracker._set_state(
+        "climate.heat_pump_a", _make_state("climate.heat_pump_a", "off", 2)
+    )
+    tracker._set_state(
+        "binary_sensor.door_front_opening",
+        _make_state("binary_sensor.door_front_opening", "on", 3),
+    )
+    hvac_transitions, opening_transitions = tracker.pop_transitions()
+    assert [
+        (transition.timestamp.hour, transition.state) for transition in hvac_transitions
+    ] == [(0, HvacState.heat), (2, HvacState.off)]
+    assert [
+        (transition.timestamp.hour, transition.opening, transition.is_open)
+        for transition in opening_transitions
+    ] == [(3, "front", True)]
+    assert tracker.pop_transitions() == ([], [])
+
+
+def test_set_state_does_not_record_transitions_by_default():
+    tracker = _make_tracker()
+    tracker._set_state(
+        "climate.heat_pump_a", _make_state("climate.heat_pump_a", "heat")
+    )
+    assert tracker.pop_transitions() == ([], [])
+
+
+async def test_track_subscribes_before_getting_states(session):
+    home_assistant = FakeHomeAssistant(
+        [
+            (
+                [_make_state("climate.heat_pump_a", "heat")],
+                [
+                    _make_event(
+                        "climate.heat_pump_a",
+                        _make_state("climate.heat_pump_a", "off"),
+                    )
+                ],
+            )
+        ]
+    )
+    server = await _serve(home_assistant)
+    tracker = _make_tracker(session, url=str(server.make_url("/api/websocket")))
+    task = asyncio.create_task(tracker.run())
+    try:
+        await _wait_until(
+            lambda: [hvac.state for hvac in tracker.get_entity_parser().get_hvacs()]
+            == [HvacState.off]
+        )
+        assert tracker.is_ready
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+        await server.close()
+    [received] = home_assistant.received
+    assert received == [
+        {"type": "auth", "access_token": TOKEN},
+        {"id": 1, "type": "subscribe_events", "event_type": "state_changed"},
+        {"id": 2, "type": "get_states"},
+    ]
+
+
+async def test_track_fails_authentication(session, monkeypatch):
+    home_assistant = FakeHomeAssistant([])
+    server = await _serve(home_assistant)
+    tracker = _make_tracker(session, url=str(server.make_url("/api/websocket")))
+    monkeypatch.setattr(tracker, "_token", "wrong")
+    try:
+        with pytest.raises(StateTrackerError):
+            await tracker._track()
+    finally:
+        await server.close()
+    assert not tracker.is_ready
+
+
+async def test_run_reconnects(session, monkeypatch):
+    monkeypatch.setattr(state_tracker, "MIN_RECONNECT_DELAY_IN_SECONDS", 0.0)
+    home_assistant = FakeHomeAssistant(
+        [
+            ([_make_state("climate.heat_pump_a", "heat")], []),
+            ([_make_state("climate.heat_pump_a", "off")], []),
+        ]
+    )
+    server = await _serve(home_assistant)
+    tracker = _make_tracker(session, url=str(server.make_url("/api/websocket")))
+    task = asyncio.create_task(tracker.run())
+    try:
+        await _wait_until(lambda: len(home_assistant.received) == 2)
+        await _wait_until(
+            lambda: tracker.is_ready
+            and [hvac.state for hvac in tracker.get_entity_parser().get_hvacs()]
+            == [HvacState.off]
+        )
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+        await server.close()
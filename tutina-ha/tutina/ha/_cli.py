@@ -2,116 +2,150 @@ import asyncio
 import contextlib
 import functools
 import logging
-import time
-import typing
+from datetime import datetime, timezone
 
-import schedule
+import aiohttp
 import typer
+from homeassistant_api import Client
 
 from tutina.lib.client import create_client
-from tutina.lib.settings import Settings
+from tutina.lib.settings import OwmSettings, Settings
+from tutina.lib.types import DataBatch
 
 from .forecasts import fetch_forecasts
-from .measurements import EntityParser
+from .measurements import EntityParser, create_homeassistant_client
+from .scheduler import Scheduler
+from .spool import Spool
+from .state_tracker import StateTracker
 
 app = typer.Typer()
 logger = logging.getLogger(__name__)
 
-
-def log_errors(func: typing.Callable):
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        try:
-            logger.debug("Running %s", func.__name__)
-            return func(*args, **kwargs)
-        except Exception:
-            logger.exception("Error when running %s", func.__name__)
-
-    return wrapper
-
-
-async def _log_errors_async(aw: typing.Awaitable):
-    try:
-        logger.debug("Running %r", aw)
-        await aw
-    except Exception:
-        logger.exception("Error when running %r", aw)
-
-
-def get_scheduler(tg: asyncio.TaskGroup):
-    def _schedule(aw: typing.Awaitable):
-        tg.create_task(_log_errors_async(aw))
-
-    return _schedule
-
-
-@log_errors
-def fetch_and_store_measurements(settings: Settings):
-    if (homeassistant := settings.homeassistant) is None:
-        logger.debug("No HA settings, skipping measurements")
-        return
-
-    entity_parser = EntityParser(homeassistant)
+MEASUREMENTS_INTERVAL_IN_MINUTES = 5
+FORECASTS_INTERVAL_IN_MINUTES = 60
+FORECASTS_JITTER_IN_SECONDS = 30.0
+OWM_TIMEOUT_IN_SECONDS = 30.0
+
+
+async def fetch_and_store_measurements(
+    homeassistant_client: Client,
+    state_tracker: StateTracker | None,
+    spool: Spool | None,
+):
+    timestamp = datetime.now(timezone.utc)
+    if state_tracker and state_tracker.is_ready:
+        entity_parser = state_tracker.get_entity_parser()
+    else:
+        entity_parser = await EntityParser.fetch(homeassistant_client)
     measurements = entity_parser.get_measurements()
     logger.debug("Measurements: %r", measurements)
-    hvacs = entity_parser.get_hvacs()
-    logger.debug("Hvacs: %r", hvacs)
-    opening_states = entity_parser.get_opening_states()
-    logger.debug("Opening states: %r", opening_states)
-
-    async def _store_measurements():
-        async with contextlib.AsyncExitStack() as exit_stack:
-            if tutina := settings.tutina:
-                client = await exit_stack.enter_async_context(
-                    create_client(
-                        str(tutina.base_url),
-                        tutina.token_secret.get_secret_value(),
-                    )
-                )
-            else:
-                logger.debug("No tutina settings, skipping submitting measurements")
-                client = None
-            tg = await exit_stack.enter_async_context(asyncio.TaskGroup())
-            schedule = get_scheduler(tg)
-            if client:
-                schedule(client.submit_measurements(measurements))
-                schedule(client.submit_hvacs(hvacs))
-                schedule(client.submit_opening_states(opening_states))
-
-    asyncio.run(_store_measurements())
-
-
-@log_errors
-def fetch_and_store_forecasts(settings: Settings):
-    if (owm := settings.owm) is None:
-        logger.debug("No OWM settings, skipping forecasts")
-        return
-
-    forecasts = fetch_forecasts(owm)
+    if state_tracker and state_tracker.records_transitions:
+        # the HVAC and opening states are recorded when they change instead
+        hvacs, opening_states = [], []
+        hvac_transitions, opening_transitions = state_tracker.pop_transitions()
+        logger.debug("Hvac transitions: %r", hvac_transitions)
+        logger.debug("Opening transitions: %r", opening_transitions)
+    else:
+        hvacs = entity_parser.get_hvacs()
+        logger.debug("Hvacs: %r", hvacs)
+        opening_states = entity_parser.get_opening_states()
+        logger.debug("Opening states: %r", opening_states)
+        hvac_transitions, opening_transitions = [], []
+
+    if not (
+        measurements
+        or hvacs
+        or opening_states
+        or hvac_transitions
+        or opening_transitions
+    ):
+        logger.debug("Nothing to submit")
+    elif spool:
+        await spool.submit(
+            DataBatch(
+                measurements=measurements,
+                hvacs=hvacs,
+                opening_states=opening_states,
+                hvac_transitions=hvac_transitions,
+                opening_transitions=opening_transitions,
+                timestamp=timestamp,
+            )
+        )
+    else:
+        logger.debug("No tutina settings, skipping submitting measurements")
+
+
+async def fetch_and_store_forecasts(
+    owm: OwmSettings, session: aiohttp.ClientSession, spool: Spool | None
+):
+    timestamp = datetime.now(timezone.utc)
+    forecasts = await fetch_forecasts(owm, session)
     logger.debug("Forecasts: %r", forecasts)
 
-    async def _store_forecasts():
-        async with contextlib.AsyncExitStack() as exit_stack:
-            if tutina := settings.tutina:
-                client = await exit_stack.enter_async_context(
-                    create_client(
-                        str(tutina.base_url),
-                        tutina.token_secret.get_secret_value(),
-                    )
+    if spool:
+        await spool.submit(DataBatch(forecasts=forecasts, timestamp=timestamp))
+    else:
+        logger.debug("No client settings, skipping submitting forecasts")
+
+
+async def run(settings: Settings):
+    scheduler = Scheduler()
+    state_tracker = None
+    spool = None
+    async with contextlib.AsyncExitStack() as exit_stack:
+        # the client and its connections are shared by all the jobs
+        if tutina := settings.tutina:
+            client = await exit_stack.enter_async_context(
+                create_client(
+                    str(tutina.base_url),
+                    tutina.token_secret.get_secret_value(),
                 )
-            else:
-                logger.debug("No client settings, skipping submitting forecasts")
-                client = None
-            tg = await exit_stack.enter_async_context(asyncio.TaskGroup())
-            schedule = get_scheduler(tg)
-            if client:
-                schedule(client.submit_forecasts(forecasts))
-
-    asyncio.run(_store_forecasts())
-
-
-def schedule_job(func: typing.Callable, minutes: int):
-    schedule.every(minutes).minutes.at(":00").do(func)
+            )
+            spool = Spool(tutina.get_spool_file_path(), client)
+            exit_stack.callback(spool.close)
+
+        if homeassistant := settings.homeassistant:
+            homeassistant_client = create_homeassistant_client(homeassistant)
+            exit_stack.push_async_callback(
+                homeassistant_client.async_cache_session.close
+            )
+            if homeassistant.websocket_url:
+                websocket_session = await exit_stack.enter_async_context(
+                    aiohttp.ClientSession()
+                )
+                state_tracker = StateTracker(homeassistant, websocket_session)
+            scheduler.add_job(
+                functools.partial(
+                    fetch_and_store_measurements,
+                    homeassistant_client,
+                    state_tracker,
+                    spool,
+                ),
+                minutes=MEASUREMENTS_INTERVAL_IN_MINUTES,
+            )
+        else:
+            logger.info("No HA settings, skipping measurements")
+
+        if owm := settings.owm:
+            session = await exit_stack.enter_async_context(
+                aiohttp.ClientSession(
+                    timeout=aiohttp.ClientTimeout(total=OWM_TIMEOUT_IN_SECONDS)
+                )
+            )
+            scheduler.add_job(
+                functools.partial(fetch_and_store_forecasts, owm, session, spool),
+                minutes=FORECASTS_INTERVAL_IN_MINUTES,
+                jitter=FORECASTS_JITTER_IN_SECONDS,
+            )
+        else:
+            logger.info("No OWM settings, skipping forecasts")
+
+        async with asyncio.TaskGroup() as tg:
+            if state_tracker:
+                tg.create_task(state_tracker.run())
+            if spool:
+                tg.create_task(spool.run())
+            tg.create_task(scheduler.run())
 
 
 @app.command()
@@ -123,11 +157,4 @@ def ha(ctx: typer.Context):
     settings: Settings = ctx.obj["settings"]
 
     logger.info("Starting tutina...")
-    fetch_and_store_measurements(settings)
-    fetch_and_store_forecasts(settings)
-    schedule_job(functools.partial(fetch_and_store_forecasts, settings), 60)
-    schedule_job(functools.partial(fetch_and_store_measurements, settings), 5)
-    while True:
-        if idle_seconds := schedule.idle_seconds():
-            time.sleep(idle_seconds)
-        schedule.run_pending()
+    asyncio.run(run(settings))
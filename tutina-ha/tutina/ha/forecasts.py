@@ -1,8 +1,8 @@
 import typing
 from datetime import datetime, timezone
 
+import aiohttp
 import pydantic
-import requests
 
 from tutina.lib.settings import OwmSettings
 from tutina.lib.types import Forecast
@@ -12,16 +12,19 @@ _DEFAULT_PARAMS = {
 }
 
 
-def fetch_forecasts(owm_settings: OwmSettings) -> list[Forecast]:
-    forecasts = requests.get(
+async def fetch_forecasts(
+    owm_settings: OwmSettings, session: aiohttp.ClientSession
+) -> list[Forecast]:
+    async with session.get(
         "https://api.openweathermap.org/data/3.0/onecall",
         params={
             "appid": owm_settings.api_key.get_secret_value(),
             **_DEFAULT_PARAMS,
             **owm_settings.coordinates.model_dump(),
         },
-        timeout=30,
-    ).json()
+        raise_for_status=True,
+    ) as response:
+        forecasts = await response.json()
     return [
         Forecast(
             reference_timestamp=datetime.fromtimestamp(forecast["dt"], tz=timezone.utc),
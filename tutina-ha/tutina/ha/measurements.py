@@ -3,7 +3,7 @@ import typing
 from datetime import datetime
 
 import pydantic
-from homeassistant_api import Client
+from homeassistant_api import Client, State
 
 from tutina.lib.settings import HomeAssistantSettings
 from tutina.lib.types import Hvac, Measurement, OpeningState
@@ -16,28 +16,81 @@ _hvac_entity_re = re.compile(r"^(?P<device>heat_pump_[a-z0-9_-]+)$")
 
 _opening_re = re.compile(r"^(?P<type>door|window)_(?P<opening>[a-z0-9_-]+)_opening$")
 
+EntityStates = dict[str, dict[str, State]]
+"""Entity states by domain and entity slug"""
+
+
+def is_tracked_entity(entity_id: str) -> bool:
+    """Check if the entity is used by :class:`EntityParser`"""
+
+    domain, _, slug = entity_id.partition(".")
+    match domain:
+        case "sensor":
+            return _measurement_entity_re.match(slug) is not None
+        case "climate":
+            return True
+        case "binary_sensor":
+            return _opening_re.match(slug) is not None
+    return False
+
+
+def create_homeassistant_client(settings: HomeAssistantSettings) -> Client:
+    return Client(
+        str(settings.api_url),
+        settings.api_token.get_secret_value(),
+        use_async=True,
+        # the states must be fresh on every fetch
+        async_cache_session=False,
+    )
+
+
+def parse_hvac(device: str, state: State) -> Hvac:
+    return Hvac(
+        device=device,
+        state=hvac_state if (hvac_state := state.state) != "unavailable" else None,
+        temperature=state.attributes.get("temperature"),
+    )
+
+
+def parse_opening_state(opening: str, state: State) -> OpeningState | None:
+    if (m := _opening_re.match(opening)) is None:
+        return None
+    return OpeningState(
+        opening_type=m.group("type"),
+        opening=m.group("opening"),
+        is_open=state.state == "on",
+    )
+
 
 class EntityParser:
-    def __init__(self, settings: HomeAssistantSettings):
-        client = Client(
-            str(settings.api_url),
-            settings.api_token.get_secret_value(),
+    def __init__(self, states: EntityStates):
+        self._states = states
+
+    @classmethod
+    async def fetch(cls, client: Client):
+        entities = await client.async_get_entities()
+        return cls(
+            {
+                group_id: {
+                    slug: entity.state for (slug, entity) in group.entities.items()
+                }
+                for (group_id, group) in entities.items()
+            }
         )
-        self._entities = client.get_entities()
 
     def get_measurements(self) -> list[Measurement]:
-        sensor_entities = self._entities["sensor"].entities
+        sensor_states = self._states.get("sensor", {})
 
         def _get_measurement(location, measurement) -> typing.Optional[str]:
             if (
-                entity := sensor_entities.get(f"weather_{location}_{measurement}")
-            ) and entity.state.state != "unavailable":
-                return entity.state.state
+                state := sensor_states.get(f"weather_{location}_{measurement}")
+            ) and state.state != "unavailable":
+                return state.state
             return None
 
         sensor_locations = set(
             m.group("location")
-            for key in sensor_entities.keys()
+            for key in sensor_states.keys()
             if (m := _measurement_entity_re.match(key)) is not None
         )
         return [
@@ -53,25 +106,13 @@ class EntityParser:
 
     def get_hvacs(self) -> list[Hvac]:
         return [
-            Hvac(
-                device=device,
-                state=(
-                    state if (state := entity.state.state) != "unavailable" else None
-                ),
-                temperature=entity.state.attributes.get("temperature"),
-            )
-            for (device, entity) in self._entities["climate"].entities.items()
+            parse_hvac(device, state)
+            for (device, state) in self._states.get("climate", {}).items()
         ]
 
     def get_opening_states(self) -> list[OpeningState]:
-        openings = [
-            OpeningState(
-                opening_type=m.group("type"),
-                opening=m.group("opening"),
-                is_open=entity.state.state == "on",
-            )
-            for (opening, entity) in self._entities["binary_sensor"].entities.items()
-            if (m := _opening_re.match(opening)) is not None
+        return [
+            opening_state
+            for (opening, state) in self._states.get("binary_sensor", {}).items()
+            if (opening_state := parse_opening_state(opening, state)) is not None
         ]
-
-        return openings
@@ -0,0 +1,89 @@
+"""Asyncio native job scheduler
+
+The jobs are coroutine functions run at intervals aligned to the wall clock,
+e.g. a job run every 5 minutes is run at :00, :05, :10 and so on. Each job runs
+in its own task, so a slow job does not delay the others.
+
+A job is never run concurrently with itself. If the previous run takes past the
+next tick, or the ticks are otherwise missed, the job is run once immediately to
+catch up, and then again at the next tick.
+"""
+
+import asyncio
+import dataclasses
+import functools
+import logging
+import random
+import time
+import typing
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class Job:
+    func: typing.Callable[[], typing.Awaitable]
+    interval: float
+    jitter: float
+    run_at_start: bool
+
+    @property
+    def name(self) -> str:
+        func = self.func
+        while isinstance(func, functools.partial):
+            func = func.func
+        return getattr(func, "__name__", repr(func))
+
+
+def _get_next_tick(timestamp: float, interval: float) -> float:
+    return timestamp - timestamp % interval + interval
+
+
+class Scheduler:
+    def __init__(self):
+        self._jobs: list[Job] = []
+
+    def add_job(
+        self,
+        func: typing.Callable[[], typing.Awaitable],
+        *,
+        minutes: int,
+        jitter: float = 0.0,
+        run_at_start: bool = True,
+    ):
+        """Add job run every ``minutes``
+
+        Each run is delayed by random amount of up to ``jitter`` seconds from the
+        tick. If ``run_at_start`` is true, the job is also run immediately when
+        the scheduler starts.
+        """
+
+        self._jobs.append(Job(func, minutes * 60, jitter, run_at_start))
+
+    async def run(self):
+        """Run the jobs until cancelled"""
+
+        async with asyncio.TaskGroup() as tg:
+            for job in self._jobs:
+                tg.create_task(self._run_job(job))
+
+    async def _run_job(self, job: Job):
+        now = time.time()
+        tick = now if job.run_at_start else _get_next_tick(now, job.interval)
+        while True:
+            if (delay := tick + random.uniform(0, job.jitter) - time.time()) > 0:
+                await asyncio.sleep(delay)
+            await self._run_once(job)
+            now = time.time()
+            tick = _get_next_tick(tick, job.interval)
+            if tick <= now:
+                n_missed = int((now - tick) // job.interval) + 1
+                logger.warning("Job %s missed %d tick(s)", job.name, n_missed)
+                tick = now
+
+    async def _run_once(self, job: Job):
+        try:
+            logger.debug("Running %s", job.name)
+            await job.func()
+        except Exception:
+            logger.exception("Error when running %s", job.name)
@@ -0,0 +1,188 @@
+"""Spool of data batches that could not be submitted
+
+If the Tutina API cannot be reached, the batches are appended to a spool in an
+SQLite database instead of being lost, and survive restarting the addon. A
+background task drains the spool in bulk once the API is reachable again,
+sending the oldest batches first, and waiting between the requests so that a
+long backlog does not flood the API.
+
+The batches carry the time they were sampled, so that the API stores them with
+the same timestamps however late they are submitted. The spool is keyed by that
+timestamp, so a batch is spooled only once, and the API rejects a batch that has
+already been stored, so replaying a batch whose response was lost is harmless.
+A batch the API rejects as invalid would never be stored, so it is dropped and
+logged as an error.
+"""
+
+import asyncio
+import logging
+import sqlite3
+import zlib
+from datetime import datetime, timezone
+from http import HTTPStatus
+from pathlib import Path
+from typing import Iterable
+
+import aiohttp
+import orjson
+
+from tutina.lib.client import TutinaClient
+from tutina.lib.types import DataBatch
+
+logger = logging.getLogger(__name__)
+
+MAX_SPOOLED_BATCHES = 20_000
+DRAIN_BATCH_SIZE = 50
+DRAIN_INTERVAL_IN_SECONDS = 5.0
+MIN_RETRY_DELAY_IN_SECONDS = 30.0
+MAX_RETRY_DELAY_IN_SECONDS = 15 * 60.0
+
+# statuses of batches that would fail the same way if submitted again, any
+# other error (an expired token, a proxy in front of a restarting server, ...)
+# is retried
+_REJECTED_STATUSES = frozenset(
+    [
+        HTTPStatus.BAD_REQUEST,
+        HTTPStatus.CONFLICT,
+        HTTPStatus.UNPROCESSABLE_ENTITY,
+    ]
+)
+
+
+def _get_key(timestamp: datetime) -> str:
+    # fixed width, so that the keys sort in chronological order
+    return timestamp.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+def _is_rejected(ex: aiohttp.ClientResponseError) -> bool:
+    return ex.status in _REJECTED_STATUSES
+
+
+class Spool:
+    """Submit batches to the Tutina API, spooling them if it cannot be reached
+
+    The database is small and accessed a few times a minute at most, so it is
+    used directly from the event loop.
+    """
+
+    def __init__(self, path: Path, client: TutinaClient):
+        self._client = client
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS batches "
+                "(timestamp TEXT PRIMARY KEY, batch BLOB NOT NULL) WITHOUT ROWID"
+            )
+        self._has_batches = asyncio.Event()
+        if n_batches := self._count():
+            logger.info("%d batches in spool", n_batches)
+            self._has_batches.set()
+
+    def close(self):
+        self._connection.close()
+
+    async def submit(self, batch: DataBatch):
+        """Submit the batch, or spool it if the API cannot be reached
+
+        The batch must have a timestamp.
+        """
+
+        if self._has_batches.is_set():
+            # keep the order, and let the drain submit it after the older ones
+            self._append(batch)
+            return
+        try:
+            await self._submit_or_drop(batch)
+        except (aiohttp.ClientError, TimeoutError) as ex:
+            logger.warning("Submitting batch failed, spooling it: %s", ex)
+            self._append(batch)
+            self._has_batches.set()
+
+    async def run(self):
+        """Drain the spool until cancelled, backing off on errors"""
+
+        delay = MIN_RETRY_DELAY_IN_SECONDS
+        while True:
+            await self._has_batches.wait()
+            try:
+                drained = await self._drain_once()
+            except (aiohttp.ClientError, TimeoutError) as ex:
+                logger.warning(
+                    "Draining spool failed, retrying in %.0f seconds: %s", delay, ex
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY_IN_SECONDS)
+                continue
+            delay = MIN_RETRY_DELAY_IN_SECONDS
+            if drained:
+                await asyncio.sleep(DRAIN_INTERVAL_IN_SECONDS)
+            else:
+                logger.info("Spool drained")
+                self._has_batches.clear()
+
+    async def _drain_once(self) -> bool:
+        rows = self._peek(DRAIN_BATCH_SIZE)
+        if not rows:
+            return False
+        try:
+            await self._client.submit_batches(batch for (_, batch) in rows)
+        except aiohttp.ClientResponseError as ex:
+            if not _is_rejected(ex):
+                raise
+            # a batch already stored or otherwise rejected fails the whole
+            # request, so fall back to submitting the batches one by one
+            for key, batch in rows:
+                await self._submit_or_drop(batch)
+                self._remove([key])
+        else:
+            self._remove(key for (key, _) in rows)
+        logger.debug("Submitted %d batches from spool", len(rows))
+        return True
+
+    async def _submit_or_drop(self, batch: DataBatch):
+        try:
+            await self._client.submit_batches([batch])
+        except aiohttp.ClientResponseError as ex:
+            if not _is_rejected(ex):
+                raise
+            if ex.status == HTTPStatus.CONFLICT:
+                logger.debug("Batch at %s has already been stored", batch.timestamp)
+            else:
+                logger.error("Dropping batch at %s: %s", batch.timestamp, ex)
+
+    def _append(self, batch: DataBatch):
+        assert batch.timestamp
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR IGNORE INTO batches VALUES (?, ?)",
+                (
+                    _get_key(batch.timestamp),
+                    zlib.compress(orjson.dumps(batch.model_dump())),
+                ),
+            )
+            n_dropped = self._connection.execute(
+                "DELETE FROM batches WHERE timestamp IN "
+                "(SELECT timestamp FROM batches ORDER BY timestamp DESC "
+                "LIMIT -1 OFFSET ?)",
+                (MAX_SPOOLED_BATCHES,),
+            ).rowcount
+        if n_dropped:
+            logger.warning("Spool is full, dropped %d oldest batches", n_dropped)
+
+    def _peek(self, n: int) -> list[tuple[str, DataBatch]]:
+        rows = self._connection.execute(
+            "SELECT timestamp, batch FROM batches ORDER BY timestamp LIMIT ?", (n,)
+        )
+        return [
+            (key, DataBatch.model_validate_json(zlib.decompress(data)))
+            for (key, data) in rows
+        ]
+
+    def _remove(self, keys: Iterable[str]):
+        with self._connection:
+            self._connection.executemany(
+                "DELETE FROM batches WHERE timestamp = ?", ((key,) for key in keys)
+            )
+
+    def _count(self) -> int:
+        return self._connection.execute("SELECT count(*) FROM batches").fetchone()[0]
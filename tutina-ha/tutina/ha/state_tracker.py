@@ -0,0 +1,179 @@
+"""Track Home Assistant states via the websocket API
+
+Instead of fetching every entity on each measurement, the tracker subscribes to
+the ``state_changed`` events, and keeps a snapshot of the states of the entities
+used by :class:`tutina.ha.measurements.EntityParser`.
+
+If ``record_transitions`` is enabled, the tracker also records the HVAC and
+opening states each time they change, so that they can be stored as transitions
+instead of sampling them.
+"""
+
+import asyncio
+import logging
+import typing
+
+import aiohttp
+from homeassistant_api import State
+
+from tutina.lib.settings import HomeAssistantSettings
+from tutina.lib.types import Hvac, HvacTransition, OpeningState, OpeningTransition
+
+from .measurements import (
+    EntityParser,
+    EntityStates,
+    is_tracked_entity,
+    parse_hvac,
+    parse_opening_state,
+)
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_IN_SECONDS = 30.0
+MIN_RECONNECT_DELAY_IN_SECONDS = 1.0
+MAX_RECONNECT_DELAY_IN_SECONDS = 60.0
+
+_SUBSCRIBE_ID = 1
+_GET_STATES_ID = 2
+
+
+class StateTrackerError(Exception):
+    pass
+
+
+class StateTracker:
+    def __init__(self, settings: HomeAssistantSettings, session: aiohttp.ClientSession):
+        assert settings.websocket_url
+        self._url = str(settings.websocket_url)
+        self._token = settings.api_token.get_secret_value()
+        self._session = session
+        self._states: EntityStates = {}
+        self._is_ready = False
+        self._record_transitions = settings.record_transitions
+        self._recorded: dict[str, Hvac | OpeningState] = {}
+        self._hvac_transitions: list[HvacTransition] = []
+        self._opening_transitions: list[OpeningTransition] = []
+
+    @property
+    def records_transitions(self) -> bool:
+        return self._record_transitions
+
+    @property
+    def is_ready(self) -> bool:
+        """Whether the snapshot is up to date"""
+
+        return self._is_ready
+
+    def get_entity_parser(self) -> EntityParser:
+        """Get parser for the current snapshot of the states"""
+
+        return EntityParser(
+            {domain: dict(states) for (domain, states) in self._states.items()}
+        )
+
+    def pop_transitions(self) -> tuple[list[HvacTransition], list[OpeningTransition]]:
+        """Get and forget the transitions recorded since the last call"""
+
+        transitions = self._hvac_transitions, self._opening_transitions
+        self._hvac_transitions, self._opening_transitions = [], []
+        return transitions
+
+    async def run(self):
+        """Track the states until cancelled, reconnecting on errors"""
+
+        delay = MIN_RECONNECT_DELAY_IN_SECONDS
+        while True:
+            try:
+                await self._track()
+            except (aiohttp.ClientError, StateTrackerError) as ex:
+                logger.warning("Tracking states failed: %s", ex)
+            else:
+                logger.warning("Websocket connection closed")
+            if self._is_ready:
+                delay = MIN_RECONNECT_DELAY_IN_SECONDS
+            self._is_ready = False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY_IN_SECONDS)
+
+    async def _track(self):
+        async with self._session.ws_connect(
+            self._url, heartbeat=HEARTBEAT_IN_SECONDS
+        ) as ws:
+            await self._authenticate(ws)
+            # subscribe before getting the states, so that no change is missed
+            await ws.send_json(
+                {
+                    "id": _SUBSCRIBE_ID,
+                    "type": "subscribe_events",
+                    "event_type": "state_changed",
+                }
+            )
+            await ws.send_json({"id": _GET_STATES_ID, "type": "get_states"})
+            async for message in ws:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    break
+                # the server may coalesce several messages into one
+                data = message.json()
+                for item in data if isinstance(data, list) else [data]:
+                    self._handle_message(item)
+
+    async def _authenticate(self, ws: aiohttp.ClientWebSocketResponse):
+        message = await ws.receive_json()
+        if message.get("type") != "auth_required":
+            raise StateTrackerError(f"Unexpected message: {message!r}")
+        await ws.send_json({"type": "auth", "access_token": self._token})
+        message = await ws.receive_json()
+        if message.get("type") != "auth_ok":
+            raise StateTrackerError(f"Authentication failed: {message!r}")
+
+    def _handle_message(self, message: dict[str, typing.Any]):
+        match message.get("type"):
+            case "result" if not message.get("success"):
+                raise StateTrackerError(f"Request failed: {message!r}")
+            case "result" if message.get("id") == _GET_STATES_ID:
+                self._states = {}
+                for state in message["result"]:
+                    self._set_state(state["entity_id"], state)
+                self._is_ready = True
+                logger.info("Tracking states of %d entities", self._count_states())
+            case "event":
+                data = message["event"]["data"]
+                self._set_state(data["entity_id"], data.get("new_state"))
+
+    def _set_state(self, entity_id: str, state: dict[str, typing.Any] | None):
+        if not is_tracked_entity(entity_id):
+            return
+        domain, _, slug = entity_id.partition(".")
+        domain_states = self._states.setdefault(domain, {})
+        if state is None:
+            domain_states.pop(slug, None)
+            return
+        domain_states[slug] = state_model = State.model_validate(state)
+        if self._record_transitions:
+            self._record_transition(entity_id, state_model)
+
+    def _record_transition(self, entity_id: str, state: State):
+        # the snapshot after reconnecting contains the changes missed while
+        # disconnected, and the unchanged states that are not recorded again
+        timestamp = state.last_updated or state.last_changed
+        domain, _, slug = entity_id.partition(".")
+        match domain:
+            case "climate":
+                hvac = parse_hvac(slug, state)
+                if self._recorded.get(entity_id) != hvac:
+                    self._recorded[entity_id] = hvac
+                    self._hvac_transitions.append(
+                        HvacTransition(timestamp=timestamp, **hvac.model_dump())
+                    )
+            case "binary_sensor":
+                opening_state = parse_opening_state(slug, state)
+                if opening_state and self._recorded.get(entity_id) != opening_state:
+                    self._recorded[entity_id] = opening_state
+                    self._opening_transitions.append(
+                        OpeningTransition(
+                            timestamp=timestamp, **opening_state.model_dump()
+                        )
+                    )
+
+    def _count_states(self):
+        return sum(len(states) for states in self._states.values())
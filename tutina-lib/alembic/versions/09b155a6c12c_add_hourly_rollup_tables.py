@@ -0,0 +1,134 @@
+"""Add hourly rollup tables
+
+Revision ID: 09b155a6c12c
+Revises: 546475644507
+Create Date: 2026-10-17 16:20:41.503112
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "09b155a6c12c"
+down_revision: Union[str, None] = "546475644507"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+HVAC_STATES = ["off", "auto", "cool", "heat", "dry", "fan_only"]
+
+WINDOW = "from_unixtime(floor(unix_timestamp(timestamp) / 3600) * 3600)"
+
+
+def upgrade() -> None:
+    op.create_table(
+        "forecasts_hourly",
+        sa.Column("timestamp", sa.DateTime(), nullable=False),
+        sa.Column("in_hours", sa.Integer(), nullable=False),
+        sa.Column("temperature_sum", sa.Float(), nullable=False),
+        sa.Column("humidity_sum", sa.Float(), nullable=False),
+        sa.Column("pressure_sum", sa.Float(), nullable=False),
+        sa.Column("wind_speed_sum", sa.Float(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("timestamp", "in_hours"),
+    )
+    op.create_table(
+        "hvacs_hourly",
+        sa.Column("timestamp", sa.DateTime(), nullable=False),
+        sa.Column("device_id", sa.Integer(), nullable=False),
+        sa.Column("temperature_sum", sa.Float(), nullable=False),
+        sa.Column("temperature_count", sa.Integer(), nullable=False),
+        sa.Column("state_count", sa.Integer(), nullable=False),
+        *(
+            sa.Column(f"{state}_count", sa.Integer(), nullable=False)
+            for state in HVAC_STATES
+        ),
+        sa.ForeignKeyConstraint(
+            ["device_id"],
+            ["hvac_devices.id"],
+        ),
+        sa.PrimaryKeyConstraint("timestamp", "device_id"),
+    )
+    op.create_table(
+        "measurements_hourly",
+        sa.Column("timestamp", sa.DateTime(), nullable=False),
+        sa.Column("location_id", sa.Integer(), nullable=False),
+        sa.Column("temperature_sum", sa.Float(), nullable=False),
+        sa.Column("temperature_count", sa.Integer(), nullable=False),
+        sa.Column("humidity_sum", sa.Float(), nullable=False),
+        sa.Column("humidity_count", sa.Integer(), nullable=False),
+        sa.Column("pressure_sum", sa.Float(), nullable=False),
+        sa.Column("pressure_count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["location_id"],
+            ["locations.id"],
+        ),
+        sa.PrimaryKeyConstraint("timestamp", "location_id"),
+    )
+    op.create_table(
+        "opening_states_hourly",
+        sa.Column("timestamp", sa.DateTime(), nullable=False),
+        sa.Column("opening_id", sa.Integer(), nullable=False),
+        sa.Column("open_count", sa.Integer(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["opening_id"],
+            ["openings.id"],
+        ),
+        sa.PrimaryKeyConstraint("timestamp", "opening_id"),
+    )
+
+    # backfill from the raw tables
+    op.execute(
+        f"""
+        INSERT INTO measurements_hourly
+        SELECT {WINDOW} AS hour_start, location_id,
+            coalesce(sum(temperature), 0), count(temperature),
+            coalesce(sum(humidity), 0), count(humidity),
+            coalesce(sum(pressure), 0), count(pressure)
+        FROM measurements
+        GROUP BY hour_start, location_id
+        """
+    )
+    state_counts = ", ".join(
+        f"coalesce(sum(state = '{state}'), 0)" for state in HVAC_STATES
+    )
+    op.execute(
+        f"""
+        INSERT INTO hvacs_hourly
+        SELECT {WINDOW} AS hour_start, device_id,
+            coalesce(sum(temperature), 0), count(temperature),
+            count(state), {state_counts}
+        FROM hvacs
+        GROUP BY hour_start, device_id
+        """
+    )
+    op.execute(
+        f"""
+        INSERT INTO opening_states_hourly
+        SELECT {WINDOW} AS hour_start, opening_id, sum(is_open), count(*)
+        FROM opening_states
+        GROUP BY hour_start, opening_id
+        """
+    )
+    op.execute(
+        f"""
+        INSERT INTO forecasts_hourly
+        SELECT {WINDOW} AS hour_start,
+            hour(timediff(reference_timestamp, {WINDOW})) AS in_hours,
+            sum(temperature), sum(humidity), sum(pressure), sum(wind_speed),
+            count(*)
+        FROM forecasts
+        GROUP BY hour_start, in_hours
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("opening_states_hourly")
+    op.drop_table("measurements_hourly")
+    op.drop_table("hvacs_hourly")
+    op.drop_table("forecasts_hourly")
@@ -0,0 +1,79 @@
+"""Partition time series tables by month
+
+Revision ID: 394b09756d23
+Revises: 09b155a6c12c
+Create Date: 2026-10-17 17:05:12.418230
+
+"""
+
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "394b09756d23"
+down_revision: Union[str, None] = "09b155a6c12c"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FOREIGN_KEYS = {
+    "measurements": ("location_id", "locations"),
+    "hvacs": ("device_id", "hvac_devices"),
+    "opening_states": ("opening_id", "openings"),
+    "forecasts": None,
+    "measurements_hourly": ("location_id", "locations"),
+    "hvacs_hourly": ("device_id", "hvac_devices"),
+    "opening_states_hourly": ("opening_id", "openings"),
+    "forecasts_hourly": None,
+}
+
+
+def _month_start(timestamp: datetime) -> datetime:
+    return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(month: datetime, n: int) -> datetime:
+    year, month_index = divmod(month.year * 12 + month.month - 1 + n, 12)
+    return month.replace(year=year, month=month_index + 1)
+
+
+def _partition_definitions(first: datetime, last: datetime) -> str:
+    definitions = []
+    month = _month_start(first)
+    while month <= last:
+        definitions.append(
+            f"PARTITION p{month:%Y%m} VALUES LESS THAN "
+            f"(TO_DAYS('{_add_months(month, 1):%Y-%m-%d}'))"
+        )
+        month = _add_months(month, 1)
+    definitions.append("PARTITION pfuture VALUES LESS THAN MAXVALUE")
+    return ", ".join(definitions)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    this_month = _month_start(datetime.now(timezone.utc).replace(tzinfo=None))
+    next_month = _add_months(this_month, 1)
+    for table in FOREIGN_KEYS:
+        for foreign_key in inspector.get_foreign_keys(table):
+            op.drop_constraint(foreign_key["name"], table, type_="foreignkey")
+        first = (
+            bind.execute(sa.text(f"SELECT min(timestamp) FROM {table}")).scalar_one()
+            or next_month
+        )
+        op.execute(
+            f"ALTER TABLE {table} PARTITION BY RANGE (TO_DAYS(timestamp)) "
+            f"({_partition_definitions(first, next_month)})"
+        )
+
+
+def downgrade() -> None:
+    for table, foreign_key in FOREIGN_KEYS.items():
+        op.execute(f"ALTER TABLE {table} REMOVE PARTITIONING")
+        if foreign_key:
+            column, referred_table = foreign_key
+            op.create_foreign_key(None, table, referred_table, [column], ["id"])
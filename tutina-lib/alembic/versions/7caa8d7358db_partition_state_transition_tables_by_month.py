@@ -0,0 +1,71 @@
+"""Partition state transition tables by month
+
+Revision ID: 7caa8d7358db
+Revises: b7d41c9e2f58
+Create Date: 2026-10-17 19:41:08.263114
+
+"""
+
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7caa8d7358db"
+down_revision: Union[str, None] = "b7d41c9e2f58"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FOREIGN_KEYS = {
+    "hvac_transitions": ("device_id", "hvac_devices"),
+    "opening_transitions": ("opening_id", "openings"),
+}
+
+
+def _month_start(timestamp: datetime) -> datetime:
+    return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(month: datetime, n: int) -> datetime:
+    year, month_index = divmod(month.year * 12 + month.month - 1 + n, 12)
+    return month.replace(year=year, month=month_index + 1)
+
+
+def _partition_definitions(first: datetime, last: datetime) -> str:
+    definitions = []
+    month = _month_start(first)
+    while month <= last:
+        definitions.append(
+            f"PARTITION p{month:%Y%m} VALUES LESS THAN "
+            f"(TO_DAYS('{_add_months(month, 1):%Y-%m-%d}'))"
+        )
+        month = _add_months(month, 1)
+    definitions.append("PARTITION pfuture VALUES LESS THAN MAXVALUE")
+    return ", ".join(definitions)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    this_month = _month_start(datetime.now(timezone.utc).replace(tzinfo=None))
+    next_month = _add_months(this_month, 1)
+    for table in FOREIGN_KEYS:
+        for foreign_key in inspector.get_foreign_keys(table):
+            op.drop_constraint(foreign_key["name"], table, type_="foreignkey")
+        first = (
+            bind.execute(sa.text(f"SELECT min(timestamp) FROM {table}")).scalar_one()
+            or next_month
+        )
+        op.execute(
+            f"ALTER TABLE {table} PARTITION BY RANGE (TO_DAYS(timestamp)) "
+            f"({_partition_definitions(first, next_month)})"
+        )
+
+
+def downgrade() -> None:
+    for table, (column, referred_table) in FOREIGN_KEYS.items():
+        op.execute(f"ALTER TABLE {table} REMOVE PARTITIONING")
+        op.create_foreign_key(None, table, referred_table, [column], ["id"])
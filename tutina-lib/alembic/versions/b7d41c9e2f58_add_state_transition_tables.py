@@ -0,0 +1,52 @@
+"""Add state transition tables
+
+Revision ID: b7d41c9e2f58
+Revises: 394b09756d23
+Create Date: 2026-10-17 18:12:37.905114
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b7d41c9e2f58"
+down_revision: Union[str, None] = "394b09756d23"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+HVAC_STATES = ["off", "auto", "cool", "heat", "dry", "fan_only"]
+
+
+def upgrade() -> None:
+    op.create_table(
+        "hvac_transitions",
+        sa.Column("timestamp", sa.DateTime(), nullable=False),
+        sa.Column("device_id", sa.Integer(), nullable=False),
+        sa.Column("state", sa.Enum(*HVAC_STATES, name="hvacstate"), nullable=True),
+        sa.Column("temperature", sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["device_id"],
+            ["hvac_devices.id"],
+        ),
+        sa.PrimaryKeyConstraint("timestamp", "device_id"),
+    )
+    op.create_table(
+        "opening_transitions",
+        sa.Column("timestamp", sa.DateTime(), nullable=False),
+        sa.Column("opening_id", sa.Integer(), nullable=False),
+        sa.Column("is_open", sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["opening_id"],
+            ["openings.id"],
+        ),
+        sa.PrimaryKeyConstraint("timestamp", "opening_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("opening_transitions")
+    op.drop_table("hvac_transitions")
@@ -6,10 +6,12 @@ from typing import Annotated
 import typer
 from rich import print
 
+from . import _db_cli
 from .logging import setup_logging
 from .settings import Settings
 
 app = typer.Typer()
+app.add_typer(_db_cli.app, name="db", help="Maintain the database")
 
 for subcommand in entry_points(group="tutina_cli"):
     app.add_typer(subcommand.load())
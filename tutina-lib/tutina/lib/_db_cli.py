@@ -0,0 +1,42 @@
+import asyncio
+from typing import Annotated
+
+import typer
+
+from .settings import Settings
+
+app = typer.Typer()
+
+
+@app.command()
+def maintain(
+    ctx: typer.Context,
+    retention_months: Annotated[
+        int | None,
+        typer.Option(
+            help="Months of raw data to keep, overriding database.retention_months"
+        ),
+    ] = None,
+):
+    """Add monthly partitions and drop expired raw data"""
+
+    from . import db, maintenance
+
+    settings: Settings = ctx.obj["settings"]
+    database_settings = settings.database
+
+    async def _maintain():
+        engine = db.create_async_engine(database_settings.get_url())
+        async with engine.connect() as connection:
+            await maintenance.maintain(
+                connection,
+                retention_months=(
+                    retention_months
+                    if retention_months is not None
+                    else database_settings.retention_months
+                ),
+            )
+            await connection.commit()
+        await engine.dispose()
+
+    asyncio.run(_maintain())
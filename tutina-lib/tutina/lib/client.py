@@ -8,9 +8,15 @@ import aiohttp
 import jwt
 import orjson
 
-from .types import Forecast, Hvac, Measurement, OpeningState
+from .types import DataBatch, Forecast, Hvac, Measurement, OpeningState
 
-EXP_TIME_IN_MINUTES = 5
+# long enough for the token to be reused over several 5 minute cycles
+EXP_TIME_IN_MINUTES = 15
+TOKEN_RENEWAL_MARGIN_IN_SECONDS = 60
+# shorter than the idle timeout of the websecure entrypoint of Traefik (see
+# compose.yml), so that the client never reuses a connection Traefik is about
+# to close
+KEEPALIVE_TIMEOUT_IN_SECONDS = 6 * 60
 
 
 def _get_exp():
@@ -24,48 +30,70 @@ class TutinaClient:
     def __init__(self, session: aiohttp.ClientSession, token_secret: str):
         self._session = session
         self._token_secret = token_secret
+        self._token: str | None = None
+        self._token_exp = 0
 
     async def submit_measurements(self, measurements: Iterable[Measurement]):
-        serialized_data = orjson.dumps([m.model_dump() for m in measurements])
-        async with self._session.post(
-            "/data/measurements", data=serialized_data, headers=self._get_headers()
-        ):
-            pass
+        await self._post(
+            "/data/measurements", orjson.dumps([m.model_dump() for m in measurements])
+        )
 
     async def submit_hvacs(self, hvacs: Iterable[Hvac]):
-        serialized_data = orjson.dumps([h.model_dump() for h in hvacs])
-        async with self._session.post(
-            "/data/hvacs", data=serialized_data, headers=self._get_headers()
-        ):
-            pass
+        await self._post("/data/hvacs", orjson.dumps([h.model_dump() for h in hvacs]))
 
     async def submit_opening_states(self, opening_states: Iterable[OpeningState]):
-        serialized_data = orjson.dumps([o.model_dump() for o in opening_states])
-        async with self._session.post(
-            "/data/opening_states", data=serialized_data, headers=self._get_headers()
-        ):
-            pass
+        await self._post(
+            "/data/opening_states",
+            orjson.dumps([o.model_dump() for o in opening_states]),
+        )
 
     async def submit_forecasts(self, forecasts: Iterable[Forecast]):
-        serialized_data = orjson.dumps([f.model_dump() for f in forecasts])
+        await self._post(
+            "/data/forecasts", orjson.dumps([f.model_dump() for f in forecasts])
+        )
+
+    async def submit_batch(self, batch: DataBatch):
+        await self._post("/data/batch", orjson.dumps(batch.model_dump()))
+
+    async def submit_batches(self, batches: Iterable[DataBatch]):
+        await self._post(
+            "/data/batches", orjson.dumps([b.model_dump() for b in batches])
+        )
+
+    async def _post(self, url: str, serialized_data: bytes):
         async with self._session.post(
-            "/data/forecasts", data=serialized_data, headers=self._get_headers()
+            url, data=serialized_data, headers=self._get_headers()
         ):
             pass
 
     def _get_headers(self):
         return {
-            "Authorization": f"Bearer {self._generate_token()}",
+            "Authorization": f"Bearer {self._get_token()}",
             "Content-Type": "application/json",
         }
 
-    def _generate_token(self):
-        return jwt.encode({"exp": _get_exp()}, self._token_secret)
+    def _get_token(self):
+        now = datetime.now(timezone.utc).timestamp()
+        if (
+            self._token is None
+            or self._token_exp - now < TOKEN_RENEWAL_MARGIN_IN_SECONDS
+        ):
+            self._token_exp = _get_exp()
+            self._token = jwt.encode({"exp": self._token_exp}, self._token_secret)
+        return self._token
 
 
 @contextlib.asynccontextmanager
 async def create_client(base_url: str, token_secret: str):
+    """Create client with a keep-alive session
+
+    The client is meant to be long-lived. The connections are kept alive over
+    the intervals the addon submits data, and the tokens are reused until they
+    are about to expire.
+    """
+
+    connector = aiohttp.TCPConnector(keepalive_timeout=KEEPALIVE_TIMEOUT_IN_SECONDS)
     async with aiohttp.ClientSession(
-        base_url=base_url, raise_for_status=True
+        base_url=base_url, connector=connector, raise_for_status=True
     ) as session:
         yield TutinaClient(session, token_secret)
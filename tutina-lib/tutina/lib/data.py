@@ -1,111 +1,509 @@
+import collections
+import contextlib
+import sqlite3
 import typing
-from datetime import datetime
+import weakref
+from datetime import datetime, timedelta, timezone
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql, sqlite
 
 from . import db, util
-from .types import Forecast, Hvac, Measurement, OpeningState
+from .types import (
+    DataBatch,
+    Forecast,
+    Hvac,
+    HvacTransition,
+    Measurement,
+    OpeningState,
+    OpeningTransition,
+)
 
 if util.is_testing():
     IGNORE_PREFIX = "OR IGNORE"
 else:
     IGNORE_PREFIX = "IGNORE"
 
+_MYSQL_DUPLICATE_ENTRY = 1062
+_SQLITE_DUPLICATE_ERROR_CODES = frozenset(
+    [sqlite3.SQLITE_CONSTRAINT_PRIMARYKEY, sqlite3.SQLITE_CONSTRAINT_UNIQUE]
+)
 
-async def store_measurements(
-    measurements: typing.Iterable[Measurement], *, connection: db.AsyncConnection
-) -> None:
+ROLLUP_WINDOW = timedelta(hours=1)
+
+DimensionKey = tuple[typing.Any, ...]
+
+T = typing.TypeVar("T")
+
+
+class DimensionCache:
+    """Ids of the rows in the dimension tables by their natural keys
+
+    Ids resolved within a transaction are pending until the transaction begun
+    with :func:`begin` has committed, so that a rollback or a failed commit
+    never leaves ids of nonexistent rows in the cache.
+    """
+
+    def __init__(self):
+        self._ids: dict[str, dict[DimensionKey, int]] = collections.defaultdict(dict)
+        self._pending: weakref.WeakKeyDictionary[
+            db.AsyncConnection, list[tuple[str, dict[DimensionKey, int]]]
+        ] = weakref.WeakKeyDictionary()
+
+    def get(self, table: sa.Table) -> dict[DimensionKey, int]:
+        return self._ids[table.name]
+
+    def add(
+        self,
+        table: sa.Table,
+        ids: dict[DimensionKey, int],
+        *,
+        connection: db.AsyncConnection,
+    ) -> None:
+        self._pending.setdefault(connection, []).append((table.name, ids))
+
+    def clear(self) -> None:
+        self._ids.clear()
+
+    def commit(self, connection: db.AsyncConnection) -> None:
+        """Make the ids pending in the committed transaction visible"""
+
+        for table_name, ids in self._pending.pop(connection, []):
+            self._ids[table_name].update(ids)
+
+    def discard(self, connection: db.AsyncConnection) -> None:
+        """Forget the ids pending in the rolled back transaction"""
+
+        self._pending.pop(connection, None)
+
+
+_dimension_caches: weakref.WeakKeyDictionary[sa.Engine, DimensionCache] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def is_duplicate_key_error(ex: sa.exc.IntegrityError) -> bool:
+    """Check if storing the data failed because it has already been stored
+
+    Other integrity errors, such as violating a foreign key or a NOT NULL
+    constraint, mean that the data is invalid.
+    """
+
+    if isinstance(ex.orig, sqlite3.IntegrityError):
+        return ex.orig.sqlite_errorcode in _SQLITE_DUPLICATE_ERROR_CODES
+    return bool(ex.orig and ex.orig.args and ex.orig.args[0] == _MYSQL_DUPLICATE_ENTRY)
+
+
+def get_dimension_cache(connection: db.AsyncConnection) -> DimensionCache:
+    """Get the dimension cache shared by all connections of the same engine"""
+
+    engine = connection.sync_engine
+    if (cache := _dimension_caches.get(engine)) is None:
+        cache = _dimension_caches[engine] = DimensionCache()
+    return cache
+
+
+@contextlib.asynccontextmanager
+async def begin(engine: db.AsyncEngine) -> typing.AsyncIterator[db.AsyncConnection]:
+    """Begin a transaction for storing data
+
+    The dimension ids resolved within the transaction are cached after it has
+    committed successfully.
+    """
+
+    async with engine.connect() as connection:
+        cache = get_dimension_cache(connection)
+        try:
+            async with connection.begin():
+                yield connection
+        except BaseException:
+            cache.discard(connection)
+            raise
+        cache.commit(connection)
+
+
+async def _resolve_ids(
+    table: sa.Table,
+    key_columns: list[str],
+    keys: typing.Iterable[DimensionKey],
+    *,
+    connection: db.AsyncConnection,
+) -> dict[DimensionKey, int]:
+    """Get ids of dimension table rows, inserting the rows with unknown keys
+
+    Known keys are resolved from the dimension cache. Unknown keys are inserted
+    ignoring duplicates, which may have been inserted by another writer, and
+    then their ids are selected.
+    """
+
+    cache = get_dimension_cache(connection)
+    cached_ids = cache.get(table)
+    unknown_keys = set(keys) - cached_ids.keys()
+    if not unknown_keys:
+        return cached_ids
     await connection.execute(
-        db.locations.insert()
+        table.insert()
         .prefix_with(IGNORE_PREFIX)
-        .values([{"slug": measurement.location} for measurement in measurements]),
+        .values([dict(zip(key_columns, key)) for key in unknown_keys])
     )
-    locations: dict[str, str] = dict(
-        (await connection.execute(db.select(db.locations.c.slug, db.locations.c.id)))
+    columns = [table.c[column] for column in key_columns]
+    new_ids: dict[DimensionKey, int] = {
+        tuple(key): id
+        for (*key, id) in (
+            await connection.execute(
+                db.select(*columns, table.c.id).where(
+                    sa.tuple_(*columns).in_(list(unknown_keys))
+                )
+            )
+        )
         .tuples()
         .fetchall()
+    }
+    cache.add(table, new_ids, connection=connection)
+    return {**cached_ids, **new_ids}
+
+
+async def _get_timestamp(connection: db.AsyncConnection) -> datetime:
+    return (
+        await connection.execute(db.select(sa.type_coerce(db.UTC_NOW, sa.DateTime)))
+    ).scalar_one()
+
+
+def _get_window(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def _to_naive_utc(timestamp: datetime) -> datetime:
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _sum_and_count(name: str, value: float | None) -> dict[str, typing.Any]:
+    return {
+        f"{name}_sum": value or 0.0,
+        f"{name}_count": int(value is not None),
+    }
+
+
+async def _store_rollup(
+    table: sa.Table,
+    rows: list[dict[str, typing.Any]],
+    *,
+    connection: db.AsyncConnection,
+) -> None:
+    """Add rows to the sums and counts of a rollup table"""
+
+    columns = [column for column in table.columns if not column.primary_key]
+    statement: sa.Insert
+    if util.is_testing():
+        sqlite_insert = sqlite.insert(table)
+        statement = sqlite_insert.on_conflict_do_update(
+            index_elements=table.primary_key.columns,
+            set_={
+                column.name: column + sqlite_insert.excluded[column.name]
+                for column in columns
+            },
+        )
+    else:
+        mysql_insert = mysql.insert(table)
+        statement = mysql_insert.on_duplicate_key_update(
+            {
+                column.name: column + mysql_insert.inserted[column.name]
+                for column in columns
+            }
+        )
+    await connection.execute(statement, rows)
+
+
+Timestamped = list[tuple[datetime, T]]
+
+
+async def _store_measurements(
+    measurements: Timestamped[Measurement], *, connection: db.AsyncConnection
+) -> None:
+    locations = await _resolve_ids(
+        db.locations,
+        ["slug"],
+        ((measurement.location,) for (_, measurement) in measurements),
+        connection=connection,
     )
     await connection.execute(
         db.measurements.insert(),
         [
             {
-                "location_id": locations[measurement.location],
+                "timestamp": timestamp,
+                "location_id": locations[(measurement.location,)],
                 **measurement.model_dump(
                     include={"temperature", "humidity", "pressure"}
                 ),
             }
-            for measurement in measurements
+            for (timestamp, measurement) in measurements
+        ],
+    )
+    await _store_rollup(
+        db.measurements_hourly,
+        [
+            {
+                "timestamp": _get_window(timestamp),
+                "location_id": locations[(measurement.location,)],
+                **_sum_and_count("temperature", measurement.temperature),
+                **_sum_and_count("humidity", measurement.humidity),
+                **_sum_and_count("pressure", measurement.pressure),
+            }
+            for (timestamp, measurement) in measurements
         ],
+        connection=connection,
     )
 
 
-async def store_hvacs(
-    hvacs: typing.Iterable[Hvac], *, connection: db.AsyncConnection
+async def _store_hvacs(
+    hvacs: Timestamped[Hvac], *, connection: db.AsyncConnection
 ) -> None:
-    await connection.execute(
-        db.hvac_devices.insert()
-        .prefix_with(IGNORE_PREFIX)
-        .values([{"slug": hvac.device} for hvac in hvacs]),
-    )
-    devices: dict[str, str] = dict(
-        (
-            await connection.execute(
-                db.select(db.hvac_devices.c.slug, db.hvac_devices.c.id)
-            )
-        )
-        .tuples()
-        .fetchall()
+    devices = await _resolve_ids(
+        db.hvac_devices,
+        ["slug"],
+        ((hvac.device,) for (_, hvac) in hvacs),
+        connection=connection,
     )
     await connection.execute(
         db.hvacs.insert(),
         [
             {
-                "device_id": devices[hvac.device],
+                "timestamp": timestamp,
+                "device_id": devices[(hvac.device,)],
                 **hvac.model_dump(include={"state", "temperature"}),
             }
-            for hvac in hvacs
+            for (timestamp, hvac) in hvacs
+        ],
+    )
+    await _store_rollup(
+        db.hvacs_hourly,
+        [
+            {
+                "timestamp": _get_window(timestamp),
+                "device_id": devices[(hvac.device,)],
+                **_sum_and_count("temperature", hvac.temperature),
+                "state_count": int(hvac.state is not None),
+                **{
+                    f"{state.name}_count": int(hvac.state == state)
+                    for state in db.HvacState
+                },
+            }
+            for (timestamp, hvac) in hvacs
         ],
+        connection=connection,
     )
 
 
-async def store_opening_states(
-    opening_states: typing.Iterable[OpeningState], *, connection: db.AsyncConnection
+async def _store_opening_states(
+    opening_states: Timestamped[OpeningState], *, connection: db.AsyncConnection
 ) -> None:
-    await connection.execute(
-        db.openings.insert()
-        .prefix_with(IGNORE_PREFIX)
-        .values(
-            [
-                {"type": opening_state.opening_type, "slug": opening_state.opening}
-                for opening_state in opening_states
-            ]
-        )
+    openings = await _resolve_ids(
+        db.openings,
+        ["type", "slug"],
+        (
+            (opening_state.opening_type, opening_state.opening)
+            for (_, opening_state) in opening_states
+        ),
+        connection=connection,
     )
-    openings = {
-        tuple(key): id
-        for (*key, id) in (
-            await connection.execute(
-                db.select(db.openings.c.type, db.openings.c.slug, db.openings.c.id)
-            )
-        )
-        .tuples()
-        .fetchall()
-    }
     await connection.execute(
         db.opening_states.insert(),
         [
             {
+                "timestamp": timestamp,
                 "opening_id": openings[
                     (opening_state.opening_type, opening_state.opening)
                 ],
                 **opening_state.model_dump(include={"is_open"}),
             }
-            for opening_state in opening_states
+            for (timestamp, opening_state) in opening_states
+        ],
+    )
+    await _store_rollup(
+        db.opening_states_hourly,
+        [
+            {
+                "timestamp": _get_window(timestamp),
+                "opening_id": openings[
+                    (opening_state.opening_type, opening_state.opening)
+                ],
+                "open_count": int(opening_state.is_open),
+                "count": 1,
+            }
+            for (timestamp, opening_state) in opening_states
+        ],
+        connection=connection,
+    )
+
+
+async def _store_forecasts(
+    forecasts: Timestamped[Forecast], *, connection: db.AsyncConnection
+) -> None:
+    await connection.execute(
+        db.forecasts.insert(),
+        [
+            {"timestamp": timestamp, **forecast.model_dump()}
+            for (timestamp, forecast) in forecasts
+        ],
+    )
+    await _store_rollup(
+        db.forecasts_hourly,
+        [
+            {
+                "timestamp": (window := _get_window(timestamp)),
+                # same as HOUR(TIMEDIFF(reference_timestamp, window)) in MySQL
+                "in_hours": abs(_to_naive_utc(forecast.reference_timestamp) - window)
+                // ROLLUP_WINDOW,
+                "temperature_sum": forecast.temperature,
+                "humidity_sum": forecast.humidity,
+                "pressure_sum": forecast.pressure,
+                "wind_speed_sum": forecast.wind_speed,
+                "count": 1,
+            }
+            for (timestamp, forecast) in forecasts
+        ],
+        connection=connection,
+    )
+
+
+async def _store_hvac_transitions(
+    transitions: list[HvacTransition], *, connection: db.AsyncConnection
+) -> None:
+    devices = await _resolve_ids(
+        db.hvac_devices,
+        ["slug"],
+        ((transition.device,) for transition in transitions),
+        connection=connection,
+    )
+    # the same transition may be submitted again after a failure
+    await connection.execute(
+        db.hvac_transitions.insert().prefix_with(IGNORE_PREFIX),
+        [
+            {
+                "timestamp": _to_naive_utc(transition.timestamp),
+                "device_id": devices[(transition.device,)],
+                **transition.model_dump(include={"state", "temperature"}),
+            }
+            for transition in transitions
+        ],
+    )
+
+
+async def _store_opening_transitions(
+    transitions: list[OpeningTransition], *, connection: db.AsyncConnection
+) -> None:
+    openings = await _resolve_ids(
+        db.openings,
+        ["type", "slug"],
+        ((transition.opening_type, transition.opening) for transition in transitions),
+        connection=connection,
+    )
+    await connection.execute(
+        db.opening_transitions.insert().prefix_with(IGNORE_PREFIX),
+        [
+            {
+                "timestamp": _to_naive_utc(transition.timestamp),
+                "opening_id": openings[(transition.opening_type, transition.opening)],
+                **transition.model_dump(include={"is_open"}),
+            }
+            for transition in transitions
         ],
     )
 
 
+async def store_measurements(
+    measurements: typing.Iterable[Measurement], *, connection: db.AsyncConnection
+) -> None:
+    timestamp = await _get_timestamp(connection)
+    await _store_measurements(
+        [(timestamp, item) for item in measurements], connection=connection
+    )
+
+
+async def store_hvacs(
+    hvacs: typing.Iterable[Hvac], *, connection: db.AsyncConnection
+) -> None:
+    timestamp = await _get_timestamp(connection)
+    await _store_hvacs([(timestamp, item) for item in hvacs], connection=connection)
+
+
+async def store_opening_states(
+    opening_states: typing.Iterable[OpeningState], *, connection: db.AsyncConnection
+) -> None:
+    timestamp = await _get_timestamp(connection)
+    await _store_opening_states(
+        [(timestamp, item) for item in opening_states], connection=connection
+    )
+
+
 async def store_forecasts(
     forecasts: typing.Iterable[Forecast], *, connection: db.AsyncConnection
 ) -> None:
-    await connection.execute(
-        db.forecasts.insert(), [forecast.model_dump() for forecast in forecasts]
+    timestamp = await _get_timestamp(connection)
+    await _store_forecasts(
+        [(timestamp, item) for item in forecasts], connection=connection
     )
+
+
+async def store_batch(batch: DataBatch, *, connection: db.AsyncConnection) -> None:
+    await store_received_batches([batch], connection=connection)
+
+
+async def store_received_batches(
+    batches: typing.Iterable[DataBatch], *, connection: db.AsyncConnection
+) -> None:
+    """Store batches received together at the current time"""
+
+    timestamp = await _get_timestamp(connection)
+    await store_batches(
+        [(timestamp, batch) for batch in batches], connection=connection
+    )
+
+
+async def store_batches(
+    batches: Timestamped[DataBatch], *, connection: db.AsyncConnection
+) -> None:
+    """Store batches received at different times
+
+    The items of each kind are inserted with a single statement, using the
+    timestamp of the batch they belong to. If the batch has its own timestamp,
+    it is used instead of the time it was received, so that the same batch is
+    stored with the same timestamp however many times it is submitted. The state
+    transitions carry their own timestamps.
+    """
+
+    batches = [
+        (_to_naive_utc(batch.timestamp) if batch.timestamp else timestamp, batch)
+        for (timestamp, batch) in batches
+    ]
+
+    if measurements := [
+        (timestamp, item)
+        for (timestamp, batch) in batches
+        for item in batch.measurements
+    ]:
+        await _store_measurements(measurements, connection=connection)
+    if hvacs := [
+        (timestamp, item) for (timestamp, batch) in batches for item in batch.hvacs
+    ]:
+        await _store_hvacs(hvacs, connection=connection)
+    if opening_states := [
+        (timestamp, item)
+        for (timestamp, batch) in batches
+        for item in batch.opening_states
+    ]:
+        await _store_opening_states(opening_states, connection=connection)
+    if forecasts := [
+        (timestamp, item) for (timestamp, batch) in batches for item in batch.forecasts
+    ]:
+        await _store_forecasts(forecasts, connection=connection)
+    if hvac_transitions := [
+        item for (_, batch) in batches for item in batch.hvac_transitions
+    ]:
+        await _store_hvac_transitions(hvac_transitions, connection=connection)
+    if opening_transitions := [
+        item for (_, batch) in batches for item in batch.opening_transitions
+    ]:
+        await _store_opening_transitions(opening_transitions, connection=connection)
@@ -32,6 +32,11 @@ else:
     UTC_NOW = func.convert_tz(func.now(), "SYSTEM", "+00:00")
 
 
+# The time series tables are partitioned by month in MySQL (see
+# tutina.lib.maintenance), and partitioned tables cannot have foreign keys. The
+# foreign keys declared below are only enforced in unpartitioned databases, but
+# they are still used to join the tables.
+
 locations = Table(
     "locations",
     metadata,
@@ -94,3 +99,75 @@ opening_states = Table(
     Column("opening_id", Integer, ForeignKey("openings.id"), primary_key=True),
     Column("is_open", Boolean, nullable=False),
 )
+
+
+# State transitions, stored instead of the periodic samples above when the HA
+# addon records changes only. Each row holds the state of a device/opening from
+# `timestamp` until the next row of the same device/opening.
+
+hvac_transitions = Table(
+    "hvac_transitions",
+    metadata,
+    Column("timestamp", DateTime, primary_key=True),
+    Column("device_id", Integer, ForeignKey("hvac_devices.id"), primary_key=True),
+    Column("state", Enum(HvacState), nullable=True),
+    Column("temperature", Float, nullable=True),
+)
+
+opening_transitions = Table(
+    "opening_transitions",
+    metadata,
+    Column("timestamp", DateTime, primary_key=True),
+    Column("opening_id", Integer, ForeignKey("openings.id"), primary_key=True),
+    Column("is_open", Boolean, nullable=False),
+)
+
+
+# Hourly rollups of the raw tables above. Each row holds sums and counts of
+# the samples within the hour starting at `timestamp`, so that averages can be
+# computed without scanning the raw samples.
+
+measurements_hourly = Table(
+    "measurements_hourly",
+    metadata,
+    Column("timestamp", DateTime, primary_key=True),
+    Column("location_id", Integer, ForeignKey("locations.id"), primary_key=True),
+    Column("temperature_sum", Float, nullable=False),
+    Column("temperature_count", Integer, nullable=False),
+    Column("humidity_sum", Float, nullable=False),
+    Column("humidity_count", Integer, nullable=False),
+    Column("pressure_sum", Float, nullable=False),
+    Column("pressure_count", Integer, nullable=False),
+)
+
+forecasts_hourly = Table(
+    "forecasts_hourly",
+    metadata,
+    Column("timestamp", DateTime, primary_key=True),
+    Column("in_hours", Integer, primary_key=True),
+    Column("temperature_sum", Float, nullable=False),
+    Column("humidity_sum", Float, nullable=False),
+    Column("pressure_sum", Float, nullable=False),
+    Column("wind_speed_sum", Float, nullable=False),
+    Column("count", Integer, nullable=False),
+)
+
+hvacs_hourly = Table(
+    "hvacs_hourly",
+    metadata,
+    Column("timestamp", DateTime, primary_key=True),
+    Column("device_id", Integer, ForeignKey("hvac_devices.id"), primary_key=True),
+    Column("temperature_sum", Float, nullable=False),
+    Column("temperature_count", Integer, nullable=False),
+    Column("state_count", Integer, nullable=False),
+    *(Column(f"{state.name}_count", Integer, nullable=False) for state in HvacState),
+)
+
+opening_states_hourly = Table(
+    "opening_states_hourly",
+    metadata,
+    Column("timestamp", DateTime, primary_key=True),
+    Column("opening_id", Integer, ForeignKey("openings.id"), primary_key=True),
+    Column("open_count", Integer, nullable=False),
+    Column("count", Integer, nullable=False),
+)
@@ -0,0 +1,198 @@
+"""Partitioning and retention of the time series tables
+
+In MySQL, the raw and rollup tables are range partitioned by month. Each
+partition ``pYYYYMM`` holds the rows of one month, and the ``pfuture``
+partition holds the rows after the last monthly partition. Queries filtering
+on ``timestamp`` only scan the partitions within the range.
+
+The raw data is only kept for a limited time. The hourly rollups are kept up
+to date when the data is stored, so the expired partitions of the raw tables
+are dropped as is, and the rollups remain. The state transition tables have no
+rollups, so nothing is kept of their expired rows.
+"""
+
+import logging
+from datetime import datetime, timezone
+
+import sqlalchemy as sa
+
+from . import db
+
+logger = logging.getLogger(__name__)
+
+FUTURE_PARTITION = "pfuture"
+
+RAW_TABLES = [
+    db.measurements,
+    db.hvacs,
+    db.opening_states,
+    db.forecasts,
+    db.hvac_transitions,
+    db.opening_transitions,
+]
+
+ROLLUP_TABLES = [
+    db.measurements_hourly,
+    db.hvacs_hourly,
+    db.opening_states_hourly,
+    db.forecasts_hourly,
+]
+
+
+def _month_start(timestamp: datetime) -> datetime:
+    return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(month: datetime, n: int) -> datetime:
+    year, month_index = divmod(month.year * 12 + month.month - 1 + n, 12)
+    return month.replace(year=year, month=month_index + 1)
+
+
+def get_partition_months(first: datetime, last: datetime) -> list[datetime]:
+    """Get the months from the month of ``first`` to the month of ``last``"""
+
+    months = []
+    month = _month_start(first)
+    while month <= last:
+        months.append(month)
+        month = _add_months(month, 1)
+    return months
+
+
+def _partition_name(month: datetime) -> str:
+    return f"p{month:%Y%m}"
+
+
+def _partition_month(name: str) -> datetime:
+    return datetime.strptime(name, "p%Y%m")
+
+
+def _partition_definitions(months: list[datetime]) -> str:
+    return ", ".join(
+        [
+            *(
+                f"PARTITION {_partition_name(month)} VALUES LESS THAN "
+                f"(TO_DAYS('{_add_months(month, 1):%Y-%m-%d}'))"
+                for month in months
+            ),
+            f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE",
+        ]
+    )
+
+
+async def _get_partition_months(
+    table: sa.Table, *, connection: db.AsyncConnection
+) -> list[datetime] | None:
+    """Get the months of the monthly partitions, or None if not partitioned"""
+
+    result = await connection.execute(
+        sa.text(
+            """
+            SELECT partition_name FROM information_schema.partitions
+            WHERE table_schema = DATABASE() AND table_name = :table_name
+                AND partition_name IS NOT NULL
+            ORDER BY partition_ordinal_position
+            """
+        ),
+        {"table_name": table.name},
+    )
+    names = result.scalars().all()
+    if not names:
+        return None
+    return [_partition_month(name) for name in names if name != FUTURE_PARTITION]
+
+
+async def _get_first_timestamp(
+    table: sa.Table, *, connection: db.AsyncConnection
+) -> datetime | None:
+    return (
+        await connection.execute(db.select(sa.func.min(table.c.timestamp)))
+    ).scalar_one()
+
+
+async def _partition_table(
+    table: sa.Table, until: datetime, *, connection: db.AsyncConnection
+) -> None:
+    # partitioned tables cannot have foreign keys in MySQL
+    foreign_keys = await connection.run_sync(
+        lambda sync_connection: sa.inspect(sync_connection).get_foreign_keys(table.name)
+    )
+    for foreign_key in foreign_keys:
+        await connection.execute(
+            sa.text(f"ALTER TABLE {table.name} DROP FOREIGN KEY {foreign_key['name']}")
+        )
+    first = await _get_first_timestamp(table, connection=connection) or until
+    months = get_partition_months(first, until)
+    logger.info("Partitioning %s into %d months", table.name, len(months))
+    await connection.execute(
+        sa.text(
+            f"ALTER TABLE {table.name} PARTITION BY RANGE (TO_DAYS(timestamp)) "
+            f"({_partition_definitions(months)})"
+        )
+    )
+
+
+async def ensure_partitions(
+    table: sa.Table, until: datetime, *, connection: db.AsyncConnection
+) -> None:
+    """Ensure that a table has monthly partitions until the month of ``until``"""
+
+    months = await _get_partition_months(table, connection=connection)
+    if months is None:
+        await _partition_table(table, until, connection=connection)
+        return
+    if months:
+        first = _add_months(months[-1], 1)
+    else:
+        first = await _get_first_timestamp(table, connection=connection) or until
+    if new_months := get_partition_months(first, until):
+        logger.info("Adding %d partitions to %s", len(new_months), table.name)
+        await connection.execute(
+            sa.text(
+                f"ALTER TABLE {table.name} REORGANIZE PARTITION {FUTURE_PARTITION} "
+                f"INTO ({_partition_definitions(new_months)})"
+            )
+        )
+
+
+async def drop_expired_partitions(
+    table: sa.Table, before: datetime, *, connection: db.AsyncConnection
+) -> None:
+    """Drop the partitions of a raw table ending before ``before``"""
+
+    months = await _get_partition_months(table, connection=connection) or []
+    for month in months:
+        if _add_months(month, 1) > before:
+            break
+        logger.info("Dropping partition %s of %s", _partition_name(month), table.name)
+        await connection.execute(
+            sa.text(f"ALTER TABLE {table.name} DROP PARTITION {_partition_name(month)}")
+        )
+
+
+async def maintain(
+    connection: db.AsyncConnection,
+    *,
+    retention_months: int | None,
+    now: datetime | None = None,
+) -> None:
+    """Add partitions for the next month and drop the expired raw data
+
+    If ``retention_months`` is None, the raw data is kept forever. Otherwise
+    the partitions of the raw tables older than ``retention_months`` full
+    months are dropped.
+    """
+
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    this_month = _month_start(now)
+    for table in [*RAW_TABLES, *ROLLUP_TABLES]:
+        await ensure_partitions(
+            table, _add_months(this_month, 1), connection=connection
+        )
+    if retention_months is not None:
+        for table in RAW_TABLES:
+            await drop_expired_partitions(
+                table,
+                _add_months(this_month, -retention_months),
+                connection=connection,
+            )
@@ -30,6 +30,8 @@ _DEFAULT_DATA_DIR_PATHS = [
 
 _DEFAULT_DATA_FILENAME = "data.parquet"
 _DEFAULT_MODEL_FILENAME = "model.keras"
+_DEFAULT_RUNTIME_FILENAME = "model.npz"
+_DEFAULT_SPOOL_FILENAME = "spool.sqlite"
 
 
 def _get_config_file_paths():
@@ -64,6 +66,12 @@ def _get_data_file_path(filename: str, write: bool):
 class TutinaSettings(pydantic.BaseModel):
     token_secret: pydantic.SecretStr
     base_url: pydantic.AnyHttpUrl = "http://localhost:8000"  # type: ignore
+    spool_file: Path | None = None
+
+    def get_spool_file_path(self) -> Path:
+        if self.spool_file:
+            return self.spool_file
+        return _get_data_file_path(_DEFAULT_SPOOL_FILENAME, True)
 
 
 class DatabaseUrlParts(pydantic.BaseModel):
@@ -85,6 +93,7 @@ class DatabaseUrlParts(pydantic.BaseModel):
 
 class DatabaseSettings(pydantic.BaseModel):
     url: pydantic.SecretStr | DatabaseUrlParts = DatabaseUrlParts()
+    retention_months: int | None = None
 
     def get_url(self):
         import sqlalchemy
@@ -97,6 +106,7 @@ class DatabaseSettings(pydantic.BaseModel):
 class ModelSettings(pydantic.BaseModel):
     data_file: Path | None = None
     model_file: Path | None = None
+    runtime_file: Path | None = None
     config: dict[str, Any] = {}
 
     def get_data_file_path(self, *, write: bool) -> Path | None:
@@ -109,10 +119,41 @@ class ModelSettings(pydantic.BaseModel):
             return self.model_file
         return _get_data_file_path(_DEFAULT_MODEL_FILENAME, write)
 
+    def get_runtime_file_path(self, *, write: bool) -> Path | None:
+        if self.runtime_file:
+            return self.runtime_file
+        return _get_data_file_path(_DEFAULT_RUNTIME_FILENAME, write)
+
+
+class PredictionCacheSettings(pydantic.BaseModel):
+    max_size: int = 16 * 1024 * 1024
+    ttl: float = 3600.0
+
+
+class PlotSettings(pydantic.BaseModel):
+    max_workers: int = 2
+    max_pending: int = 8
+
+
+class IngestionSettings(pydantic.BaseModel):
+    """Settings of storing the submitted data
+
+    With ``write_behind``, the data is buffered and stored in the background,
+    so submitting data that has already been stored is not rejected with 409,
+    but the duplicate batches are skipped when the buffer is flushed.
+    """
+
+    write_behind: bool = False
+    max_size: int = 100_000
+    flush_size: int = 5_000
+    flush_interval: float = 5.0
+
 
 class HomeAssistantSettings(pydantic.BaseModel):
     api_url: pydantic.AnyHttpUrl
     api_token: pydantic.SecretStr
+    websocket_url: pydantic.AnyUrl | None = None
+    record_transitions: bool = False
 
 
 class Coordinates(pydantic.BaseModel):
@@ -137,6 +178,9 @@ class Settings(pydantic_settings.BaseSettings):
     tutina: TutinaSettings | None = None
     database: DatabaseSettings | None = None
     model: ModelSettings = ModelSettings()
+    prediction_cache: PredictionCacheSettings = PredictionCacheSettings()
+    plot: PlotSettings = PlotSettings()
+    ingestion: IngestionSettings = IngestionSettings()
     homeassistant: HomeAssistantSettings | None = None
     owm: OwmSettings | None = None
     logging: dict[str, Any] | None = None
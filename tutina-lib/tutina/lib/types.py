@@ -1,20 +1,77 @@
-from collections.abc import KeysView
-from datetime import datetime, timedelta
+from collections.abc import Collection, KeysView
+from datetime import datetime, timedelta, timezone
 from enum import Enum
-from typing import Annotated, Iterable
+from typing import Annotated, Any, Protocol, Reversible
 
 import annotated_types as at
-import more_itertools as mi
+import numpy as np
 import pydantic
 
 TIME_SERIES_WINDOW_SIZE = timedelta(hours=1)
 
+_TIMESTAMPS_ADAPTER = pydantic.TypeAdapter(list[datetime])
+_VALUES_ADAPTER = pydantic.TypeAdapter(list[float])
 
-def _has_valid_spacing(timestamps: Iterable[datetime]):
-    return all(
-        second - first == TIME_SERIES_WINDOW_SIZE
-        for (first, second) in mi.pairwise(timestamps)
-    )
+
+_EPOCH = datetime(1970, 1, 1)
+_UTC_EPOCH = _EPOCH.replace(tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _to_datetime64(timestamps: Collection[datetime]) -> np.ndarray:
+    # datetime64 has no time zone, so aware timestamps are normalized to UTC.
+    # NumPy converts datetime objects one by one and slowly, so the array is
+    # filled with microseconds since the epoch, and only viewed as datetime64.
+    first_timestamp = next(iter(timestamps), None)
+    epoch = _UTC_EPOCH if first_timestamp and first_timestamp.tzinfo else _EPOCH
+    try:
+        return np.fromiter(
+            ((timestamp - epoch) // _MICROSECOND for timestamp in timestamps),
+            dtype=np.int64,
+        ).view("datetime64[us]")
+    except TypeError as e:
+        # naive and aware timestamps cannot be subtracted from each other
+        raise ValueError("Timestamps should be either all naive or all aware") from e
+
+
+def _has_valid_index_spacing(index: np.ndarray):
+    return bool(np.all(np.diff(index) == np.timedelta64(TIME_SERIES_WINDOW_SIZE)))
+
+
+def _has_valid_spacing(timestamps: Collection[datetime]):
+    return _has_valid_index_spacing(_to_datetime64(timestamps))
+
+
+class _TimeSeriesCollection(Protocol):
+    @property
+    def timestamps(self) -> Reversible[datetime]: ...
+
+
+def _validate_feature_timestamps(
+    history: _TimeSeriesCollection,
+    control: _TimeSeriesCollection,
+    forecasts: _TimeSeriesCollection,
+):
+    last_history_timestamp = next(reversed(history.timestamps))
+    first_control_timestamp = next(iter(control.timestamps))
+    last_control_timestamp = next(reversed(control.timestamps))
+    first_forecast_timestamp = next(iter(forecasts.timestamps))
+    last_forecast_timestamp = next(reversed(forecasts.timestamps))
+    if last_history_timestamp != first_forecast_timestamp:
+        raise ValueError(
+            "The last history timestamp should match the first timestamp in forecast, "
+            f"but {last_history_timestamp} != {first_forecast_timestamp}"
+        )
+    if last_history_timestamp + TIME_SERIES_WINDOW_SIZE != first_control_timestamp:
+        raise ValueError(
+            "The last history timestamp should immediately precede the first control timestamp, "
+            f"but {last_history_timestamp} + {TIME_SERIES_WINDOW_SIZE} != {first_forecast_timestamp}"
+        )
+    if last_forecast_timestamp < last_control_timestamp:
+        raise ValueError(
+            "The last forecast timestamp should not be earlier than the last control timestamp, "
+            f"but {last_forecast_timestamp} < {last_control_timestamp}"
+        )
 
 
 class HvacState(Enum):
@@ -56,6 +113,18 @@ class OpeningState(pydantic.BaseModel):
     is_open: bool
 
 
+class HvacTransition(Hvac):
+    """HVAC device state starting at ``timestamp``"""
+
+    timestamp: datetime
+
+
+class OpeningTransition(OpeningState):
+    """Door/window opening state starting at ``timestamp``"""
+
+    timestamp: datetime
+
+
 class Forecast(pydantic.BaseModel):
     """Weather forecast at a single point of time"""
 
@@ -67,14 +136,58 @@ class Forecast(pydantic.BaseModel):
     status: str
 
 
+class DataBatch(pydantic.BaseModel):
+    """Data of all kinds submitted together
+
+    The data is stored with ``timestamp`` if set, e.g. when it is submitted later
+    than it was sampled, and with the time the batch is received otherwise.
+    """
+
+    measurements: list[Measurement] = []
+    hvacs: list[Hvac] = []
+    opening_states: list[OpeningState] = []
+    forecasts: list[Forecast] = []
+    hvac_transitions: list[HvacTransition] = []
+    opening_transitions: list[OpeningTransition] = []
+    timestamp: datetime | None = None
+
+    @pydantic.model_validator(mode="after")
+    def is_not_empty(self):
+        if (
+            self.measurements
+            or self.hvacs
+            or self.opening_states
+            or self.forecasts
+            or self.hvac_transitions
+            or self.opening_transitions
+        ):
+            return self
+        raise ValueError("The batch should contain at least one item")
+
+
 class FeatureTimeSeries(pydantic.RootModel):
     """Time series of numeric data"""
 
     root: dict[datetime, float]
 
+    _index: np.ndarray | None = pydantic.PrivateAttr(default=None)
+
+    @classmethod
+    def _from_index(
+        cls, timestamps: list[datetime], index: np.ndarray, values: list[float]
+    ):
+        time_series = cls.model_construct(dict(zip(timestamps, values)))
+        time_series._index = index
+        return time_series
+
     @pydantic.model_validator(mode="after")
     def timestamps_have_valid_spacing(self):
-        if _has_valid_spacing(self.root.keys()):
+        # the validators also run on the instances created from a shared index
+        # by FeaturesByName, whose timestamps are already validated
+        if self._index is not None:
+            return self
+        self._index = _to_datetime64(self.root.keys())
+        if _has_valid_index_spacing(self._index):
             return self
         raise ValueError(f"Timestamps should have spacing {TIME_SERIES_WINDOW_SIZE}")
 
@@ -89,9 +202,51 @@ class FeaturesByName(pydantic.RootModel):
         first_time_series = next(iter(self.root.values()))
         return first_time_series.root.keys()
 
+    @pydantic.model_validator(mode="before")
+    @classmethod
+    def validate_shared_timestamps(cls, data: Any):
+        """Validate the timestamps only once if all time series share them
+
+        If the input is not a well-formed collection of time series sharing the
+        same timestamps, it is passed unchanged to the regular validation,
+        which then reports the errors.
+        """
+
+        if not isinstance(data, dict) or not data:
+            return data
+        if not all(isinstance(time_series, dict) for time_series in data.values()):
+            return data
+        raw_timestamps = list(next(iter(data.values())))
+        if not all(
+            list(time_series) == raw_timestamps for time_series in data.values()
+        ):
+            return data
+        try:
+            timestamps = _TIMESTAMPS_ADAPTER.validate_python(raw_timestamps)
+            values_by_name = {
+                name: _VALUES_ADAPTER.validate_python(list(time_series.values()))
+                for name, time_series in data.items()
+            }
+        except pydantic.ValidationError:
+            return data
+        try:
+            index = _to_datetime64(timestamps)
+        except ValueError:
+            return data
+        if not _has_valid_index_spacing(index):
+            return data
+        return {
+            name: FeatureTimeSeries._from_index(timestamps, index, values)
+            for name, values in values_by_name.items()
+        }
+
     @pydantic.model_validator(mode="after")
     def time_series_have_same_timestamps(self):
-        if mi.all_equal(ts.root.keys() for ts in self.root.values()):
+        first_index, *other_indices = (ts._index for ts in self.root.values())
+        if all(
+            index is first_index or np.array_equal(index, first_index)
+            for index in other_indices
+        ):
             return self
         raise ValueError("All feature time series should have the same timestamps")
 
@@ -163,24 +318,129 @@ class TutinaModelInput(pydantic.BaseModel):
 
     @pydantic.model_validator(mode="after")
     def validate_feature_timestamps(self):
-        last_history_timestamp = next(reversed(self.history.timestamps))
-        first_control_timestamp = next(iter(self.control.timestamps))
-        last_control_timestamp = next(reversed(self.control.timestamps))
-        first_forecast_timestamp = next(iter(self.forecasts.timestamps))
-        last_forecast_timestamp = next(reversed(self.forecasts.timestamps))
-        if last_history_timestamp != first_forecast_timestamp:
-            raise ValueError(
-                "The last history timestamp should match the first timestamp in forecast, "
-                f"but {last_history_timestamp} != {first_forecast_timestamp}"
-            )
-        if last_history_timestamp + TIME_SERIES_WINDOW_SIZE != first_control_timestamp:
-            raise ValueError(
-                "The last history timestamp should immediately precede the first control timestamp, "
-                f"but {last_history_timestamp} + {TIME_SERIES_WINDOW_SIZE} != {first_forecast_timestamp}"
-            )
-        if last_forecast_timestamp < last_control_timestamp:
-            raise ValueError(
-                "The last forecast timestamp should not be earlier than the last control timestamp, "
-                f"but {last_forecast_timestamp} < {last_control_timestamp}"
-            )
+        _validate_feature_timestamps(self.history, self.control, self.forecasts)
+        return self
+
+
+class TutinaBatchModelInput(pydantic.BaseModel):
+    """Serialized input to the tutina model with alternative control inputs
+
+    The history and forecasts are shared by all predictions in the batch.
+    """
+
+    history: Annotated[
+        FeaturesByName,
+        pydantic.Field(
+            description="History of measurements prior to the predicted timesteps",
+        ),
+    ]
+    controls: Annotated[
+        list[FeaturesByName],
+        at.MinLen(1),
+        pydantic.Field(
+            description="Alternative control inputs for the predicted timesteps, all "
+            "having the same features and timestamps",
+        ),
+    ]
+    forecasts: Annotated[
+        ForecastFeatures,
+        pydantic.Field(
+            description="Weather forecast for the predicted timesteps",
+        ),
+    ]
+
+    @pydantic.model_validator(mode="after")
+    def validate_feature_timestamps(self):
+        first_control = self.controls[0]
+        for control in self.controls[1:]:
+            if control.root.keys() != first_control.root.keys():
+                raise ValueError("All control inputs should have the same features")
+            if control.timestamps != first_control.timestamps:
+                raise ValueError("All control inputs should have the same timestamps")
+        _validate_feature_timestamps(self.history, first_control, self.forecasts)
+        return self
+
+
+class ColumnarFeatures(pydantic.BaseModel):
+    """Collection of hourly feature time series as dense arrays"""
+
+    start: Annotated[
+        datetime,
+        pydantic.Field(description="Timestamp of the first element in each array"),
+    ]
+    features: Annotated[
+        dict[str, list[float]],
+        at.MinLen(1),
+        pydantic.Field(description="Feature values by name, spaced by one hour"),
+    ]
+
+    @property
+    def length(self) -> int:
+        return len(next(iter(self.features.values())))
+
+    @property
+    def timestamps(self) -> list[datetime]:
+        return [self.start + i * TIME_SERIES_WINDOW_SIZE for i in range(self.length)]
+
+    @pydantic.model_validator(mode="after")
+    def arrays_have_same_nonzero_length(self):
+        lengths = set(len(values) for values in self.features.values())
+        if len(lengths) != 1:
+            raise ValueError("All feature arrays should have the same length")
+        if 0 in lengths:
+            raise ValueError("Feature arrays should not be empty")
+        return self
+
+
+class ColumnarTutinaModelInput(pydantic.BaseModel):
+    """Serialized input to the tutina model in columnar format"""
+
+    history: Annotated[
+        ColumnarFeatures,
+        pydantic.Field(
+            description="History of measurements prior to the predicted timesteps",
+            json_schema_extra={
+                "example": {
+                    "start": "2020-01-01T07:00:00Z",
+                    "features": {
+                        "temperature_bedroom": [20.0, 21.0],
+                        "temperature_outdoor": [-5.0, -4.0],
+                    },
+                }
+            },
+        ),
+    ]
+    control: Annotated[
+        ColumnarFeatures,
+        pydantic.Field(
+            description="Control input for the predicted timesteps",
+            json_schema_extra={
+                "example": {
+                    "start": "2020-01-01T09:00:00Z",
+                    "features": {
+                        "hvac_state_heat_radiator": [1.0, 1.0],
+                        "hvac_temperature_heat_radiator": [21.0, 21.0],
+                    },
+                }
+            },
+        ),
+    ]
+    forecasts: Annotated[
+        ColumnarFeatures,
+        pydantic.Field(
+            description="Weather forecast for the predicted timesteps",
+            json_schema_extra={
+                "example": {
+                    "start": "2020-01-01T08:00:00Z",
+                    "features": {"temperature": [-4.5, -3.5, -3.5]},
+                }
+            },
+        ),
+    ]
+
+    @pydantic.model_validator(mode="after")
+    def validate_feature_timestamps(self):
+        if set(self.forecasts.features.keys()) != {"temperature"}:
+            raise ValueError("Forecasts should contain exactly the temperature feature")
+        _validate_feature_timestamps(self.history, self.control, self.forecasts)
         return self